@@ -39,6 +39,7 @@ INSTALLED_APPS = (
     "termsandconditions",
     "core",
     "dossier",
+    "search",
     "djalthingi",
     "jsonizer",
     "customsignup",
@@ -100,6 +101,16 @@ LOCALE_PATHS = ("locale",)
 # Various project settings
 MEANING_OF_RECENT = relativedelta(months=1)
 
+# Data displayed on every page, such as upcoming sessions and the news in the
+# user's menus, is cached for this many seconds. See `core.extravars`.
+#
+# Cached data is invalidated by the process that changes the underlying data,
+# such as the importer, so `CACHES` must be configured in `local_settings.py`
+# with a backend shared between processes, for example memcached. With
+# Django's default of a local memory cache, web processes never learn of the
+# changes and keep showing stale data until it expires.
+EXTRAVARS_CACHE_TIMEOUT = 300
+
 
 # Static files (CSS, JavaScript, Images)
 # https://docs.djangoproject.com/en/1.7/howto/static-files/
@@ -1,3 +1,5 @@
+from functools import lru_cache
+
 from django.urls import resolve
 from django.urls import reverse
 from django.shortcuts import get_object_or_404
@@ -6,8 +8,11 @@ from django.utils import dateparse
 from django.utils import timezone
 from django.utils.http import urlsafe_base64_decode
 from django.utils.http import urlsafe_base64_encode
+from django.utils.translation import get_language
 from django.utils.translation import gettext as _
 
+from core.extravars import cached
+
 from djalthingi.althingi_settings import CURRENT_PARLIAMENT_NUM
 from djalthingi.models import Category
 from djalthingi.models import Committee
@@ -17,6 +22,10 @@ from djalthingi.models import Person
 
 from djalthingi.templatetags.committee import fancy_committee_agenda_timing
 
+# Number of crumbs whose paths and resolved views are remembered. Both only
+# depend on the URLconf, so they never need to be invalidated.
+CRUMB_CACHE_SIZE = 1024
+
 
 # Utility function to add an URL to the crumbs in a crumb string.
 def append_to_crumb_string(input_path, input_crumb_string):
@@ -27,22 +36,50 @@ def append_to_crumb_string(input_path, input_crumb_string):
     return crumb_string
 
 
+@lru_cache(maxsize=CRUMB_CACHE_SIZE)
+def resolve_crumb(crumb):
+    """
+    Returns the resolved view of a single crumb from a crumb string.
+    """
+    return resolve(urlsafe_base64_decode(crumb).decode())
+
+
+@lru_cache(maxsize=CRUMB_CACHE_SIZE)
+def make_crumb(view):
+    """
+    Returns the crumb of the given view, as used in crumb strings.
+    """
+    path = reverse(view[0], args=view[1:])
+    return urlsafe_base64_encode(path.encode())
+
+
+def cached_caption(key, func):
+    """
+    Returns a caption that requires database access to be built, cached until
+    the underlying data changes (see `core.signals`).
+    """
+    return cached("breadcrumb:%s:%s" % (get_language(), key), ["breadcrumbs"], func)
+
+
 def leave_breadcrumb(breadcrumbs, view, caption):
 
-    prior_crumb_strings = []
     last_view = None
-    for breadcrumb in breadcrumbs:
-        last_view = view_data = breadcrumb["view"]
-        path = reverse(view_data[0], args=view_data[1:])
-        crumb_string = urlsafe_base64_encode(path.encode())
-        prior_crumb_strings.append(crumb_string)
+    crumb_string = ""
+    if breadcrumbs:
+        # The crumb string of a breadcrumb leads through all the breadcrumbs
+        # before it, so it's that of the last one with the last one added.
+        last_breadcrumb = breadcrumbs[-1]
+        last_view = last_breadcrumb["view"]
+        crumb_string = make_crumb(last_view)
+        if last_breadcrumb["crumb_string"]:
+            crumb_string += "," + last_breadcrumb["crumb_string"]
 
     if view != last_view:  # Each breadcrumb only once at a time.
         breadcrumbs.append(
             {
                 "view": view,
                 "caption": caption,
-                "crumb_string": ",".join(reversed(prior_crumb_strings)),
+                "crumb_string": crumb_string,
             }
         )
     return breadcrumbs
@@ -65,8 +102,7 @@ def make_breadcrumbs(request, parliament):
     # Prepend breadcrumbs from crumb string
     crumb_string = request.GET.get("from", "")
     for part in reversed(crumb_string.split(",") if crumb_string else []):
-        path = urlsafe_base64_decode(part).decode()
-        breadcrumbs = process_breadcrumbs(breadcrumbs, resolve(path))
+        breadcrumbs = process_breadcrumbs(breadcrumbs, resolve_crumb(part))
 
     breadcrumbs = process_breadcrumbs(breadcrumbs, request.resolver_match)
 
@@ -150,6 +186,11 @@ def process_breadcrumbs(breadcrumbs, view):
             breadcrumbs, ("parliament_issues", parliament_num), _("Issues")
         )
 
+    if view_name == "parliament_search":
+        breadcrumbs = leave_breadcrumb(
+            breadcrumbs, ("parliament_search", parliament_num), _("Search")
+        )
+
     if view_name == "parliament_issue":
         breadcrumbs = leave_breadcrumb(
             breadcrumbs,
@@ -181,19 +222,25 @@ def process_breadcrumbs(breadcrumbs, view):
         "parliament_committee_agenda",
         "parliament_committee_issues",
     ):
-        committee = Committee.objects.get(id=committee_id)
         breadcrumbs = leave_breadcrumb(
             breadcrumbs,
             ("parliament_committee", parliament_num, committee_id),
-            committee,
+            cached_caption(
+                "committee:%d" % committee_id,
+                lambda: str(Committee.objects.get(id=committee_id)),
+            ),
         )
 
     if view_name == "parliament_committee_agenda":
-        committee_agenda = CommitteeAgenda.objects.get(id=agenda_id)
         breadcrumbs = leave_breadcrumb(
             breadcrumbs,
             ("parliament_committee_agenda", parliament_num, committee_id, agenda_id),
-            fancy_committee_agenda_timing(committee_agenda),
+            cached_caption(
+                "committee_agenda:%d" % agenda_id,
+                lambda: fancy_committee_agenda_timing(
+                    CommitteeAgenda.objects.get(id=agenda_id)
+                ),
+            ),
         )
 
     if view_name == "parliament_committee_issues":
@@ -209,11 +256,13 @@ def process_breadcrumbs(breadcrumbs, view):
         )
 
     if view_name == "parliament_category":
-        category = Category.objects.get(slug=category_slug)
         breadcrumbs = leave_breadcrumb(
             breadcrumbs,
             ("parliament_category", parliament_num, category_slug),
-            category,
+            cached_caption(
+                "category:%s" % category_slug,
+                lambda: str(Category.objects.get(slug=category_slug)),
+            ),
         )
 
     if view_name == "parliament_category_issues":
@@ -234,25 +283,24 @@ def process_breadcrumbs(breadcrumbs, view):
         caption = _("Parliamentarians")
 
         if "party_slug" in view_kwargs:
-            party = Party.objects.get(slug=view_kwargs.get("party_slug"))
-            caption += " (%s)" % party.name
+            caption += " (%s)" % cached_caption(
+                "party_name:%s" % party_slug,
+                lambda: Party.objects.get(slug=party_slug).name,
+            )
+            view = ("parliament_persons", parliament_num, party_slug)
         else:
-            party = None
+            view = ("parliament_persons", parliament_num)
 
-        breadcrumbs = leave_breadcrumb(
-            breadcrumbs,
-            (
-                ("parliament_persons", parliament_num, party.slug)
-                if party
-                else ("parliament_persons", parliament_num)
-            ),
-            caption,
-        )
+        breadcrumbs = leave_breadcrumb(breadcrumbs, view, caption)
 
     if view_name in ("parliament_party", "parliament_party_issues"):
-        party = Party.objects.get(slug=party_slug)
         breadcrumbs = leave_breadcrumb(
-            breadcrumbs, ("parliament_party", parliament_num, party_slug), party
+            breadcrumbs,
+            ("parliament_party", parliament_num, party_slug),
+            cached_caption(
+                "party:%s" % party_slug,
+                lambda: str(Party.objects.get(slug=party_slug)),
+            ),
         )
 
     if view_name == "parliament_party_issues":
@@ -264,28 +312,45 @@ def process_breadcrumbs(breadcrumbs, view):
 
     if view_name == "person":
         if "subslug" in locals():
-            person = get_object_or_404(Person, slug=slug, subslug=subslug)
-            person_count = 1
-        else:
-            persons = Person.objects.filter(slug=slug)
-            person_count = persons.count()
-            try:
-                person = persons[
-                    0
-                ]  # We'll only use the name so just need either one of them, doesn't matter which.
-            except IndexError:
-                person_count = 0
-
-        if person_count == 1:
-            breadcrumbs = leave_breadcrumb(
-                breadcrumbs,
-                ("person", person.slug, person.subslug),
-                "%s (%s %s)"
-                % (person.name, _("b."), date(person.birthdate, "SHORT_DATE_FORMAT")),
-            )
-        elif person_count > 1:
-            breadcrumbs = leave_breadcrumb(
-                breadcrumbs, ("person", person.slug), person.name
+            crumb = cached_caption(
+                "person:%s:%s" % (slug, subslug),
+                lambda: person_crumb(slug, subslug),
             )
+        else:
+            crumb = cached_caption("person:%s" % slug, lambda: person_crumb(slug))
+
+        if crumb is not None:
+            breadcrumbs = leave_breadcrumb(breadcrumbs, *crumb)
 
     return breadcrumbs
+
+
+def person_crumb(slug, subslug=None):
+    """
+    Returns the view and caption of a person's breadcrumb, or None if there
+    is no such person. Without a subslug, the crumb leads to a person only
+    if the slug is unique, but otherwise to the list of persons using it.
+    """
+    if subslug is not None:
+        person = get_object_or_404(Person, slug=slug, subslug=subslug)
+        person_count = 1
+    else:
+        persons = Person.objects.filter(slug=slug)
+        person_count = persons.count()
+        try:
+            person = persons[
+                0
+            ]  # We'll only use the name so just need either one of them, doesn't matter which.
+        except IndexError:
+            person_count = 0
+
+    if person_count == 1:
+        return (
+            ("person", person.slug, person.subslug),
+            "%s (%s %s)"
+            % (person.name, _("b."), date(person.birthdate, "SHORT_DATE_FORMAT")),
+        )
+    elif person_count > 1:
+        return ("person", person.slug), person.name
+
+    return None
@@ -24,6 +24,7 @@ from core.models import Subscription
 from core.models import UserProfile
 
 from dossier.models import Dossier
+from dossier.models import DossierStatistic
 
 from jsonizer.utils import jsonize
 
@@ -399,6 +400,12 @@ def setting_set(request, setting_name, setting_value):
         setattr(userprofile, "setting_%s" % setting_name, setting_value)
         userprofile.save()
         value_changed = True
+
+        # Whether others' work counts as seen affects the user's seen counts.
+        if setting_name == "seen_if_worked_by_others":
+            DossierStatistic.objects.filter(
+                user_id=request.user.id
+            ).update_seen_counts()
     else:
         value_changed = False
 
@@ -0,0 +1,194 @@
+from uuid import uuid4
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from djalthingi.models import CommitteeAgenda
+from djalthingi.models import Parliament
+from djalthingi.models import Session
+
+# Caching of the data that `ExtraVarsMiddleware` hands over to every view.
+#
+# Cached data is keyed by versions which are replaced when the underlying
+# data changes (see `core.signals`), making older cache entries unreachable
+# until they expire. Versions are stored in the same cache as the data, so
+# changes made in other processes, such as by the importer, are only picked
+# up immediately when a cache backend is shared between processes.
+# Otherwise, they are picked up when the cached data expires, according to
+# `settings.EXTRAVARS_CACHE_TIMEOUT`.
+
+
+def get_version(name):
+    return cache.get_or_set("extravars-version:%s" % name, lambda: uuid4().hex, None)
+
+
+def invalidate(name):
+    cache.delete("extravars-version:%s" % name)
+
+
+def invalidate_parliaments():
+    invalidate("parliaments")
+
+
+def invalidate_upcoming():
+    invalidate("upcoming")
+
+
+def invalidate_issues():
+    invalidate("issues")
+
+
+def invalidate_breadcrumbs():
+    invalidate("breadcrumbs")
+
+
+def invalidate_user(user_id):
+    invalidate("user:%d" % user_id)
+
+
+def cached(key, version_names, func):
+    versions = [get_version(name) for name in version_names]
+    cache_key = ":".join(["extravars", key] + versions)
+    return cache.get_or_set(cache_key, func, settings.EXTRAVARS_CACHE_TIMEOUT)
+
+
+def get_parliament(parliament_num):
+    """
+    Returns the requested parliament, or None if it does not exist.
+    """
+
+    def get():
+        return Parliament.objects.filter(parliament_num=parliament_num).first()
+
+    return cached("parliament:%d" % parliament_num, ["parliaments"], get)
+
+
+def get_upcoming():
+    """
+    Returns a tuple of the upcoming sessions and the upcoming committee
+    agendas, displayed in the menu on every page.
+    """
+
+    def get():
+        next_sessions = Session.objects.upcoming().select_related("parliament")
+        next_committee_agendas = CommitteeAgenda.objects.upcoming().select_related(
+            "parliament", "committee"
+        )
+        return list(next_sessions), list(next_committee_agendas)
+
+    # What is upcoming depends on the date as well as the data.
+    today = timezone.now().date().isoformat()
+
+    return cached("upcoming:%s" % today, ["upcoming"], get)
+
+
+def incoming_issues(user, parliament_num):
+    Issue = apps.get_model("core", "Issue")
+
+    return (
+        Issue.objects.select_related("parliament", "to_committee")
+        .filter(parliament__parliament_num=parliament_num)
+        .incoming(user)
+        .order_by("-issue_num")
+    )
+
+
+def get_user_news(user, parliament):
+    """
+    Returns a dictionary of the issues with news for the given user,
+    displayed in the user's menus on every page.
+    """
+
+    def get():
+        DossierStatistic = apps.get_model("dossier", "DossierStatistic")
+        Issue = apps.get_model("core", "Issue")
+        Subscription = apps.get_model("core", "Subscription")
+
+        # Monitors
+        monitored_issues = (
+            Issue.objects.select_related("parliament")
+            .filter(issue_monitors__user_id=user.id, parliament_id=parliament.id)
+            .annotate_news(user)
+            .exclude(new_documents=0, new_reviews=0)
+            .order_by("issue_num")
+        )
+
+        # Committee subscriptions
+        subscribed_committees = None
+        subscribed_issues = None
+        if settings.FEATURES["subscription_committee"]:
+            subscribed_committees = [
+                s.committee
+                for s in Subscription.objects.select_related("committee").filter(
+                    user=user
+                )
+            ]
+
+            subscribed_issues = Issue.objects.select_related("parliament").filter(
+                parliament_id=parliament.id, to_committee__in=subscribed_committees
+            )
+
+            # When new issues arrive into a committee to which the user is
+            # subscribed, it does not have a DossierStatistic and thus cannot
+            # show up in the user's news section. We need to create
+            # DossierStatistic objects for such issues. We can safely say
+            # that `has_useful_info` is True because we already know that:
+            #
+            # a) the issues are new to the user and
+            #
+            # b) they belong to an item subscribed to by the user.
+            #
+            # This is one of the criteria deeming an issue having useful
+            # information in `DossierStatistic.update_has_useful_info`.
+            #
+            # Create DossierStatistic objects for issues without one.
+            new_dossier_statistics = []
+            for issue in subscribed_issues.exclude(dossierstatistic__user_id=user.id):
+                new_dossier_statistics.append(
+                    DossierStatistic(
+                        user_id=user.id,
+                        issue_id=issue.id,
+                        has_useful_info=True,
+                    )
+                )
+            if len(new_dossier_statistics) > 0:
+                DossierStatistic.objects.bulk_create(new_dossier_statistics)
+                DossierStatistic.objects.filter(
+                    user_id=user.id,
+                    issue_id__in=[s.issue_id for s in new_dossier_statistics],
+                ).update_seen_counts()
+
+            # Annotate subscribed issues with news.
+            subscribed_issues = (
+                subscribed_issues.annotate_news(user)
+                .exclude(new_documents=0, new_reviews=0)
+                .order_by("issue_num")
+            )
+
+        # Hide concluded issues from relevant menus.
+        if user.userprofile.setting_hide_concluded_from_monitors:
+            monitored_issues = monitored_issues.exclude(current_step="concluded")
+            if settings.FEATURES["subscription_committee"]:
+                subscribed_issues = subscribed_issues.exclude(current_step="concluded")
+
+        # Get incoming things that the user has not yet seen
+        incoming = None
+        if settings.FEATURES["incoming_issues"]:
+            incoming = list(incoming_issues(user, parliament.parliament_num))
+
+        return {
+            "monitored_issues": list(monitored_issues),
+            "subscribed_committees": subscribed_committees,
+            "subscribed_issues": (
+                None if subscribed_issues is None else list(subscribed_issues)
+            ),
+            "incoming_issues": incoming,
+        }
+
+    return cached(
+        "user-news:%d:%d" % (user.id, parliament.parliament_num),
+        ["issues", "user:%d" % user.id],
+        get,
+    )
@@ -1,4 +1,3 @@
-from django.conf import settings
 from django.urls import reverse
 from django.db.models import F
 from django.db.models import Q
@@ -8,18 +7,15 @@ from django.utils import timezone
 from django.utils.translation import gettext as _
 
 from core.breadcrumbs import make_breadcrumbs
+from core.extravars import get_parliament
+from core.extravars import get_upcoming
+from core.extravars import get_user_news
 
 from djalthingi.althingi_settings import CURRENT_PARLIAMENT_NUM
-from djalthingi.models import CommitteeAgenda
-from djalthingi.models import Parliament
-from djalthingi.models import Session
 
 from core.models import AccessUtilities
-from core.models import Issue
 from core.models import IssueUtilities
-from core.models import Subscription
 from core.models import UserProfile
-from dossier.models import DossierStatistic
 
 
 class AccessMiddleware:
@@ -27,7 +23,12 @@ class AccessMiddleware:
         self.get_response = get_response
 
     def __call__(self, request):
-        return self.get_response(request)
+        response = self.get_response(request)
+
+        # Don't let access outlive the request, in case the context is reused.
+        AccessUtilities.clear_access()
+
+        return response
 
     def process_view(self, request, view_func, view_args, view_kwargs):
         AccessUtilities.cache_access(request.user)
@@ -59,9 +60,8 @@ class ExtraVarsMiddleware:
 
         # Figure out which parliament we're viewing
         parliament_num = int(view_kwargs.get("parliament_num", CURRENT_PARLIAMENT_NUM))
-        try:
-            parliament = Parliament.objects.get(parliament_num=parliament_num)
-        except Parliament.DoesNotExist:
+        parliament = get_parliament(parliament_num)
+        if parliament is None:
             # If the requested parliament isn't the current one, we raise a "page not found" error.
             if parliament_num != CURRENT_PARLIAMENT_NUM:
                 raise Http404
@@ -69,103 +69,19 @@ class ExtraVarsMiddleware:
             # We're missing data. We'll redirect to a help page if we're not already there.
             if view_func.__name__ != "parliament_missing_data":
                 return redirect(reverse("parliament_missing_data"))
-            else:
-                parliament = None
 
         # Stuff for logged in users
-        monitored_issues = None
-        incoming_issues = None
-        subscribed_committees = None
-        subscribed_issues = None
-        if request.user.is_authenticated:
-            # Monitors
-            monitored_issues = (
-                Issue.objects.select_related("parliament")
-                .filter(
-                    issue_monitors__user_id=request.user.id,
-                    parliament__parliament_num=parliament_num,
-                )
-                .annotate_news(request.user)
-                .exclude(new_documents=0, new_reviews=0)
-                .order_by("issue_num")
-            )
-
-            # Committee subscriptions
-            if settings.FEATURES["subscription_committee"]:
-                subscribed_committees = [
-                    s.committee
-                    for s in Subscription.objects.select_related("committee").filter(
-                        user=request.user
-                    )
-                ]
-
-                subscribed_issues = Issue.objects.select_related("parliament").filter(
-                    parliament_id=parliament.id, to_committee__in=subscribed_committees
-                )
-
-                # When new issues arrive into a committee to which the user
-                # is subscribed, it does not have a DossierStatistic and thus
-                # cannot show up in the user's news section. We need to
-                # create DossierStatistic objects for such issues. We can
-                # safely say that `has_useful_info` is True because we
-                # already know that:
-                #
-                # a) the issues are new to the user and
-                #
-                # b) they belong to an item subscribed to by the user.
-                #
-                # This is one of the criteria deeming an issue having useful
-                # information in `DossierStatistic.update_has_useful_info`.
-                #
-                # Create DossierStatistic objects for issues without one.
-                new_dossier_statistics = []
-                for issue in subscribed_issues.exclude(
-                    dossierstatistic__user_id=request.user.id
-                ):
-                    new_dossier_statistics.append(
-                        DossierStatistic(
-                            user_id=request.user.id,
-                            issue_id=issue.id,
-                            has_useful_info=True,
-                        )
-                    )
-                if len(new_dossier_statistics) > 0:
-                    DossierStatistic.objects.bulk_create(new_dossier_statistics)
-
-                # Annotate subscribed issues with news.
-                subscribed_issues = (
-                    subscribed_issues.annotate_news(request.user)
-                    .exclude(new_documents=0, new_reviews=0)
-                    .order_by("issue_num")
-                )
-
-            # Hide concluded issues from relevant menus.
-            if request.user.userprofile.setting_hide_concluded_from_monitors:
-                monitored_issues = monitored_issues.exclude(current_step="concluded")
-                if settings.FEATURES["subscription_committee"]:
-                    subscribed_issues = subscribed_issues.exclude(
-                        current_step="concluded"
-                    )
-
-            # Get incoming things that the user has not yet seen
-            if settings.FEATURES["incoming_issues"]:
-                incoming_issues = (
-                    Issue.objects.select_related("parliament", "to_committee")
-                    .filter(parliament__parliament_num=parliament_num)
-                    .incoming(request.user)
-                    .order_by("-issue_num")
-                )
-
-        # Get parliaments, next sessions and next committees (we use this virtually always)
-        next_sessions = Session.objects.upcoming().select_related("parliament")
-        next_committee_agendas = CommitteeAgenda.objects.upcoming().select_related(
-            "parliament", "committee"
-        )
+        user_news = {
+            "monitored_issues": None,
+            "subscribed_committees": None,
+            "subscribed_issues": None,
+            "incoming_issues": None,
+        }
+        if request.user.is_authenticated and parliament is not None:
+            user_news = get_user_news(request.user, parliament)
 
-        len(next_sessions)  # Forces a len() instead of a DB-call when count is checked
-        len(
-            next_committee_agendas
-        )  # Forces a len() instead of a DB-call when count is checked
+        # Get next sessions and next committees (we use this virtually always)
+        next_sessions, next_committee_agendas = get_upcoming()
 
         breadcrumbs = (
             None if parliament is None else make_breadcrumbs(request, parliament)
@@ -178,9 +94,9 @@ class ExtraVarsMiddleware:
             "breadcrumbs": breadcrumbs,
             "next_sessions": next_sessions,
             "next_committee_agendas": next_committee_agendas,
-            "monitored_issues": monitored_issues,
-            "subscribed_committees": subscribed_committees,
-            "subscribed_issues": subscribed_issues,
-            "incoming_issues": incoming_issues,
+            "monitored_issues": user_news["monitored_issues"],
+            "subscribed_committees": user_news["subscribed_committees"],
+            "subscribed_issues": user_news["subscribed_issues"],
+            "incoming_issues": user_news["incoming_issues"],
             "view_name": request.resolver_match.view_name,
         }
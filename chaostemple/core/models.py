@@ -1,6 +1,5 @@
-import operator
-from functools import reduce
-from threading import currentThread
+from contextvars import ContextVar
+from itertools import chain
 
 from django.apps import apps
 from django.conf import settings
@@ -8,10 +7,8 @@ from django.db import models
 from django.db.models import CASCADE
 from django.db.models import Count
 from django.db.models import F
-from django.db.models import IntegerField
-from django.db.models import OuterRef
+from django.db.models import FilteredRelation
 from django.db.models import Q
-from django.db.models import Subquery
 from django.urls import reverse
 from django.utils.safestring import mark_safe
 from django.utils import timezone
@@ -19,6 +16,8 @@ from django.utils.translation import gettext as _
 
 from djalthingi.althingi_settings import CURRENT_PARLIAMENT_NUM
 
+from core.extravars import invalidate_user
+
 from djalthingi.models import Issue as AlthingiIssue
 from djalthingi.models import IssueQuerySet as AlthingiIssueQuerySet
 from djalthingi.models import Document as AlthingiDocument
@@ -37,33 +36,17 @@ class IssueQuerySet(AlthingiIssueQuerySet):
         that the user has seen so far.
         """
 
-        q_filter = Q(dossiers__user_id=user.id)
-        if user.userprofile.setting_seen_if_worked_by_others:
-            # If the seen-if-worked-by-others setting is selected, we will
-            # count other users' seen items as seen by us.
-            Dossier = apps.get_model("dossier", "Dossier")
-            q_filter |= Q(dossiers__in=Dossier.objects.by_user(user))
-
-        news_subquery = Issue.objects.filter(
-            dossierstatistic__user_id=user.id, pk=OuterRef("pk")
-        ).annotate(
-            seen_documents=Count("dossiers__document", filter=q_filter, distinct=True),
-            seen_reviews=Count("dossiers__review", filter=q_filter, distinct=True),
-            seen_count=F("seen_documents") + F("seen_reviews"),
-            new_documents=F("document_count") - F("seen_documents"),
-            new_reviews=F("review_count") - F("seen_reviews"),
-        )
-
+        # The seen counts are kept up to date in the user's DossierStatistic
+        # for the issue, so that they need not be counted from dossiers on
+        # every request. See `DossierStatistic.update_seen_counts`.
         issues = self.annotate(
-            seen_count=Subquery(
-                news_subquery.values("seen_count"), output_field=IntegerField()
-            ),
-            new_documents=Subquery(
-                news_subquery.values("new_documents"), output_field=IntegerField()
-            ),
-            new_reviews=Subquery(
-                news_subquery.values("new_reviews"), output_field=IntegerField()
+            news=FilteredRelation(
+                "dossierstatistic", condition=Q(dossierstatistic__user_id=user.id)
             ),
+        ).annotate(
+            seen_count=F("news__seen_document_count") + F("news__seen_review_count"),
+            new_documents=F("document_count") - F("news__seen_document_count"),
+            new_reviews=F("review_count") - F("news__seen_review_count"),
         )
 
         return issues
@@ -77,10 +60,7 @@ class IssueQuerySet(AlthingiIssueQuerySet):
         issues = (
             self.annotate_news(user)
             .exclude(new_documents=0, new_reviews=0)
-            .filter(
-                dossierstatistic__user_id=user_id,
-                dossierstatistic__has_useful_info=True,
-            )
+            .filter(news__has_useful_info=True)
         )
 
         return issues
@@ -121,28 +101,105 @@ class SubscriptionManager(models.Manager):
 
 
 class AccessUtilities:
+    """
+    Provides the access that other users have granted to the currently
+    logged in user, resolved once per request by `AccessMiddleware`.
+
+    The access is stored in a context variable rather than on the class, so
+    that it is local to the request being processed, whether it runs in its
+    own thread or as an asynchronous task.
+    """
 
-    cache = {}
+    context = ContextVar("access_context", default=None)
 
     @staticmethod
     def get_access():
-        return AccessUtilities.cache[currentThread()]["access"]
+        return AccessUtilities.context.get()["access"]
 
     @staticmethod
     def get_user_id():
-        return AccessUtilities.cache[currentThread()]["user_id"]
+        return AccessUtilities.context.get()["user_id"]
+
+    @staticmethod
+    def get_full_access_user_ids():
+        """
+        Returns a set of the IDs of users who have granted full access.
+        """
+        return AccessUtilities.context.get()["full_access_user_ids"]
+
+    @staticmethod
+    def get_partial_access_issue_ids():
+        """
+        Returns a dictionary of sets of issue IDs to which access has been
+        granted, keyed by the ID of the user who granted it.
+        """
+        return AccessUtilities.context.get()["partial_access_issue_ids"]
+
+    @staticmethod
+    def get_access_filter(user_id_field="user_id", issue_id_field="issue_id"):
+        """
+        Returns a Q-object filtering objects, such as dossiers, belonging to
+        the current user or to users who have granted access to them.
+        """
+        access_filter = Q(
+            **{
+                "%s__in" % user_id_field: AccessUtilities.get_full_access_user_ids()
+                | {AccessUtilities.get_user_id()}
+            }
+        )
+        for (
+            user_id,
+            issue_ids,
+        ) in AccessUtilities.get_partial_access_issue_ids().items():
+            access_filter |= Q(
+                **{user_id_field: user_id, "%s__in" % issue_id_field: issue_ids}
+            )
+
+        return access_filter
 
     @staticmethod
     def cache_access(user):
-        group_ids = [g.id for g in user.groups.all()]
+        """
+        Resolves the access granted to the given user and makes it available
+        for the remainder of the current request. Returns a token for
+        `clear_access`.
+        """
+        if user.is_authenticated:
+            group_ids = [g.id for g in user.groups.all()]
+            access = list(
+                Access.objects.prefetch_related("issues").filter(
+                    Q(friend_id=user.id, friend_group_id=None)
+                    | Q(friend_group_id__in=group_ids, friend_id=None)
+                )
+            )
+        else:
+            access = []
+
+        full_access_user_ids = set()
+        partial_access_issue_ids = {}
+        for a in access:
+            if a.full_access:
+                full_access_user_ids.add(a.user_id)
+            else:
+                partial_access_issue_ids.setdefault(a.user_id, set()).update(
+                    i.id for i in a.issues.all()
+                )
 
-        AccessUtilities.cache[currentThread()] = {
-            "access": Access.objects.filter(
-                Q(friend_id=user.id, friend_group_id=None)
-                | Q(friend_group_id__in=group_ids, friend_id=None)
-            ),
-            "user_id": user.id,
-        }
+        return AccessUtilities.context.set(
+            {
+                "access": access,
+                "user_id": user.id,
+                "full_access_user_ids": full_access_user_ids,
+                "partial_access_issue_ids": partial_access_issue_ids,
+            }
+        )
+
+    @staticmethod
+    def clear_access(token=None):
+        if token is None:
+            AccessUtilities.context.set(None)
+        else:
+            AccessUtilities.context.reset(token)
 
 
 class IssueUtilities:
@@ -214,10 +271,17 @@ class IssueUtilities:
 
         # Bulk-update stats that need updating.
         DossierStatistic.objects.bulk_update(stats, ["has_useful_info"])
+        invalidate_user(user_id)
 
         # Bulk-crate stats that need creating.
         DossierStatistic.objects.bulk_create(stats_for_creation)
 
+        # Bulk-creating bypasses `DossierStatistic.save`, so the seen counts
+        # of the new stats need to be calculated separately.
+        DossierStatistic.objects.filter(
+            user_id=user_id, issue_id__in=[stat.issue_id for stat in stats_for_creation]
+        ).update_seen_counts()
+
     @staticmethod
     def populate_issue_data(issues):
         DossierStatistic = apps.get_model("dossier", "DossierStatistic")
@@ -225,49 +289,48 @@ class IssueUtilities:
         # Get currently logged in user ID
         user_id = AccessUtilities.get_user_id()
 
-        access_filter = Q()
-
-        # Get access objects and sort them
-        accesses = {"partial": [], "full": []}
-        for access in AccessUtilities.get_access():
-            accesses["full" if access.full_access else "partial"].append(access)
-
-        # Get dossier statistics from partial access given by other users
-        partial_conditions = []
-        dossier_statistics = DossierStatistic.objects.none()
-        for partial_access in accesses["partial"]:
-            for issue in partial_access.issues.all():
-                partial_conditions.append(
-                    Q(user_id=partial_access.user_id) & Q(issue_id=issue.id)
-                )
-        if len(partial_conditions) > 0:
-            access_filter = access_filter | Q(reduce(operator.or_, partial_conditions))
-
-        # Get dossier statistics from full access given by other users
-        visible_user_ids = [a.user_id for a in accesses["full"]]
-        access_filter = access_filter | Q(
-            Q(user_id__in=visible_user_ids) | Q(user_id=user_id)
-        )
+        issue_ids = [issue.id for issue in issues if issue is not None]
 
-        dossier_statistics = (
+        # Get dossier statistics of the user and those given access to by
+        # other users, grouped by issue. The user's own statistic goes first.
+        statistic_map = {}
+        for dossier_statistic in (
             DossierStatistic.objects.select_related("user__userprofile")
-            .filter(access_filter, issue__in=issues)
+            .filter(AccessUtilities.get_access_filter(), issue_id__in=issue_ids)
             .order_by("user__userprofile__initials")
-        )
+        ):
+            statistics = statistic_map.setdefault(dossier_statistic.issue_id, [])
+            if dossier_statistic.user_id == user_id:
+                statistics.insert(0, dossier_statistic)
+            else:
+                statistics.append(dossier_statistic)
 
         # Retrieve the monitors for the given issues, if any.
         monitor_map = {
-            m.issue_id: m for m in IssueMonitor.objects.filter(user_id=user_id)
+            m.issue_id: m
+            for m in IssueMonitor.objects.filter(
+                user_id=user_id, issue_id__in=issue_ids
+            )
         }
 
-        # Get subscriptions so that we can look them up by issue.
+        # Get subscriptions so that we can look them up by issue. Only the
+        # given issues are looked up, instead of every issue of every
+        # subscribed thing.
+        subscriptions = Subscription.objects.select_related(
+            "committee", "category"
+        ).filter(user_id=user_id)
+        subscription_by_id = {sub.id: sub for sub in subscriptions}
+        subscribed_issue_ids = chain(
+            subscriptions.filter(committee__issues__id__in=issue_ids).values_list(
+                "id", "committee__issues__id"
+            ),
+            subscriptions.filter(category__issues__id__in=issue_ids).values_list(
+                "id", "category__issues__id"
+            ),
+        )
         subscription_map = {}
-        subscriptions = Subscription.objects.select_subscribed().filter(user_id=user_id)
-        for sub in subscriptions:
-            for issue in sub.subscribed_thing().issues.all():
-                if not issue.id in subscription_map:
-                    subscription_map[issue.id] = []
-                subscription_map[issue.id].append(sub)
+        for sub_id, issue_id in subscribed_issue_ids:
+            subscription_map.setdefault(issue_id, []).append(subscription_by_id[sub_id])
 
         for issue in issues:
             if issue is None:
@@ -281,15 +344,8 @@ class IssueUtilities:
             if issue.id in subscription_map:
                 issue.subscriptions = subscription_map[issue.id]
 
-            for dossier_statistic in dossier_statistics:
-                if dossier_statistic.issue_id == issue.id:
-                    if not hasattr(issue, "dossier_statistics"):
-                        issue.dossier_statistics = []
-
-                    if dossier_statistic.user_id == user_id:
-                        issue.dossier_statistics.insert(0, dossier_statistic)
-                    else:
-                        issue.dossier_statistics.append(dossier_statistic)
+            if issue.id in statistic_map:
+                issue.dossier_statistics = statistic_map[issue.id]
 
         return issues
 
@@ -1,12 +1,36 @@
+from django.contrib.auth.models import User
+from django.db.models import Q
+from django.db.models.signals import m2m_changed
+from django.db.models.signals import post_delete
+from django.db.models.signals import post_save
 from django.db.models.signals import pre_delete
 from django.dispatch import receiver
 
 from djalthingi.exceptions import DataIntegrityException
 
+from djalthingi.models import Category
+from djalthingi.models import Committee
+from djalthingi.models import CommitteeAgenda
 from djalthingi.models import Document
+from djalthingi.models import Issue
+from djalthingi.models import Parliament
+from djalthingi.models import Party
+from djalthingi.models import Person
 from djalthingi.models import Review
+from djalthingi.models import Session
+
+from core.extravars import invalidate_breadcrumbs
+from core.extravars import invalidate_issues
+from core.extravars import invalidate_parliaments
+from core.extravars import invalidate_upcoming
+from core.extravars import invalidate_user
+from core.models import Access
+from core.models import IssueMonitor
+from core.models import Subscription
+from core.models import UserProfile
 
 from dossier.models import Dossier
+from dossier.models import DossierStatistic
 
 
 @receiver(pre_delete, sender=Review)
@@ -76,3 +100,93 @@ def delete_dossiers_on_deletion(sender, instance, **kwargs):
         else:
             # We can safely delete this dossier, since it's not useful.
             dossier.delete()
+
+
+def update_seen_counts_by_access(access):
+    """
+    Updates the seen counts of the users that the given access is granted
+    to, for the issues on which the granting user has useful dossiers.
+    """
+    friend_conditions = Q(user_id=access.friend_id)
+    if access.friend_group_id is not None:
+        friend_conditions |= Q(user__groups__id=access.friend_group_id)
+
+    DossierStatistic.objects.filter(
+        friend_conditions,
+        issue__dossiers__user_id=access.user_id,
+        issue__dossiers__is_useful=True,
+        user__userprofile__setting_seen_if_worked_by_others=True,
+    ).distinct().update_seen_counts()
+
+
+@receiver(post_save, sender=Access)
+@receiver(post_delete, sender=Access)
+def update_seen_counts_on_access_change(sender, instance, **kwargs):
+    update_seen_counts_by_access(instance)
+
+
+@receiver(m2m_changed, sender=Access.issues.through)
+def update_seen_counts_on_access_issues_change(sender, instance, action, **kwargs):
+    if action in ["post_add", "post_remove", "post_clear"]:
+        update_seen_counts_by_access(instance)
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+def update_seen_counts_on_group_change(sender, instance, action, **kwargs):
+    # Group membership determines which dossiers are visible to a user.
+    if action in ["post_add", "post_remove", "post_clear"]:
+        DossierStatistic.objects.filter(
+            user_id=instance.id,
+            user__userprofile__setting_seen_if_worked_by_others=True,
+        ).update_seen_counts()
+
+
+@receiver(post_save, sender=Parliament)
+@receiver(post_delete, sender=Parliament)
+def invalidate_cached_parliaments(sender, instance, **kwargs):
+    invalidate_parliaments()
+    invalidate_upcoming()
+
+
+@receiver(post_save, sender=Session)
+@receiver(post_delete, sender=Session)
+@receiver(post_save, sender=CommitteeAgenda)
+@receiver(post_delete, sender=CommitteeAgenda)
+def invalidate_cached_upcoming(sender, instance, **kwargs):
+    invalidate_upcoming()
+
+
+@receiver(post_save, sender=Issue)
+@receiver(post_delete, sender=Issue)
+def invalidate_cached_issues(sender, instance, **kwargs):
+    # Document and review counts are stored on the issue, so this also
+    # covers new documents and reviews.
+    invalidate_issues()
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=Committee)
+@receiver(post_delete, sender=Committee)
+@receiver(post_save, sender=CommitteeAgenda)
+@receiver(post_delete, sender=CommitteeAgenda)
+@receiver(post_save, sender=Party)
+@receiver(post_delete, sender=Party)
+@receiver(post_save, sender=Person)
+@receiver(post_delete, sender=Person)
+def invalidate_cached_breadcrumbs(sender, instance, **kwargs):
+    # Breadcrumb captions are built from these.
+    invalidate_breadcrumbs()
+
+
+@receiver(post_save, sender=Dossier)
+@receiver(post_delete, sender=Dossier)
+@receiver(post_save, sender=DossierStatistic)
+@receiver(post_delete, sender=DossierStatistic)
+@receiver(post_save, sender=IssueMonitor)
+@receiver(post_delete, sender=IssueMonitor)
+@receiver(post_save, sender=Subscription)
+@receiver(post_delete, sender=Subscription)
+@receiver(post_save, sender=UserProfile)
+def invalidate_cached_user_news(sender, instance, **kwargs):
+    invalidate_user(instance.user_id)
@@ -1,3 +1,509 @@
+from contextvars import copy_context
+from datetime import timedelta
+from unittest.mock import patch
+
+from django.contrib.auth.models import Group
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test import RequestFactory
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve
+from django.urls import reverse
+from django.utils import timezone
+
+from core import extravars
+from core.breadcrumbs import append_to_crumb_string
+from core.breadcrumbs import make_breadcrumbs
+from core.breadcrumbs import resolve_crumb
+
+from core.models import Access
+from core.models import AccessUtilities
+from core.models import IssueMonitor
+from core.models import IssueUtilities
+from core.models import Subscription
+from core.models import UserProfile
+
+from djalthingi.models import Category
+from djalthingi.models import CategoryGroup
+from djalthingi.models import Committee
+from djalthingi.models import CommitteeAgenda
+from djalthingi.models import CommitteeAgendaItem
+from djalthingi.models import Document
+from djalthingi.models import Issue
+from djalthingi.models import Parliament
+from djalthingi.models import Session
+from djalthingi.models import SessionAgendaItem
+
+from dossier.models import Dossier
+from dossier.models import DossierStatistic
+
+
+class PopulateIssueDataTest(TestCase):
+    def setUp(self):
+        self.parliament = Parliament.objects.create(
+            parliament_num=157, era="2026-2027", timing_start=timezone.now()
+        )
+        self.committee = Committee.objects.create(
+            name="allsherjar- og menntamálanefnd",
+            abbreviation_short="am",
+            abbreviation_long="allsh.- og menntmn.",
+            parliament_num_first=157,
+            committee_xml_id=201,
+        )
+        self.category = Category.objects.create(
+            name="Menntamál",
+            group=CategoryGroup.objects.create(
+                name="Mennta- og menningarmál", category_group_xml_id=1
+            ),
+            category_xml_id=1,
+        )
+
+        # The user, and others who have granted the user access.
+        self.users = []
+        for initials in ["ccc", "aaa", "bbb"]:
+            user = User.objects.create_user(initials, "%s@example.com" % initials)
+            UserProfile.objects.filter(user_id=user.id).update(initials=initials)
+            self.users.append(user)
+        self.user = self.users[0]
+
+        for user in self.users[1:]:
+            Access.objects.create(user=user, friend=self.user, full_access=True)
+
+        # Subscribing assumes a logged in user.
+        self.token = AccessUtilities.cache_access(self.user)
+
+        Subscription.objects.create(
+            user=self.user, sub_type="committee", committee=self.committee
+        )
+        Subscription.objects.create(
+            user=self.user, sub_type="category", category=self.category
+        )
+
+    def tearDown(self):
+        AccessUtilities.clear_access(self.token)
+
+    def create_issues(self, count):
+        """
+        Creates the given number of issues, of which every other one is
+        monitored, referred to the subscribed committee and in the subscribed
+        category, along with statistics of every user for every issue.
+        """
+        first_issue_num = Issue.objects.count() + 1
+        issues = Issue.objects.bulk_create(
+            [
+                Issue(
+                    parliament=self.parliament,
+                    issue_num=issue_num,
+                    issue_group="A",
+                    issue_type="l",
+                    name="Test issue %d" % issue_num,
+                    to_committee=self.committee if issue_num % 2 else None,
+                )
+                for issue_num in range(first_issue_num, first_issue_num + count)
+            ]
+        )
+
+        self.category.issues.add(*issues[::2])
+        IssueMonitor.objects.bulk_create(
+            [IssueMonitor(user=self.user, issue=issue) for issue in issues[::2]]
+        )
+        DossierStatistic.objects.bulk_create(
+            [
+                DossierStatistic(user=user, issue=issue)
+                for issue in issues
+                for user in self.users
+            ]
+        )
+
+        return list(Issue.objects.filter(id__in=[issue.id for issue in issues]))
+
+    def test_populate_issue_data(self):
+        issues = self.create_issues(4)
+
+        IssueUtilities.populate_issue_data(issues + [None])
+
+        for i, issue in enumerate(issues):
+            self.assertEqual(
+                [stat.user.userprofile.initials for stat in issue.dossier_statistics],
+                ["ccc", "aaa", "bbb"],
+            )
+            self.assertEqual(hasattr(issue, "monitor"), i % 2 == 0)
+            self.assertEqual(
+                sorted(sub.sub_type for sub in getattr(issue, "subscriptions", [])),
+                ["category", "committee"] if i % 2 == 0 else [],
+            )
+
+    def test_populate_issue_data_queries(self):
+        """
+        The number of queries doesn't grow with the number of issues, which
+        are matched with their data by issue ID.
+        """
+        for count in [10, 100]:
+            with self.subTest(count=count):
+                issues = self.create_issues(count)
+
+                with self.assertNumQueries(5):
+                    IssueUtilities.populate_issue_data(issues)
+
+                self.assertEqual(
+                    sum(len(issue.dossier_statistics) for issue in issues),
+                    count * len(self.users),
+                )
+
+
+class ExtraVarsTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+        self.parliament = Parliament.objects.create(
+            parliament_num=157, era="2026-2027", timing_start=timezone.now()
+        )
+
+    def test_cached(self):
+        calls = []
+
+        def get():
+            calls.append(None)
+            return len(calls)
+
+        self.assertEqual(extravars.cached("test", ["a", "b"], get), 1)
+        self.assertEqual(extravars.cached("test", ["a", "b"], get), 1)
+
+        # Invalidating any of the versions makes the value be re-created.
+        extravars.invalidate("b")
+        self.assertEqual(extravars.cached("test", ["a", "b"], get), 2)
+        self.assertEqual(extravars.cached("test", ["a"], get), 3)
+        self.assertEqual(extravars.cached("test", ["a"], get), 3)
+
+    def test_get_parliament(self):
+        self.assertEqual(extravars.get_parliament(157), self.parliament)
+        self.assertIsNone(extravars.get_parliament(156))
+
+        with self.assertNumQueries(0):
+            self.assertEqual(extravars.get_parliament(157).era, "2026-2027")
+
+        # Saving a parliament invalidates the cache.
+        self.parliament.era = "2026-2028"
+        self.parliament.save()
+        self.assertEqual(extravars.get_parliament(157).era, "2026-2028")
+
+    def test_get_upcoming(self):
+        self.assertEqual(extravars.get_upcoming(), ([], []))
+
+        # Saving a session invalidates the cache.
+        tomorrow = timezone.now() + timedelta(days=1)
+        session = Session.objects.create(
+            parliament=self.parliament,
+            session_num=1,
+            name="1. fundur",
+            timing_start_planned=tomorrow,
+            effective_date=timezone.localdate(tomorrow),
+        )
+
+        with self.assertNumQueries(2):
+            self.assertEqual(extravars.get_upcoming(), ([session], []))
+        with self.assertNumQueries(0):
+            self.assertEqual(extravars.get_upcoming(), ([session], []))
+
+        session.delete()
+        self.assertEqual(extravars.get_upcoming(), ([], []))
+
+
+class AccessTest(TestCase):
+    def setUp(self):
+        parliament = Parliament.objects.create(
+            parliament_num=157, era="2026-2027", timing_start=timezone.now()
+        )
+        self.issues = [
+            Issue.objects.create(
+                parliament=parliament,
+                issue_num=issue_num,
+                issue_group="A",
+                issue_type="l",
+                name="Test issue %d" % issue_num,
+            )
+            for issue_num in [1, 2]
+        ]
+        documents = [
+            Document.objects.create(
+                issue=issue,
+                doc_num=issue.issue_num,
+                doc_type="frumvarp",
+                time_published=timezone.now(),
+                is_main=True,
+            )
+            for issue in self.issues
+        ]
+
+        self.users = {
+            name: User.objects.create_user(name, "%s@example.com" % name)
+            for name in ["user", "full", "partial", "group", "other"]
+        }
+        self.user = self.users["user"]
+
+        group = Group.objects.create(name="Þingflokkur")
+        self.user.groups.add(group)
+
+        Access.objects.create(
+            user=self.users["full"], friend=self.user, full_access=True
+        )
+        Access.objects.create(user=self.users["partial"], friend=self.user).issues.add(
+            self.issues[0].id
+        )
+        Access.objects.create(
+            user=self.users["group"], friend_group=group, full_access=True
+        )
+        Access.objects.create(
+            user=self.users["other"], friend=self.users["full"], full_access=True
+        )
+
+        for user in self.users.values():
+            for document in documents:
+                Dossier.objects.create(user=user, document=document)
+
+    def visible_dossiers(self):
+        return sorted(
+            (dossier.user.username, dossier.issue.issue_num)
+            for dossier in Dossier.objects.filter(AccessUtilities.get_access_filter())
+        )
+
+    def test_cache_access(self):
+        token = AccessUtilities.cache_access(self.user)
+        self.addCleanup(AccessUtilities.clear_access, token)
+
+        self.assertEqual(AccessUtilities.get_user_id(), self.user.id)
+        self.assertEqual(
+            AccessUtilities.get_full_access_user_ids(),
+            {self.users["full"].id, self.users["group"].id},
+        )
+        self.assertEqual(
+            AccessUtilities.get_partial_access_issue_ids(),
+            {self.users["partial"].id: {self.issues[0].id}},
+        )
+        self.assertEqual(
+            self.visible_dossiers(),
+            [
+                ("full", 1),
+                ("full", 2),
+                ("group", 1),
+                ("group", 2),
+                ("partial", 1),
+                ("user", 1),
+                ("user", 2),
+            ],
+        )
+
+    def test_context(self):
+        token = AccessUtilities.cache_access(self.user)
+        self.addCleanup(AccessUtilities.clear_access, token)
+
+        # Access resolved in another context, such as another request, is
+        # kept apart.
+        context = copy_context()
+        context.run(AccessUtilities.cache_access, self.users["full"])
+
+        self.assertEqual(AccessUtilities.get_user_id(), self.user.id)
+        self.assertEqual(
+            context.run(AccessUtilities.get_full_access_user_ids),
+            {self.users["other"].id},
+        )
+
+        # Access is restored to what it was before it was resolved.
+        other_token = AccessUtilities.cache_access(self.users["other"])
+        AccessUtilities.clear_access(other_token)
+        self.assertEqual(AccessUtilities.get_user_id(), self.user.id)
+
+    def test_middleware(self):
+        with patch.object(
+            AccessUtilities, "cache_access", wraps=AccessUtilities.cache_access
+        ) as cache_access:
+            self.client.get(reverse("home"))
+
+        cache_access.assert_called_once()
+
+        # Access doesn't outlive the request.
+        self.assertIsNone(AccessUtilities.context.get())
+
+
+class UpcomingTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+        self.parliament = Parliament.objects.create(
+            parliament_num=157, era="2026-2027", timing_start=timezone.now()
+        )
+        self.committee = Committee.objects.create(
+            name="allsherjar- og menntamálanefnd",
+            abbreviation_short="am",
+            abbreviation_long="allsh.- og menntmn.",
+            parliament_num_first=157,
+            committee_xml_id=201,
+        )
+
+        tomorrow = timezone.now() + timedelta(days=1)
+        self.sessions = [
+            Session.objects.create(
+                parliament=self.parliament,
+                session_num=session_num,
+                name="%d. fundur" % session_num,
+                timing_start_planned=tomorrow + timedelta(hours=session_num),
+                effective_date=timezone.localdate(tomorrow),
+            )
+            for session_num in [1, 2]
+        ]
+        self.committee_agenda = CommitteeAgenda.objects.create(
+            parliament=self.parliament,
+            committee=self.committee,
+            timing_start_planned=tomorrow,
+            committee_agenda_xml_id=1,
+        )
+
+    def create_issue(self, sessions, committee_agenda=False):
+        """
+        Creates an issue on the agendas of the given sessions, and of the
+        committee agenda if requested.
+        """
+        issue_num = Issue.objects.count() + 1
+        issue = Issue.objects.create(
+            parliament=self.parliament,
+            issue_num=issue_num,
+            issue_group="A",
+            issue_type="l",
+            name="Test issue %d" % issue_num,
+        )
+        for session in sessions:
+            SessionAgendaItem.objects.create(
+                session=session,
+                order=session.session_agenda_items.count() + 1,
+                discussion_type="1",
+                issue=issue,
+            )
+        if committee_agenda:
+            CommitteeAgendaItem.objects.create(
+                committee_agenda=self.committee_agenda,
+                order=self.committee_agenda.committee_agenda_items.count() + 1,
+                name="Test issue %d" % issue_num,
+                issue=issue,
+            )
+        return issue
+
+    def get(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("upcoming"))
+        self.query_count = len(queries)
+        return response
+
+    def test_upcoming(self):
+        second = self.create_issue(self.sessions[1:], committee_agenda=True)
+        first = self.create_issue(self.sessions)
+        self.create_issue([])
+
+        response = self.get()
+
+        # Issues are listed in the order in which they are upcoming.
+        session_issues = response.context["session_issues"]
+        self.assertEqual(session_issues, [first, second])
+        self.assertEqual(session_issues[0].upcoming_sessions, self.sessions)
+        self.assertEqual(session_issues[1].upcoming_sessions, self.sessions[1:])
+
+        [committee_issue] = response.context["committee_issues"]
+        self.assertEqual(committee_issue, second)
+        self.assertEqual(
+            committee_issue.upcoming_committee_agendas, [self.committee_agenda]
+        )
+
+    def test_upcoming_queries(self):
+        self.create_issue(self.sessions, committee_agenda=True)
+
+        # Once what is cached for every page has been cached.
+        self.get()
+        self.get()
+        query_count = self.query_count
+
+        # The number of queries doesn't grow with the number of issues.
+        for i in range(5):
+            self.create_issue(self.sessions, committee_agenda=True)
+        self.get()
+
+        self.assertEqual(self.query_count, query_count)
+
+
+class BreadcrumbsTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+        self.parliament = Parliament.objects.create(
+            parliament_num=157, era="2026-2027", timing_start=timezone.now()
+        )
+        self.committee = Committee.objects.create(
+            name="allsherjar- og menntamálanefnd",
+            abbreviation_short="am",
+            abbreviation_long="allsh.- og menntmn.",
+            parliament_num_first=157,
+            committee_xml_id=201,
+        )
+
+    def make_breadcrumbs(self, path, crumb_string=None):
+        request = RequestFactory().get(
+            path, {} if crumb_string is None else {"from": crumb_string}
+        )
+        request.resolver_match = resolve(path)
+        return make_breadcrumbs(request, self.parliament)
+
+    def test_make_breadcrumbs(self):
+        committee_path = reverse("parliament_committee", args=[157, self.committee.id])
+
+        # Breadcrumbs lead through the pages that were visited on the way.
+        crumb_string = append_to_crumb_string(reverse("upcoming"), "")
+        breadcrumbs = self.make_breadcrumbs(committee_path, crumb_string)
+
+        self.assertEqual(
+            [breadcrumb["view"] for breadcrumb in breadcrumbs],
+            [
+                ("parliament", 157),
+                ("upcoming",),
+                ("parliament_committee", 157, self.committee.id),
+            ],
+        )
+        self.assertEqual(breadcrumbs[-1]["caption"], str(self.committee))
+
+        # The crumb string of each breadcrumb leads through those before it.
+        self.assertEqual(
+            [
+                [resolve_crumb(crumb).view_name for crumb in crumb_string.split(",")]
+                for crumb_string in [
+                    breadcrumb["crumb_string"] for breadcrumb in breadcrumbs[1:]
+                ]
+            ],
+            [
+                ["parliament"],
+                ["upcoming", "parliament"],
+            ],
+        )
+
+    def test_cached_caption(self):
+        path = reverse("parliament_committee", args=[157, self.committee.id])
+        self.make_breadcrumbs(path)
+
+        with self.assertNumQueries(0):
+            breadcrumbs = self.make_breadcrumbs(path)
+        self.assertEqual(breadcrumbs[-1]["caption"], str(self.committee))
+
+        # Saving what the caption is built from invalidates it.
+        self.committee.name = "efnahags- og viðskiptanefnd"
+        self.committee.save()
+        breadcrumbs = self.make_breadcrumbs(path)
+        self.assertEqual(breadcrumbs[-1]["caption"], str(self.committee))
+
+    def test_resolve_crumb(self):
+        crumb = append_to_crumb_string(reverse("upcoming"), "")
+        resolve_crumb(crumb)
 
-# Create your tests here.
+        hits = resolve_crumb.cache_info().hits
+        self.assertEqual(resolve_crumb(crumb).view_name, "upcoming")
+        self.assertEqual(resolve_crumb.cache_info().hits, hits + 1)
@@ -206,6 +206,7 @@ urlpatterns = [
         dataviews.subscription_toggle,
     ),
     re_path(r"^dossier/", include("dossier.urls")),
+    path("search/", include("search.urls")),
 ]
 
 if settings.FEATURES["incoming_issues"]:
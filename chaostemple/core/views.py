@@ -29,6 +29,7 @@ from django.utils.translation import gettext as _
 from chaostemple.settings import FEATURES
 from chaostemple.settings import MEANING_OF_RECENT
 
+from core.extravars import incoming_issues
 from core.models import Access
 from core.models import AccessUtilities
 from core.models import Document
@@ -48,11 +49,13 @@ from djalthingi.models import Category
 from djalthingi.models import CategoryGroup
 from djalthingi.models import Committee
 from djalthingi.models import CommitteeAgenda
+from djalthingi.models import CommitteeAgendaItem
 from djalthingi.models import CommitteeSeat
 from djalthingi.models import Parliament
 from djalthingi.models import Party
 from djalthingi.models import Person
 from djalthingi.models import Session
+from djalthingi.models import SessionAgendaItem
 
 
 def home(request):
@@ -136,66 +139,78 @@ def upcoming(request):
     next_sessions = request.extravars["next_sessions"]
     next_committee_agendas = request.extravars["next_committee_agendas"]
 
-    # Get issues that are upcoming in sessions
-    # They are prepended with "garbled_" because we know in advance that they may contain duplicates.
-    garbled_session_issues = (
-        Issue.objects.select_related("parliament", "to_committee")
-        .prefetch_related("proposers__person", "session_agenda_items__session")
-        .filter(issue_group="A", session_agenda_items__session__in=next_sessions)
+    today = timezone.now().replace(hour=0, minute=0, second=0, microsecond=0)
+
+    # Only sessions and committee agendas planned from today onward are
+    # listed with each issue, in the order in which they are upcoming.
+    planned_sessions = {
+        session.id: session
+        for session in next_sessions
+        if session.timing_start_planned is not None
+        and session.timing_start_planned >= today
+    }
+    planned_committee_agendas = {
+        agenda.id: agenda
+        for agenda in next_committee_agendas
+        if agenda.timing_start_planned >= today
+    }
+
+    # Find the upcoming issues and where they are upcoming, from all the
+    # agenda items at once. Agenda items are retrieved in the order in which
+    # they are upcoming, and dicts are used as ordered sets of IDs, so both
+    # the issues and their sessions or agendas end up in that order.
+    session_issue_map = {}
+    for issue_id, session_id in (
+        SessionAgendaItem.objects.filter(
+            session__in=next_sessions, issue__issue_group="A"
+        )
+        .order_by("session__session_num", "order")
+        .values_list("issue_id", "session_id")
+    ):
+        session_ids = session_issue_map.setdefault(issue_id, {})
+        if session_id in planned_sessions:
+            session_ids[session_id] = None
+
+    committee_issue_map = {}
+    for issue_id, committee_agenda_id in (
+        CommitteeAgendaItem.objects.filter(
+            committee_agenda__in=next_committee_agendas, issue__isnull=False
+        )
         .order_by(
-            "session_agenda_items__session__session_num", "session_agenda_items__order"
+            "committee_agenda__timing_start_planned",
+            "committee_agenda__committee__name",
         )
-        .distinct()
-    )
+        .values_list("issue_id", "committee_agenda_id")
+    ):
+        committee_agenda_ids = committee_issue_map.setdefault(issue_id, {})
+        if committee_agenda_id in planned_committee_agendas:
+            committee_agenda_ids[committee_agenda_id] = None
 
-    # Get issues that are upcoming in committee agendas
-    # They are prepended with "garbled_" because we know in advance that they may contain duplicates.
-    garbled_committee_issues = (
+    issues = (
         Issue.objects.select_related("parliament", "to_committee")
-        .prefetch_related(
-            "proposers__person",
-            "committee_agenda_items__committee_agenda",
-        )
-        .filter(committee_agenda_items__committee_agenda__in=next_committee_agendas)
-        .order_by("committee_agenda_items__committee_agenda__timing_start_planned")
-        .distinct()
+        .prefetch_related("proposers__person")
+        .in_bulk(list(session_issue_map) + list(committee_issue_map))
     )
 
-    # Remove duplicates which cannot be excluded by database query, since same issue may pop up at two different times.
     session_issues = []
-    for issue in garbled_session_issues:
-        if issue not in session_issues:
-            session_issues.append(issue)
+    for issue_id, session_ids in session_issue_map.items():
+        issue = issues[issue_id]
+        issue.upcoming_sessions = [
+            planned_sessions[session_id] for session_id in session_ids
+        ]
+        session_issues.append(issue)
+
     committee_issues = []
-    for issue in garbled_committee_issues:
-        if issue not in committee_issues:
-            committee_issues.append(issue)
+    for issue_id, committee_agenda_ids in committee_issue_map.items():
+        issue = issues[issue_id]
+        issue.upcoming_committee_agendas = [
+            planned_committee_agendas[committee_agenda_id]
+            for committee_agenda_id in committee_agenda_ids
+        ]
+        committee_issues.append(issue)
 
     # Get the relevant dossier statistics
-    IssueUtilities.populate_issue_data(session_issues + committee_issues)
-
-    today = timezone.now().replace(hour=0, minute=0, second=0, microsecond=0)
-
-    # Get upcoming sessions for each issue (can this be optimized?)
-    for issue in session_issues:
-        issue.upcoming_sessions = (
-            Session.objects.select_related("parliament")
-            .filter(
-                session_agenda_items__issue_id=issue.id, timing_start_planned__gte=today
-            )
-            .distinct()
-        )
-
-    # Get upcoming committee agendas for each issue (can this be optimized?)
-    for issue in committee_issues:
-        issue.upcoming_committee_agendas = (
-            CommitteeAgenda.objects.select_related("parliament", "committee")
-            .filter(
-                committee_agenda_items__issue_id=issue.id,
-                timing_start_planned__gte=today,
-            )
-            .distinct()
-        )
+    IssueUtilities.populate_issue_data(list(issues.values()))
 
     ctx = {
         "session_issues": session_issues,
@@ -934,7 +949,7 @@ def user_issues_monitored(request, parliament_num):
 @login_required
 def user_issues_incoming(request):
 
-    issues = request.extravars["incoming_issues"].prefetch_related(
+    issues = incoming_issues(request.user, CURRENT_PARLIAMENT_NUM).prefetch_related(
         "proposers__person", "proposers__committee"
     )
 
@@ -18,7 +18,6 @@ class DocumentAdmin(admin.ModelAdmin):
         "is_main",
         "html_remote_path",
         "pdf_remote_path",
-        "xhtml",
     )
 
 
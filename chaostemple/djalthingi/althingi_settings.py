@@ -15,15 +15,79 @@ XML_ERROR_DIR = os.path.join(XML_CACHE_DIR, "invalid")
 DOWNLOAD_DOCUMENTS = False
 DOWNLOAD_REVIEWS = False
 
+# Cache of remote PDF files that haven't been downloaded permanently.
+# - PDF_CACHE_DIR: Directory of cached files.
+# - PDF_CACHE_MAX_SIZE: Maximum total size of cached files in bytes. The
+#   least recently used files are evicted when it's exceeded.
+# - PDF_PREFETCH_DAYS: Reviews arriving within this many days are retrieved
+#   into the cache in the background when imported. Set to 0 to disable.
+# - PDF_PREFETCH_WORKERS: Number of threads used for prefetching.
+# - PDF_REQUEST_TIMEOUT: Timeout in seconds for retrieving a file that a web
+#   request is waiting for. Only a single attempt is made.
+PDF_CACHE_DIR = os.path.join(BASE_DIR, "djalthingi/pdfcache")
+PDF_CACHE_MAX_SIZE = 2 * 1024 * 1024 * 1024
+PDF_REQUEST_TIMEOUT = 5
+PDF_PREFETCH_DAYS = 14
+PDF_PREFETCH_WORKERS = 2
+
+# Directory of cached CSV exports of closed parliaments.
+EXPORT_CACHE_DIR = os.path.join(BASE_DIR, "djalthingi/exportcache")
+
+# Seconds for which a generated iCal feed of committee agendas is cached.
+# Feeds are regenerated sooner when agendas change, provided that the cache
+# is shared between the importer and the web server.
+ICAL_CACHE_TIMEOUT = 600
+
+# Schedule of the importer service, `python manage.py run_importer`, which
+# keeps data fresh without having to run `update_althingi` periodically.
+# - IMPORTER_FEEDS: Arguments to `update_althingi` along with the interval in
+#   seconds between updates while parliament is sitting, and otherwise. An
+#   interval of None means that the feed isn't updated at all. Feeds that
+#   are due at the same time are updated in the order listed.
+# - IMPORTER_SITTING_HOURS: The hours during which parliament is considered
+#   sitting, provided that it has a session that day.
+# - IMPORTER_JITTER: Intervals are randomly varied by up to this fraction, so
+#   that feeds don't end up always being updated at the same time.
+# - IMPORTER_RETRY_DELAY, IMPORTER_MAX_RETRY_DELAY: Seconds until a failed
+#   update is retried. The delay is doubled after each consecutive failure of
+#   the same feed, up to the maximum.
+IMPORTER_FEEDS = [
+    ("upcoming", 5 * 60, 15 * 60),
+    ("vote_castings days=1", 10 * 60, 6 * 60 * 60),
+    ("speeches days=1", 10 * 60, 6 * 60 * 60),
+    ("issues", 60 * 60, 6 * 60 * 60),
+    ("committee_agendas", 60 * 60, 6 * 60 * 60),
+    ("persons parties", 24 * 60 * 60, 24 * 60 * 60),
+]
+IMPORTER_SITTING_HOURS = (9, 24)
+IMPORTER_JITTER = 0.1
+IMPORTER_RETRY_DELAY = 60
+IMPORTER_MAX_RETRY_DELAY = 60 * 60
+
 # Development flags
 # - XML_USE_CACHE: Cache XML for no internet or to save bandwidth.
 # - XML_SAVE_INVALID: Save invalid XML files for ability to investigate.
 XML_USE_CACHE = False
 XML_SAVE_INVALID = False
 
+# Revalidate cached XML against the remote host with conditional requests
+# (ETag/Last-Modified), falling back to a content hash, so that unchanged
+# documents aren't transferred again. Whether processing a document can be
+# skipped is decided by digests stored in the database along with its data.
+# Intended for production use and ignored when XML_USE_CACHE is enabled.
+XML_REVALIDATE_CACHE = False
+
 # Timeout in seconds for retrieving remote XML files
 REMOTE_CONTENT_TIMEOUT = 10
 
+# Concurrent prefetching of XML documents
+# - XML_FETCH_WORKERS: Number of threads (and pooled connections) used when
+#   prefetching listings of XML documents. Set to 1 to disable concurrency.
+# - XML_FETCH_RATE_LIMIT: Maximum number of requests per second sent to a
+#   single host. Set to 0 for no limit.
+XML_FETCH_WORKERS = 8
+XML_FETCH_RATE_LIMIT = 10
+
 ALTHINGI_ISSUE_URL = "https://www.althingi.is/thingstorf/thingmalalistar-eftir-thingum/ferill/?ltg=%d&mnr=%d"  # % (parliament_num, issue_num)
 ALTHINGI_PERSON_URL = (
     "http://www.althingi.is/altext/cv/is/?nfaerslunr=%d"  # % person_xml_id
@@ -2,6 +2,17 @@ class AlthingiException(Exception):
     pass
 
 
+class RemoteContentException(AlthingiException):
+    """
+    Content could not be retrieved from the remote host, or the remote host
+    responded with an error instead of the content. Usually temporary.
+    """
+
+    def __init__(self, msg, url):
+        super().__init__(msg)
+        self.url = url
+
+
 class InvalidDocumentException(Exception):
     pass
 
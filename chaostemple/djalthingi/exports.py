@@ -0,0 +1,506 @@
+import csv
+import os
+from glob import glob
+from io import StringIO
+from tempfile import NamedTemporaryFile
+
+from django.db import connection
+from django.template.defaultfilters import capfirst
+from django.utils.text import format_lazy
+from django.utils.translation import gettext_lazy as _
+
+from djalthingi import althingi_settings
+from djalthingi.models import Document
+from djalthingi.models import Issue
+from djalthingi.models import Speech
+from djalthingi.models import Vote
+from djalthingi.models import VoteCasting
+
+# CSV exports of parliamentary data, produced row by row as they are sent so
+# that exports spanning many parliaments never have to be held in memory.
+#
+# An export is a function registered with the `export` decorator, which
+# yields the rows of a single parliament. Exports of several parliaments are
+# their rows one parliament after another, under a single header.
+#
+# Closed parliaments don't change once they've been fully updated after
+# closing, so their rows are cached on disk in `EXPORT_CACHE_DIR` as they are
+# first produced. Cached files are named by the time of the parliament's last
+# full update, so that a new full update makes the importer's changes
+# visible in exports.
+
+EXPORTS = {}
+
+# Size in bytes of the chunks in which CSV is sent.
+CHUNK_SIZE = 64 * 1024
+
+# Number of rows fetched from the database at a time.
+ITERATOR_CHUNK_SIZE = 2000
+
+
+def export(name, columns):
+    def decorator(rows):
+        EXPORTS[name] = (columns, rows)
+        return rows
+
+    return decorator
+
+
+def capfirst_or_none(value):
+    # Django's `capfirst` turns None into "None".
+    return capfirst(value) if value is not None else None
+
+
+def iter_csv(rows):
+    """
+    Turns rows into CSV, in UTF-8 encoded chunks of roughly `CHUNK_SIZE`.
+    """
+    buffer = StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow(row)
+        if buffer.tell() >= CHUNK_SIZE:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+
+    if buffer.tell() > 0:
+        yield buffer.getvalue().encode("utf-8")
+
+
+def iter_export(name, parliaments, **filters):
+    """
+    Returns an iterator over the CSV of the given export for the given
+    parliaments, header first. Filters are passed on to the export and
+    bypass the cache.
+
+    Everything that depends on the request, such as the language of the
+    header, is resolved before returning, because the iterator is consumed
+    after the request has been handled.
+    """
+    columns, rows = EXPORTS[name]
+    header = list(iter_csv([[str(column) for column in columns]]))
+    parliaments = list(parliaments)
+
+    def generate():
+        yield from header
+        for parliament in parliaments:
+            if not filters and is_closed(parliament):
+                yield from iter_cached(name, parliament)
+            else:
+                yield from iter_csv(rows(parliament, **filters))
+
+    return generate()
+
+
+def is_closed(parliament):
+    return (
+        parliament.timing_end is not None
+        and parliament.last_full_update is not None
+        and parliament.last_full_update > parliament.timing_end
+    )
+
+
+def cache_filename(name, parliament):
+    return os.path.join(
+        althingi_settings.EXPORT_CACHE_DIR,
+        "%s-%d-%d.csv"
+        % (name, parliament.parliament_num, parliament.last_full_update.timestamp()),
+    )
+
+
+def iter_cached(name, parliament):
+    filename = cache_filename(name, parliament)
+
+    try:
+        f = open(filename, "rb")
+    except FileNotFoundError:
+        yield from iter_caching(name, parliament, filename)
+        return
+
+    with f:
+        while True:
+            chunk = f.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            yield chunk
+
+
+def iter_caching(name, parliament, filename):
+    columns, rows = EXPORTS[name]
+
+    # Written to a temporary file while being sent, and only moved in place
+    # once complete, so that an interrupted export never gets cached.
+    dirname = os.path.dirname(filename)
+    os.makedirs(dirname, exist_ok=True)
+    with NamedTemporaryFile(dir=dirname, delete=False) as f:
+        try:
+            for chunk in iter_csv(rows(parliament)):
+                f.write(chunk)
+                yield chunk
+        except BaseException:
+            f.close()
+            os.remove(f.name)
+            raise
+    os.replace(f.name, filename)
+
+    # Remove files cached before the parliament's last full update.
+    for outdated in glob(
+        os.path.join(dirname, "%s-%d-*.csv" % (name, parliament.parliament_num))
+    ):
+        if outdated != filename:
+            os.remove(outdated)
+
+
+@export(
+    "issues",
+    [
+        _("Parliament"),
+        _("Nr"),
+        _("Name"),
+        _("Issue type"),
+        _("Status"),
+        _("Fate"),
+        format_lazy("{} ({})", _("Proposer"), _("person")),
+        format_lazy("{} ({})", _("Proposer"), _("committee")),
+        _("Published"),
+        _("Issue origin"),
+        _("Minister"),
+        _("Party"),
+        _("Committee"),
+        _("Rapporteur"),
+        _("Committee meetings"),
+    ],
+)
+def issue_rows(parliament, issue_nums=None):
+
+    params = [parliament.id]
+    issue_nums_condition = ""
+    if issue_nums is not None:
+        issue_nums_condition = "AND i.issue_num IN (%s)" % ", ".join(
+            ["%s"] * len(issue_nums)
+        )
+        params.extend(issue_nums)
+
+    # Standard SQL not only used for a massive performance boost but actually
+    # also for clarity. The ORM way turned out to be way more convoluted and
+    # involved a lot of advanced ORM features.
+    issues = Issue.objects.raw(
+        """
+        SELECT DISTINCT
+            i.id,
+            i.issue_num,
+            i.issue_type,
+            i.name,
+            i.description,
+            i.current_step,
+            i.fate,
+            prop_pers.name AS proposer_person,
+            prop_com.name AS proposer_committee,
+            i.proposer_type,
+            mini.name AS minister,
+            i.time_published,
+            party.name AS party,
+            com.name AS committee,
+            rap_pers.name AS rapporteur,
+            COUNT(DISTINCT cai.id) AS committee_meeting_count
+        FROM
+            -- Basic info
+            djalthingi_issue AS i
+
+            -- Proposers
+            INNER JOIN djalthingi_proposer AS prop ON (
+                prop.issue_id = i.id
+                AND (
+                    prop.%(order)s = 1
+                    OR prop.%(order)s IS NULL
+                )
+            )
+            LEFT OUTER JOIN djalthingi_person AS prop_pers ON (
+                prop_pers.id = prop.person_id
+            )
+            LEFT OUTER JOIN djalthingi_committee AS prop_com ON (
+                prop_com.id = prop.committee_id
+            )
+
+            -- Timing of person's seat, party etc.
+            LEFT OUTER JOIN djalthingi_seat AS seat ON (
+                seat.person_id = prop_pers.id
+                AND (
+                    seat.timing_out >= i.time_published
+                    OR seat.timing_out IS NULL
+                )
+                AND seat.timing_in <= i.time_published
+            )
+            LEFT OUTER JOIN djalthingi_ministerseat AS mseat ON (
+                mseat.person_id = prop_pers.id
+                AND (
+                    mseat.timing_out >= i.time_published
+                    OR mseat.timing_out IS NULL
+                )
+                AND mseat.timing_in <= i.time_published
+            )
+            LEFT OUTER JOIN djalthingi_minister AS mini ON (
+                mini.id = mseat.minister_id
+            )
+            LEFT OUTER JOIN djalthingi_party AS party ON (
+                party.id = seat.party_id
+                OR party.id = mseat.party_id
+            )
+
+            -- Committee
+            LEFT OUTER JOIN djalthingi_committee AS com ON com.id = i.to_committee_id
+            LEFT OUTER JOIN djalthingi_rapporteur AS rap ON rap.issue_id = i.id
+            LEFT OUTER JOIN djalthingi_person AS rap_pers ON rap_pers.id = rap.person_id
+            LEFT OUTER JOIN djalthingi_committeeagendaitem AS cai ON cai.issue_id = i.id
+        WHERE
+            i.parliament_id = %%s
+            AND i.issue_group = 'A'
+            %(issue_nums_condition)s
+        GROUP BY
+            i.id,
+            i.issue_num,
+            i.issue_type,
+            i.name,
+            i.description,
+            i.current_step,
+            i.fate,
+            proposer_person,
+            proposer_committee,
+            i.proposer_type,
+            i.time_published,
+            party,
+            committee,
+            rapporteur
+        ORDER BY
+            i.issue_num
+        """
+        % {
+            "order": connection.ops.quote_name("order"),
+            "issue_nums_condition": issue_nums_condition,
+        },
+        params,
+    )
+
+    for issue in issues.iterator():
+        if len(issue.description):
+            name = "%s (%s)" % (capfirst_or_none(issue.name), issue.description)
+        else:
+            name = capfirst_or_none(issue.name)
+
+        yield [
+            parliament.parliament_num,
+            issue.issue_num,
+            name,
+            capfirst_or_none(issue.get_issue_type_display()),
+            issue.get_current_step_display(),
+            capfirst_or_none(issue.get_fate_display()),
+            issue.proposer_person,
+            issue.proposer_committee,
+            issue.time_published.strftime("%Y-%m-%d"),
+            issue.get_proposer_type_display(),
+            capfirst_or_none(issue.minister),
+            capfirst_or_none(issue.party),
+            capfirst_or_none(issue.committee),
+            capfirst_or_none(issue.rapporteur),
+            issue.committee_meeting_count,
+        ]
+
+
+@export(
+    "documents",
+    [
+        _("Parliament"),
+        _("Issue"),
+        _("Nr"),
+        _("Document type"),
+        _("Published"),
+        _("Main document"),
+        _("Law identifier"),
+        "HTML",
+        "PDF",
+    ],
+)
+def document_rows(parliament):
+    documents = (
+        Document.objects.filter(issue__parliament=parliament)
+        .order_by("doc_num")
+        .values_list(
+            "issue__issue_num",
+            "doc_num",
+            "doc_type",
+            "time_published",
+            "is_main",
+            "law_identifier",
+            "html_remote_path",
+            "pdf_remote_path",
+        )
+    )
+
+    doc_types = dict(Document.DOCUMENT_TYPES)
+    for (
+        issue_num,
+        doc_num,
+        doc_type,
+        time_published,
+        is_main,
+        law_identifier,
+        html_remote_path,
+        pdf_remote_path,
+    ) in documents.iterator(chunk_size=ITERATOR_CHUNK_SIZE):
+        yield [
+            parliament.parliament_num,
+            issue_num,
+            doc_num,
+            capfirst_or_none(doc_types.get(doc_type, doc_type)),
+            time_published.strftime("%Y-%m-%d %H:%M"),
+            int(is_main),
+            law_identifier,
+            html_remote_path,
+            pdf_remote_path,
+        ]
+
+
+@export(
+    "vote-castings",
+    [
+        _("Parliament"),
+        _("Nr"),
+        _("Time"),
+        _("Issue"),
+        _("Document"),
+        _("Type"),
+        _("Specifics"),
+        _("Method"),
+        _("Yes"),
+        _("No"),
+        _("Abstain"),
+        _("Conclusion"),
+    ],
+)
+def vote_casting_rows(parliament):
+    vote_castings = (
+        VoteCasting.objects.filter(session__parliament=parliament)
+        .order_by("timing", "vote_casting_xml_id")
+        .values_list(
+            "vote_casting_xml_id",
+            "timing",
+            "issue__issue_num",
+            "document__doc_num",
+            "vote_casting_type_text",
+            "specifics",
+            "method",
+            "count_yes",
+            "count_no",
+            "count_abstain",
+            "conclusion",
+        )
+    )
+
+    for vote_casting_xml_id, timing, *values in vote_castings.iterator(
+        chunk_size=ITERATOR_CHUNK_SIZE
+    ):
+        yield [
+            parliament.parliament_num,
+            vote_casting_xml_id,
+            timing.strftime("%Y-%m-%d %H:%M:%S"),
+            *values,
+        ]
+
+
+@export(
+    "votes",
+    [
+        _("Parliament"),
+        _("Vote casting"),
+        _("Time"),
+        _("Issue"),
+        _("Person"),
+        _("Vote"),
+    ],
+)
+def vote_rows(parliament):
+    votes = (
+        Vote.objects.filter(vote_casting__session__parliament=parliament)
+        .order_by("vote_casting__timing", "vote_casting__vote_casting_xml_id", "id")
+        .values_list(
+            "vote_casting__vote_casting_xml_id",
+            "vote_casting__timing",
+            "vote_casting__issue__issue_num",
+            "person__name",
+            "vote_response",
+        )
+    )
+
+    for (
+        vote_casting_xml_id,
+        timing,
+        issue_num,
+        person_name,
+        vote_response,
+    ) in votes.iterator(chunk_size=ITERATOR_CHUNK_SIZE):
+        yield [
+            parliament.parliament_num,
+            vote_casting_xml_id,
+            timing.strftime("%Y-%m-%d %H:%M:%S"),
+            issue_num,
+            person_name,
+            vote_response,
+        ]
+
+
+@export(
+    "speeches",
+    [
+        _("Parliament"),
+        _("Issue"),
+        _("Session"),
+        _("Person"),
+        _("Start"),
+        _("End"),
+        _("Seconds"),
+        _("Speech type"),
+        _("Iteration"),
+        _("President"),
+    ],
+)
+def speech_rows(parliament):
+    speeches = (
+        Speech.objects.filter(session__parliament=parliament)
+        .order_by("timing_start", "id")
+        .values_list(
+            "issue__issue_num",
+            "session__session_num",
+            "person__name",
+            "timing_start",
+            "timing_end",
+            "seconds",
+            "speech_type",
+            "iteration",
+            "president",
+        )
+    )
+
+    for (
+        issue_num,
+        session_num,
+        person_name,
+        timing_start,
+        timing_end,
+        seconds,
+        speech_type,
+        iteration,
+        president,
+    ) in speeches.iterator(chunk_size=ITERATOR_CHUNK_SIZE):
+        yield [
+            parliament.parliament_num,
+            issue_num,
+            session_num,
+            person_name,
+            timing_start.strftime("%Y-%m-%d %H:%M:%S"),
+            timing_end.strftime("%Y-%m-%d %H:%M:%S"),
+            seconds,
+            speech_type,
+            iteration,
+            int(president),
+        ]
@@ -0,0 +1,176 @@
+from hashlib import sha256
+from uuid import uuid4
+
+from django.core.cache import cache
+from django.db.models import Prefetch
+from django.template.defaultfilters import capfirst
+from ics import Calendar
+from ics import Event
+
+from djalthingi import althingi_settings
+from djalthingi.althingi_settings import CURRENT_PARLIAMENT_NUM
+from djalthingi.models import CommitteeAgenda
+from djalthingi.models import CommitteeAgendaItem
+from djalthingi.templatetags.external_urls import external_issue_url
+from djalthingi.utils import icelandic_am_pm
+from djalthingi.utils import ICELANDIC_MONTHS
+from djalthingi.utils import monkey_patch_ical
+
+# Calendar feeds of committee agendas, serialized once and cached for each
+# requested set of committees until the agendas of one of the committees
+# change.
+#
+# Each committee has a version, which is replaced when its agendas change
+# (see `invalidate_committee`), and a feed is cached by the versions of its
+# committees. Versions are stored in the same cache as the feeds, so changes
+# made by the importer in another process are only picked up immediately
+# when a cache backend is shared between processes. Otherwise, they are
+# picked up when the cached feed expires, according to
+# `ICAL_CACHE_TIMEOUT`.
+
+
+def version_key(committee_id):
+    return "ical-version:%d" % committee_id
+
+
+def invalidate_committee(committee_id):
+    cache.delete(version_key(committee_id))
+
+
+def get_committee_agendas_ical(committee_ids):
+    """
+    Returns a tuple of an ETag and the calendar feed of the agendas of the
+    given committees in the current parliament.
+    """
+    committee_ids = sorted(committee_ids)
+
+    keys = [version_key(committee_id) for committee_id in committee_ids]
+    versions = cache.get_many(keys)
+    new_versions = {key: uuid4().hex for key in keys if key not in versions}
+    if new_versions:
+        cache.set_many(new_versions, None)
+        versions.update(new_versions)
+
+    # Hashed to keep the key within the length limits of cache backends.
+    feed_key = "ical:%d:%s" % (
+        CURRENT_PARLIAMENT_NUM,
+        sha256(
+            ",".join(
+                "%d.%s" % (committee_id, versions[key])
+                for committee_id, key in zip(committee_ids, keys)
+            ).encode()
+        ).hexdigest(),
+    )
+
+    feed = cache.get(feed_key)
+    if feed is None:
+        ical_text = make_committee_agendas_ical(committee_ids)
+        etag = '"%s"' % sha256(ical_text.encode("utf-8")).hexdigest()
+        feed = (etag, ical_text)
+        cache.set(feed_key, feed, althingi_settings.ICAL_CACHE_TIMEOUT)
+
+    return feed
+
+
+def make_committee_agendas_ical(committee_ids):
+    cal = Calendar()
+    cal.creator = "-//Alþingi//NONSGML Fastanefndir Alþingis//IS"
+    cal.scale = "GREGORIAN"
+    cal.method = "PUBLISH"
+
+    agendas = (
+        CommitteeAgenda.objects.select_related("committee")
+        .prefetch_related(
+            Prefetch(
+                "committee_agenda_items",
+                queryset=CommitteeAgendaItem.objects.select_related(
+                    "issue__parliament"
+                ),
+            )
+        )
+        .filter(
+            parliament__parliament_num=CURRENT_PARLIAMENT_NUM,
+            committee_id__in=committee_ids,
+        )
+        .order_by("timing_start_planned")
+    )
+
+    for agenda in agendas:
+        # Short-hand.
+        agenda_id = agenda.committee_agenda_xml_id
+
+        description = "Dagskrá:\n\n"
+        for item in agenda.committee_agenda_items.all():
+            description += "%d. %s\n" % (item.order, capfirst(item.name))
+            # Add URL of issue, if any.
+            if item.issue is not None:
+                description += "%s\n" % external_issue_url(
+                    item.issue.parliament.parliament_num, item.issue.issue_num
+                )
+            description += "\n"
+
+        event = Event()
+        event.uid = "committee-agenda-%d@althingi.net" % agenda_id
+        event.name = capfirst(agenda.committee.name)
+        event.description = description
+        event.begin = agenda.timing_start_planned
+        event.end = agenda.timing_end
+        event.url = (
+            "https://www.althingi.is/thingnefndir/dagskra-nefndarfunda/?nfaerslunr=%d"
+            % agenda_id
+        )
+
+        # Committee agendas are never planned at midnight (or damn well
+        # hopefully not). So when a committee agenda is planned without a time
+        # factor, or in other words, is timed at midnight, we'll assume that
+        # the timing is actually not precisely determined and turn it into an
+        # all-day event instead, using the timing text (determined below) to
+        # elaborate instead.
+        if (
+            event.begin.hour == 0
+            and event.begin.minute == 0
+            and event.begin.second == 0
+        ):
+            event.make_all_day()
+
+        if agenda.timing_text:
+            # If agenda.timing_text is just a representation of what is
+            # already known from the planned starting time, we'll want to
+            # nullify it so that we don't clutter the name with it
+            # unnecessarily. To do this, we have to re-construct the text that
+            # is typically provided and compare it against agenda.timing_text.
+            # If they match, we won't include it. If they don't match, then
+            # what's provided in agenda.timing_text is presumably more
+            # meaningful than simply a (badly) reformatted version of
+            # agenda.timing_start_planned.
+
+            timing = agenda.timing_start_planned
+
+            day = timing.day
+            month_name = ICELANDIC_MONTHS[timing.month]
+            year = str(timing.year)[2:]
+            time = timing.strftime("%-I:%M")
+            am_pm = icelandic_am_pm(timing)
+
+            # Known inconsistencies are whether there is a space in the
+            # beginning, and whether there is one space or two between "kl."
+            # and the time-of-day. We strip and replace to compensate.
+            timing_text_test = "%d. %s %s, kl. %s %s" % (
+                day,
+                month_name,
+                year,
+                time,
+                am_pm,
+            )
+            if agenda.timing_text.strip().replace("  ", " ") != timing_text_test:
+                event.name += " (%s)" % agenda.timing_text.strip()
+
+        cal.events.add(event)
+
+    return monkey_patch_ical(
+        cal.__str__(),
+        "Fastanefndir Alþingis",
+        "Dagatal sem inniheldur boðaða fundi fastanefnda Alþingis ásamt dagskrá í lýsingu.",
+        "Reykjavik/Iceland",
+        "PT10M",
+    )
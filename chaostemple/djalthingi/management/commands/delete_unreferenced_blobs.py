@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+from djalthingi.models import ContentBlob
+from djalthingi.models import Document
+
+
+class Command(BaseCommand):
+
+    help = (
+        "Deletes content blobs no longer referred to by any document, such as"
+        " the old content of documents that have changed or been deleted."
+    )
+
+    def handle(self, *args, **options):
+        blobs = ContentBlob.objects.all()
+        for field in ["html_content_raw_blob", "html_content_blob", "xhtml_blob"]:
+            blobs = blobs.exclude(
+                digest__in=Document.objects.filter(
+                    **{"%s__isnull" % field: False}
+                ).values(field)
+            )
+
+        count, _ = blobs.delete()
+
+        print("Deleted %d unreferenced blobs." % count)
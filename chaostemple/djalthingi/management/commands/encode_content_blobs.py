@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from djalthingi.models import ContentBlob
+from djalthingi.models import Document
+
+BATCH_SIZE = 100
+
+
+class Command(BaseCommand):
+
+    help = (
+        "Stores the encoded variants of served content blobs that don't have"
+        " them yet, such as those of documents imported before variants were"
+        " stored. Safe to interrupt and run again."
+    )
+
+    def handle(self, *args, **options):
+        missing = Q()
+        for field in ContentBlob.ENCODING_FIELDS.values():
+            missing |= Q(**{"%s__isnull" % field: True})
+
+        blobs = ContentBlob.objects.filter(
+            missing,
+            digest__in=Document.objects.filter(html_content_blob__isnull=False).values(
+                "html_content_blob"
+            ),
+        ).order_by("digest")
+
+        count = 0
+        last_digest = ""
+        while True:
+            batch = list(blobs.filter(digest__gt=last_digest)[:BATCH_SIZE])
+            if not batch:
+                break
+
+            for blob in batch:
+                blob.encode()
+
+            count += len(batch)
+            last_digest = batch[-1].digest
+
+            print("Encoded %d blobs..." % count)
+
+        print("Encoded %d blobs." % count)
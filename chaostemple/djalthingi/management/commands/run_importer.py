@@ -0,0 +1,159 @@
+import heapq
+import random
+import signal
+import traceback
+
+from threading import Event
+from time import monotonic
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.utils import timezone
+
+from djalthingi import althingi_settings
+from djalthingi.management.commands.update_althingi import (
+    Command as UpdateCommand,
+)
+from djalthingi.models import Session
+from djalthingi.updaters import clear_already_haves
+
+
+class Feed:
+    """
+    A set of arguments to `update_althingi` that is updated periodically,
+    along with the state needed for scheduling it.
+    """
+
+    def __init__(self, arguments, interval, idle_interval, priority):
+        self.arguments = arguments
+        self.args = UpdateCommand().process_args(arguments.split())
+        self.interval = interval
+        self.idle_interval = idle_interval
+        self.priority = priority
+        self.failure_count = 0
+
+    def get_delay(self, sitting, succeeded):
+        """
+        Records the outcome of an update of the feed and returns the seconds
+        until it should be updated next, or None if it shouldn't be updated
+        until parliament's sitting status changes.
+        """
+        if succeeded:
+            self.failure_count = 0
+            interval = self.interval if sitting else self.idle_interval
+        else:
+            self.failure_count += 1
+            interval = min(
+                althingi_settings.IMPORTER_RETRY_DELAY * 2 ** (self.failure_count - 1),
+                althingi_settings.IMPORTER_MAX_RETRY_DELAY,
+            )
+
+        if interval is None:
+            return None
+
+        jitter = althingi_settings.IMPORTER_JITTER
+        return interval * random.uniform(1 - jitter, 1 + jitter)
+
+    def __str__(self):
+        return self.arguments
+
+
+class Command(BaseCommand):
+    help = (
+        "Runs a service that keeps parliamentary data fresh by updating feeds"
+        " from Althingi's XML at intervals according to IMPORTER_FEEDS in the"
+        " settings. Runs until it's terminated."
+    )
+
+    # Seconds between checks of whether parliament's sitting status has
+    # changed, for feeds that are not updated when it's not sitting.
+    idle_check_interval = 5 * 60
+
+    def handle(self, *args, **options):
+        self.stopping = Event()
+        signal.signal(signal.SIGTERM, lambda signum, frame: self.stopping.set())
+
+        feeds = [
+            Feed(arguments, interval, idle_interval, priority)
+            for priority, (arguments, interval, idle_interval) in enumerate(
+                althingi_settings.IMPORTER_FEEDS
+            )
+        ]
+
+        # Feeds are kept in a heap ordered by when they're due next, and
+        # their priority when they're due at the same time.
+        now = monotonic()
+        schedule = [(now, feed.priority, feed) for feed in feeds]
+        heapq.heapify(schedule)
+
+        try:
+            while not self.stopping.is_set():
+                due, priority, feed = schedule[0]
+
+                # Waiting on the event instead of sleeping, so that a request
+                # to stop is honored right away.
+                if self.stopping.wait(max(0, due - monotonic())):
+                    break
+
+                heapq.heappop(schedule)
+
+                sitting = self.is_sitting()
+                if sitting or feed.idle_interval is not None:
+                    succeeded = self.update_feed(feed)
+                    delay = feed.get_delay(sitting, succeeded)
+                else:
+                    delay = None
+
+                if delay is None:
+                    delay = self.idle_check_interval
+
+                heapq.heappush(schedule, (monotonic() + delay, priority, feed))
+
+        except KeyboardInterrupt:
+            pass
+
+        print("Stopped importer")
+
+    def is_sitting(self):
+        """
+        Returns whether parliament is sitting, meaning that it has a session
+        today and that it's within IMPORTER_SITTING_HOURS.
+        """
+        now = timezone.localtime()
+        first_hour, last_hour = althingi_settings.IMPORTER_SITTING_HOURS
+        if not first_hour <= now.hour < last_hour:
+            return False
+
+        return Session.objects.on_date(now).exists()
+
+    def update_feed(self, feed):
+        """
+        Updates the given feed with `update_althingi`, within this process.
+        Returns whether it succeeded.
+        """
+        print("[%s] Updating: %s" % (timezone.localtime().isoformat(), feed))
+
+        # Objects remembered by the updaters may have changed since the last
+        # update of any feed.
+        clear_already_haves()
+
+        # The database connection is kept between updates, unless it has
+        # been lost in the meantime, for example because it timed out.
+        for connection in connections.all(initialized_only=True):
+            if connection.connection is not None and not connection.is_usable():
+                connection.close()
+
+        command = UpdateCommand()
+        try:
+            parliament_nums, days = command.process_options(feed.args)
+            for parliament_num in parliament_nums:
+                command.update_data(parliament_num, days, feed.args)
+        except SystemExit:
+            # Errors are already printed by `UpdateCommand.error` or
+            # `UpdateCommand.fail`.
+            return False
+        except Exception:
+            traceback.print_exc()
+            return False
+
+        return True
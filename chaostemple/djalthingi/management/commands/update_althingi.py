@@ -1,8 +1,22 @@
+import random
+import sys
+
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import as_completed
+from multiprocessing import get_context
+from time import sleep
+
 from django.core.management.base import BaseCommand
+from django.db import IntegrityError
+from django.db import OperationalError
+from django.db import connection
+from django.db import connections
 from django.utils import timezone
 
+from djalthingi.models import ImportJournal
 from djalthingi.models import Parliament
 
+from djalthingi.updaters import clear_already_haves
 from djalthingi.updaters import update_categories
 from djalthingi.updaters import update_committee
 from djalthingi.updaters import update_committee_agenda
@@ -33,10 +47,112 @@ from djalthingi.utils import sensible_datetime
 from djalthingi.exceptions import AlthingiException
 
 
+class PrefixedOutput:
+    """
+    Prefixes every line written to the given stream, so that the output of
+    worker processes can be told apart when it's interleaved. Lines are
+    written and flushed whole, so that they don't get mixed up with lines
+    from other processes.
+    """
+
+    def __init__(self, stream, prefix):
+        self.stream = stream
+        self.prefix = prefix
+        self.buffer = ""
+
+    def write(self, text):
+        self.buffer += text
+        while "\n" in self.buffer:
+            line, self.buffer = self.buffer.split("\n", 1)
+            self.stream.write("%s%s\n" % (self.prefix, line))
+            self.stream.flush()
+
+    def flush(self):
+        if self.buffer:
+            self.stream.write("%s%s" % (self.prefix, self.buffer))
+            self.buffer = ""
+        self.stream.flush()
+
+
+def update_data_in_worker(parliament_num, days, args, journal_id):
+    """
+    Runs in a worker process when the "workers" option is used. Returns the
+    parliament number along with an error message, or None on success.
+    """
+    # Worker processes are reused between parliaments, so the original
+    # streams are restored when done.
+    stdout, stderr = sys.stdout, sys.stderr
+    prefix = "[%d] " % parliament_num
+    sys.stdout = PrefixedOutput(stdout, prefix)
+    sys.stderr = PrefixedOutput(stderr, prefix)
+    try:
+        return _update_data_in_worker(parliament_num, days, args, journal_id)
+    finally:
+        sys.stdout.flush()
+        sys.stderr.flush()
+        sys.stdout, sys.stderr = stdout, stderr
+
+
+def _update_data_in_worker(parliament_num, days, args, journal_id):
+
+    command = Command()
+    if journal_id is not None:
+        command.journal = ImportJournal.objects.get(id=journal_id)
+
+    # Shared rows such as persons and committees have already been updated
+    # by the parent process, but a worker may still run into one that
+    # another worker is creating at the same time. Unique constraints make
+    # sure that only one of them succeeds, in which case the other one tries
+    # again and finds the row in the database. Likewise, a worker may run
+    # into a deadlock or lock timeout, in which case it backs off for a
+    # moment before trying again.
+    tries = 3
+    while tries > 0:
+        tries -= 1
+        clear_already_haves()
+        try:
+            command.update_data(parliament_num, days, args, skip_shared=True)
+            return parliament_num, None
+        except (IntegrityError, OperationalError) as ex:
+            if tries > 0:
+                print("Conflict with another worker, trying again: %s" % ex)
+                sleep(random.uniform(1, 5))
+                continue
+            return parliament_num, str(ex)
+        except SystemExit:
+            # Errors are already printed by `Command.error` or `Command.fail`.
+            return parliament_num, "Stopped because of errors"
+
+
 class Command(BaseCommand):
 
     help = "Retrieves and saves parliamentary data from Althingi's XML feed."
 
+    # Progress of the current run, recorded so that it can be resumed if it
+    # fails. See `ImportJournal`. Updates are not journaled without one.
+    journal = None
+
+    # Commands that update a whole feed as a step of a run. Those that record
+    # their progress per entity are worth resuming even when run alone.
+    feed_commands = [
+        "all",
+        "parties",
+        "constituencies",
+        "persons",
+        "ministers",
+        "presidents",
+        "issues",
+        "sessions",
+        "committees",
+        "committee_agendas",
+        "vote_castings",
+        "speeches",
+        "issue_statuses",
+        "gazette_infos",
+        "categories",
+    ]
+    entity_feed_commands = ["all", "issues", "sessions"]
+
     def print_help(self):
         print("Usage: python manage.py update_althingi <command> [options]")
         print()
@@ -105,6 +221,9 @@ class Command(BaseCommand):
         print(
             "  categories                        Updates issue categories and category groups"
         )
+        print(
+            "  resume[=<journal_id>]             Resumes the last failed or interrupted run, or the given one, where it stopped"
+        )
         print(
             "  all                               Updates everything; parties, constituencies, categories, committees, persons, ministers, presidents, issues, sessions, speeches, committee agendas, vote castings, issue statuses and gazette infos, in default or specified parliament"
         )
@@ -122,6 +241,18 @@ class Command(BaseCommand):
         print(
             "                                    Supported commands: vote_castings, speeches"
         )
+        print(
+            "  force                             Process issues even if they haven't changed since last processed"
+        )
+        print(
+            "                                    Supported commands: issues, issue, all"
+        )
+        print(
+            "  workers=<worker-count>            Process a range of parliaments in parallel worker processes (not with SQLite)"
+        )
+        print(
+            "                                    Persons, parties, committees etc. are updated beforehand"
+        )
         print()
 
     def error(self, msg, show_help=True):
@@ -131,6 +262,21 @@ class Command(BaseCommand):
             self.print_help()
         quit(2)
 
+    def fail(self, msg, status=2):
+        """
+        Prints the error and quits. If the current run is journaled, the
+        failure is recorded so that the run can be resumed.
+        """
+        print("Error: %s" % msg)
+        print()
+        if self.journal is not None:
+            self.journal.fail(msg)
+            print(
+                "Resume with: python manage.py update_althingi resume=%d"
+                % self.journal.id
+            )
+        quit(status)
+
     def process_args(self, args):
         processed_args = {}
         for arg in args:
@@ -154,51 +300,223 @@ class Command(BaseCommand):
         try:
             processed_args = self.process_args(options["arguments"])
 
-            # Handle the "parliament" option.
-            if "parliament" in processed_args:
-                # If parliament is specified...
-                try:
-                    # Check if we want a range of parliaments.
-                    if "-" in processed_args["parliament"]:
-                        from_to = processed_args["parliament"].split("-")
-                        parliament_from = int(from_to[0])
-                        parliament_to = int(from_to[1])
-                    else:
-                        parliament_from = parliament_to = int(
-                            processed_args["parliament"]
-                        )
-                except (TypeError, ValueError):
-                    self.error("Invalid parliament number")
-            else:
-                # ...else, get the current one.
-                parliament_from = parliament_to = get_last_parliament_num()
+            if "resume" in processed_args:
+                self.journal = self.get_resumed_journal(processed_args["resume"])
+                print("Resuming run %s" % self.journal)
 
-            # Determine order of iteration
-            if parliament_from > parliament_to:
-                iterator = reversed(range(parliament_to, parliament_from + 1))
+                processed_args = self.journal.args
+                parliament_nums = self.journal.parliament_nums
+                days = self.journal.days
             else:
-                iterator = range(parliament_from, parliament_to + 1)
+                parliament_nums, days = self.process_options(processed_args)
 
-            # Handle the "days" option.
-            if "days" in processed_args:
+            # Handle the "workers" option.
+            if "workers" in processed_args:
                 try:
-                    days = int(processed_args["days"])
-                except TypeError:
-                    self.error('Option "days" must be an integer')
+                    workers = int(processed_args["workers"])
+                except (TypeError, ValueError):
+                    self.error('Option "workers" must be an integer')
             else:
-                days = None
-
-            # Update data according to options.
-            for parliament_num in iterator:
-                self.update_data(parliament_num, days, processed_args)
+                workers = 1
+
+            # SQLite only allows one writer at a time, so workers would mostly
+            # be waiting for each other until they fail with "database is
+            # locked".
+            if workers > 1 and connection.vendor == "sqlite":
+                self.error(
+                    'Option "workers" is not supported with SQLite', show_help=False
+                )
+
+            if self.journal is None and self.is_resumable(
+                processed_args, parliament_nums
+            ):
+                self.journal = ImportJournal.objects.create(
+                    args=processed_args, parliament_nums=parliament_nums, days=days
+                )
+
+            try:
+                # Update data according to options.
+                if workers > 1 and len(parliament_nums) > 1:
+                    self.update_data_in_parallel(
+                        parliament_nums, days, processed_args, workers
+                    )
+                else:
+                    for parliament_num in parliament_nums:
+                        self.update_data(parliament_num, days, processed_args)
+            except SystemExit:
+                # Only failures recorded by `fail` are worth resuming.
+                if self.journal is not None and self.journal.timing_failed is None:
+                    self.journal.delete()
+                raise
+            except KeyboardInterrupt:
+                self.fail("Interrupted", status=1)
+            except Exception as e:
+                # Unexpected errors are recorded as well, so that the run can
+                # be resumed once they have been dealt with.
+                if self.journal is not None:
+                    self.journal.fail(e)
+                raise
+
+            if self.journal is not None:
+                self.journal.delete()
 
         except KeyboardInterrupt:
             quit(1)
 
-    def update_data(self, parliament_num, days, args):
+    def is_resumable(self, processed_args, parliament_nums):
+        """
+        Returns whether a run has enough to do for it to be worth resuming if
+        it fails, meaning that it covers more than one parliament or feed, or
+        a feed whose progress is recorded per entity. Other runs, such as
+        updates of a single issue or person, are simply run again.
+        """
+        commands = [c for c in self.feed_commands if c in processed_args]
+        if len(commands) == 0:
+            return False
+
+        return (
+            len(parliament_nums) > 1
+            or len(commands) > 1
+            or any(c in self.entity_feed_commands for c in commands)
+        )
+
+    def process_options(self, processed_args):
+        """
+        Returns the numbers of the parliaments to process and the number of
+        days to limit supported commands to, according to the given options.
+        """
+
+        # Handle the "parliament" option.
+        if "parliament" in processed_args:
+            # If parliament is specified...
+            try:
+                # Check if we want a range of parliaments.
+                if "-" in processed_args["parliament"]:
+                    from_to = processed_args["parliament"].split("-")
+                    parliament_from = int(from_to[0])
+                    parliament_to = int(from_to[1])
+                else:
+                    parliament_from = parliament_to = int(processed_args["parliament"])
+            except (TypeError, ValueError):
+                self.error("Invalid parliament number")
+        else:
+            # ...else, get the current one.
+            parliament_from = parliament_to = get_last_parliament_num()
+
+        # Determine order of iteration
+        if parliament_from > parliament_to:
+            iterator = reversed(range(parliament_to, parliament_from + 1))
+        else:
+            iterator = range(parliament_from, parliament_to + 1)
+
+        # Handle the "days" option.
+        if "days" in processed_args:
+            try:
+                days = int(processed_args["days"])
+            except TypeError:
+                self.error('Option "days" must be an integer')
+        else:
+            days = None
+
+        return list(iterator), days
+
+    def get_resumed_journal(self, journal_id):
+        journals = ImportJournal.objects.all()
+
+        if journal_id is not None:
+            try:
+                return journals.get(id=int(journal_id))
+            except (ValueError, ImportJournal.DoesNotExist):
+                self.error("No run to resume with ID %s" % journal_id, show_help=False)
+
+        journal = journals.exclude(timing_failed=None).last()
+        if journal is None:
+            self.error("No failed run to resume", show_help=False)
+
+        return journal
+
+    def update_data_in_parallel(self, parliament_nums, days, args, workers):
+
+        # Rows that are shared between parliaments are updated here first,
+        # one parliament at a time, so that the workers find them instead of
+        # racing each other to create them.
+        for parliament_num in parliament_nums:
+            print("Processing shared data of parliament %d" % parliament_num)
+            try:
+                self.run_step(
+                    parliament_num, "shared", self.update_shared_data, parliament_num
+                )
+            except AlthingiException as e:
+                self.fail(e)
+
+        # Worker processes must not inherit the database connection.
+        connections.close_all()
+
+        # Forking is explicitly requested because workers rely on Django
+        # already being set up.
+        journal_id = self.journal.id if self.journal is not None else None
+
+        failures = []
+        with ProcessPoolExecutor(
+            max_workers=workers, mp_context=get_context("fork")
+        ) as executor:
+            futures = [
+                executor.submit(
+                    update_data_in_worker, parliament_num, days, args, journal_id
+                )
+                for parliament_num in parliament_nums
+            ]
+            for done_count, future in enumerate(as_completed(futures), start=1):
+                parliament_num, error = future.result()
+                if error is None:
+                    print(
+                        "Finished parliament %d (%d of %d)"
+                        % (parliament_num, done_count, len(parliament_nums))
+                    )
+                else:
+                    failures.append(parliament_num)
+                    print(
+                        "Failed parliament %d (%d of %d): %s"
+                        % (parliament_num, done_count, len(parliament_nums), error)
+                    )
+
+        if len(failures) > 0:
+            self.fail(
+                "Failed parliaments: %s" % ", ".join(str(f) for f in sorted(failures))
+            )
+
+    def update_shared_data(self, parliament_num):
+        update_parties(parliament_num)
+        update_constituencies(parliament_num)
+        update_categories()
+        update_committees(parliament_num)
+        update_persons(parliament_num)
+        update_ministers(parliament_num)
+        update_presidents(parliament_num)
+
+    def run_step(self, parliament_num, feed, func, *args, **kwargs):
+        """
+        Runs an update of the given feed, unless the journal shows that it
+        was already done in an earlier run that is being resumed.
+        """
+        if self.journal is None:
+            func(*args, **kwargs)
+            return
+
+        if self.journal.is_done(parliament_num, feed):
+            print("Skipping %s of parliament %d, already done" % (feed, parliament_num))
+            return
+
+        func(*args, **kwargs)
+
+        self.journal.set_done(parliament_num, feed)
+
+    def update_data(self, parliament_num, days, args, skip_shared=False):
 
         print("Processing parliament %d with args: %s" % (parliament_num, args))
 
+        force = "force" in args
+
         try:
             has_run = False
             if "parliament" in args:
@@ -207,15 +525,20 @@ class Command(BaseCommand):
 
             if "parties" in args:
                 has_run = True
-                update_parties(parliament_num)
+                self.run_step(parliament_num, "parties", update_parties, parliament_num)
 
             if "constituencies" in args:
                 has_run = True
-                update_constituencies(parliament_num)
+                self.run_step(
+                    parliament_num,
+                    "constituencies",
+                    update_constituencies,
+                    parliament_num,
+                )
 
             if "persons" in args:
                 has_run = True
-                update_persons(parliament_num)
+                self.run_step(parliament_num, "persons", update_persons, parliament_num)
 
             if "person" in args:
                 has_run = True
@@ -227,15 +550,26 @@ class Command(BaseCommand):
 
             if "ministers" in args:
                 has_run = True
-                update_ministers(parliament_num)
+                self.run_step(
+                    parliament_num, "ministers", update_ministers, parliament_num
+                )
 
             if "presidents" in args:
                 has_run = True
-                update_presidents(parliament_num)
+                self.run_step(
+                    parliament_num, "presidents", update_presidents, parliament_num
+                )
 
             if "issues" in args:
                 has_run = True
-                update_issues(parliament_num)
+                self.run_step(
+                    parliament_num,
+                    "issues",
+                    update_issues,
+                    parliament_num,
+                    force,
+                    journal=self.journal,
+                )
 
             if "issue" in args:
                 has_run = True
@@ -243,11 +577,17 @@ class Command(BaseCommand):
                     issue_num = int(args["issue"])
                 except (TypeError, ValueError):
                     self.error("Invalid issue number")
-                update_issue(issue_num, parliament_num)
+                update_issue(issue_num, parliament_num, force)
 
             if "sessions" in args:
                 has_run = True
-                update_sessions(parliament_num)
+                self.run_step(
+                    parliament_num,
+                    "sessions",
+                    update_sessions,
+                    parliament_num,
+                    journal=self.journal,
+                )
 
             if "session" in args:
                 has_run = True
@@ -267,11 +607,18 @@ class Command(BaseCommand):
 
             if "committees" in args:
                 has_run = True
-                update_committees(parliament_num)
+                self.run_step(
+                    parliament_num, "committees", update_committees, parliament_num
+                )
 
             if "committee_agendas" in args:
                 has_run = True
-                update_committee_agendas(parliament_num)
+                self.run_step(
+                    parliament_num,
+                    "committee_agendas",
+                    update_committee_agendas,
+                    parliament_num,
+                )
 
             if "committee_agenda" in args:
                 has_run = True
@@ -283,11 +630,19 @@ class Command(BaseCommand):
 
             if "vote_castings" in args:
                 has_run = True
-                update_vote_castings(parliament_num, days)
+                self.run_step(
+                    parliament_num,
+                    "vote_castings",
+                    update_vote_castings,
+                    parliament_num,
+                    days,
+                )
 
             if "speeches" in args:
                 has_run = True
-                update_speeches(parliament_num, days)
+                self.run_step(
+                    parliament_num, "speeches", update_speeches, parliament_num, days
+                )
 
             if "upcoming" in args:
                 has_run = True
@@ -296,7 +651,12 @@ class Command(BaseCommand):
 
             if "issue_statuses" in args:
                 has_run = True
-                update_issue_statuses(parliament_num)
+                self.run_step(
+                    parliament_num,
+                    "issue_statuses",
+                    update_issue_statuses,
+                    parliament_num,
+                )
 
             if "issue_status" in args:
                 has_run = True
@@ -308,7 +668,12 @@ class Command(BaseCommand):
 
             if "gazette_infos" in args:
                 has_run = True
-                update_gazette_infos(parliament_num)
+                self.run_step(
+                    parliament_num,
+                    "gazette_infos",
+                    update_gazette_infos,
+                    parliament_num,
+                )
 
             if "gazette_info" in args:
                 has_run = True
@@ -322,29 +687,64 @@ class Command(BaseCommand):
 
             if "categories" in args:
                 has_run = True
-                update_categories()
+                self.run_step(parliament_num, "categories", update_categories)
 
             if "all" in args:
                 has_run = True
-                update_parties(parliament_num)
-                update_constituencies(parliament_num)
-                update_categories()
-                update_committees(parliament_num)
-                update_persons(parliament_num)
-                update_ministers(parliament_num)
-                update_presidents(parliament_num)
-
-                update_issues(parliament_num)
-                update_sessions(parliament_num)
-                update_speeches(parliament_num)
-                update_committee_agendas(parliament_num)
-                update_vote_castings(parliament_num)
+                if not skip_shared:
+                    self.run_step(
+                        parliament_num,
+                        "shared",
+                        self.update_shared_data,
+                        parliament_num,
+                    )
+
+                self.run_step(
+                    parliament_num,
+                    "issues",
+                    update_issues,
+                    parliament_num,
+                    force,
+                    journal=self.journal,
+                )
+                self.run_step(
+                    parliament_num,
+                    "sessions",
+                    update_sessions,
+                    parliament_num,
+                    journal=self.journal,
+                )
+                self.run_step(
+                    parliament_num, "speeches", update_speeches, parliament_num
+                )
+                self.run_step(
+                    parliament_num,
+                    "committee_agendas",
+                    update_committee_agendas,
+                    parliament_num,
+                )
+                self.run_step(
+                    parliament_num,
+                    "vote_castings",
+                    update_vote_castings,
+                    parliament_num,
+                )
 
                 # Happens here because it builds on prior data.
-                update_issue_statuses(parliament_num)
+                self.run_step(
+                    parliament_num,
+                    "issue_statuses",
+                    update_issue_statuses,
+                    parliament_num,
+                )
 
                 # Happens here because it builds on prior data.
-                update_gazette_infos(parliament_num)
+                self.run_step(
+                    parliament_num,
+                    "gazette_infos",
+                    update_gazette_infos,
+                    parliament_num,
+                )
 
                 # Mark parliament as fully updated.
                 parliament = Parliament.objects.get(parliament_num=parliament_num)
@@ -352,7 +752,7 @@ class Command(BaseCommand):
                 parliament.save()
 
         except AlthingiException as e:
-            self.error(e)
+            self.fail(e)
 
         if not has_run:
             self.print_help()
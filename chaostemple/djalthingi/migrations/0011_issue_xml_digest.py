@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("djalthingi", "0010_alter_minister_abbreviation_long"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="issue",
+            name="xml_digest",
+            field=models.CharField(max_length=64, null=True),
+        ),
+    ]
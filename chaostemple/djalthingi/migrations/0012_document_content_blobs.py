@@ -0,0 +1,146 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:13
+
+import django.db.models.deletion
+import zlib
+from django.db import migrations, models
+from hashlib import sha256
+
+TEXT_FIELDS = ["html_content_raw", "html_content", "xhtml"]
+
+BATCH_SIZE = 100
+
+
+def move_to_blobs(apps, schema_editor):
+    ContentBlob = apps.get_model("djalthingi", "ContentBlob")
+    Document = apps.get_model("djalthingi", "Document")
+
+    documents = Document.objects.only("id", *TEXT_FIELDS).order_by("id")
+
+    last_id = 0
+    while True:
+        batch = list(documents.filter(id__gt=last_id)[:BATCH_SIZE])
+        if not batch:
+            break
+
+        blobs = {}
+        for document in batch:
+            for field in TEXT_FIELDS:
+                text = getattr(document, field)
+                if not text:
+                    continue
+
+                text_bytes = text.encode("utf-8")
+                digest = sha256(text_bytes).hexdigest()
+                if digest not in blobs:
+                    blobs[digest] = ContentBlob(
+                        digest=digest, data=zlib.compress(text_bytes, 9)
+                    )
+                setattr(document, "%s_blob_id" % field, digest)
+
+        ContentBlob.objects.bulk_create(blobs.values(), ignore_conflicts=True)
+        Document.objects.bulk_update(
+            batch, ["%s_blob" % field for field in TEXT_FIELDS]
+        )
+
+        last_id = batch[-1].id
+
+
+def move_from_blobs(apps, schema_editor):
+    ContentBlob = apps.get_model("djalthingi", "ContentBlob")
+    Document = apps.get_model("djalthingi", "Document")
+
+    documents = Document.objects.only(
+        "id", *["%s_blob" % field for field in TEXT_FIELDS]
+    ).order_by("id")
+
+    last_id = 0
+    while True:
+        batch = list(documents.filter(id__gt=last_id)[:BATCH_SIZE])
+        if not batch:
+            break
+
+        blobs = ContentBlob.objects.in_bulk(
+            [
+                getattr(document, "%s_blob_id" % field)
+                for document in batch
+                for field in TEXT_FIELDS
+            ]
+        )
+        for document in batch:
+            for field in TEXT_FIELDS:
+                blob = blobs.get(getattr(document, "%s_blob_id" % field))
+                text = "" if blob is None else zlib.decompress(blob.data).decode()
+                setattr(document, field, text)
+
+        Document.objects.bulk_update(batch, TEXT_FIELDS)
+
+        last_id = batch[-1].id
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("djalthingi", "0011_issue_xml_digest"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ContentBlob",
+            fields=[
+                (
+                    "digest",
+                    models.CharField(max_length=64, primary_key=True, serialize=False),
+                ),
+                ("data", models.BinaryField()),
+            ],
+        ),
+        migrations.AddField(
+            model_name="document",
+            name="html_content_blob",
+            field=models.ForeignKey(
+                null=True,
+                on_delete=django.db.models.deletion.PROTECT,
+                related_name="+",
+                to="djalthingi.contentblob",
+            ),
+        ),
+        migrations.AddField(
+            model_name="document",
+            name="html_content_raw_blob",
+            field=models.ForeignKey(
+                null=True,
+                on_delete=django.db.models.deletion.PROTECT,
+                related_name="+",
+                to="djalthingi.contentblob",
+            ),
+        ),
+        migrations.AddField(
+            model_name="document",
+            name="xhtml_blob",
+            field=models.ForeignKey(
+                null=True,
+                on_delete=django.db.models.deletion.PROTECT,
+                related_name="+",
+                to="djalthingi.contentblob",
+            ),
+        ),
+        # Gives `xhtml` a default so that it can be re-added when reversing.
+        migrations.AlterField(
+            model_name="document",
+            name="xhtml",
+            field=models.TextField(default=""),
+        ),
+        migrations.RunPython(move_to_blobs, move_from_blobs),
+        migrations.RemoveField(
+            model_name="document",
+            name="html_content",
+        ),
+        migrations.RemoveField(
+            model_name="document",
+            name="html_content_raw",
+        ),
+        migrations.RemoveField(
+            model_name="document",
+            name="xhtml",
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:18
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("djalthingi", "0012_document_content_blobs"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="contentblob",
+            name="brotli_data",
+            field=models.BinaryField(null=True),
+        ),
+        migrations.AddField(
+            model_name="contentblob",
+            name="gzip_data",
+            field=models.BinaryField(null=True),
+        ),
+        migrations.AddField(
+            model_name="contentblob",
+            name="time_created",
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
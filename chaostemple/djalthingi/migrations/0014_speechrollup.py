@@ -0,0 +1,107 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:25
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models import Sum
+from django.db.models.functions import TruncDate
+
+
+def build_rollups(apps, schema_editor):
+    Parliament = apps.get_model("djalthingi", "Parliament")
+    Speech = apps.get_model("djalthingi", "Speech")
+    SpeechRollup = apps.get_model("djalthingi", "SpeechRollup")
+
+    for parliament_id in Parliament.objects.values_list("id", flat=True):
+        totals = (
+            Speech.objects.filter(session__parliament_id=parliament_id)
+            .values("person_id", "issue_id", "iteration", "speech_type", "president")
+            .annotate(
+                day=TruncDate("timing_start"),
+                total_seconds=Sum("seconds"),
+                total_count=Count("id"),
+            )
+            .order_by()
+        )
+
+        SpeechRollup.objects.bulk_create(
+            [
+                SpeechRollup(
+                    parliament_id=parliament_id,
+                    day=total["day"],
+                    person_id=total["person_id"],
+                    issue_id=total["issue_id"],
+                    iteration=total["iteration"],
+                    speech_type=total["speech_type"],
+                    president=total["president"],
+                    seconds=total["total_seconds"],
+                    count=total["total_count"],
+                )
+                for total in totals
+            ],
+            batch_size=1000,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("djalthingi", "0013_contentblob_encodings"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SpeechRollup",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("day", models.DateField()),
+                ("iteration", models.CharField(max_length=3, null=True)),
+                ("speech_type", models.CharField(max_length=30)),
+                ("president", models.BooleanField(default=False)),
+                ("seconds", models.IntegerField()),
+                ("count", models.IntegerField()),
+                (
+                    "issue",
+                    models.ForeignKey(
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="speech_rollups",
+                        to="djalthingi.issue",
+                    ),
+                ),
+                (
+                    "parliament",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="speech_rollups",
+                        to="djalthingi.parliament",
+                    ),
+                ),
+                (
+                    "person",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="speech_rollups",
+                        to="djalthingi.person",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["parliament", "day"],
+                        name="djalthingi__parliam_ea8474_idx",
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(build_rollups, migrations.RunPython.noop),
+    ]
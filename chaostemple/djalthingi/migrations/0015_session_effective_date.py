@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:28
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def resolve_effective_dates(apps, schema_editor):
+    Session = apps.get_model("djalthingi", "Session")
+
+    changed_sessions = []
+    parliament_id = None
+    effective_date = None
+    for session in Session.objects.only(
+        "parliament_id", "session_num", "timing_start_planned"
+    ).order_by("parliament_id", "session_num"):
+        if session.parliament_id != parliament_id:
+            parliament_id = session.parliament_id
+            effective_date = None
+
+        if session.timing_start_planned is not None:
+            effective_date = timezone.localdate(session.timing_start_planned)
+
+        if effective_date is not None:
+            session.effective_date = effective_date
+            changed_sessions.append(session)
+
+    Session.objects.bulk_update(changed_sessions, ["effective_date"], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("djalthingi", "0014_speechrollup"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="session",
+            name="effective_date",
+            field=models.DateField(db_index=True, null=True),
+        ),
+        migrations.RunPython(resolve_effective_dates, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,70 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:33
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("djalthingi", "0015_session_effective_date"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ImportJournal",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("args", models.JSONField()),
+                ("parliament_nums", models.JSONField()),
+                ("days", models.IntegerField(null=True)),
+                (
+                    "timing_start",
+                    models.DateTimeField(default=django.utils.timezone.now),
+                ),
+                ("timing_failed", models.DateTimeField(null=True)),
+                ("error", models.TextField(blank=True)),
+            ],
+            options={
+                "ordering": ["timing_start"],
+            },
+        ),
+        migrations.CreateModel(
+            name="ImportCheckpoint",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("parliament_num", models.IntegerField()),
+                ("feed", models.CharField(max_length=50)),
+                ("position", models.CharField(max_length=50, null=True)),
+                ("done", models.BooleanField(default=False)),
+                (
+                    "journal",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="checkpoints",
+                        to="djalthingi.importjournal",
+                    ),
+                ),
+            ],
+            options={
+                "unique_together": {("journal", "parliament_num", "feed")},
+            },
+        ),
+    ]
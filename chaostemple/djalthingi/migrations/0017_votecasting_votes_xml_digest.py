@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("djalthingi", "0016_importjournal"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="votecasting",
+            name="votes_xml_digest",
+            field=models.CharField(max_length=64, null=True),
+        ),
+    ]
@@ -0,0 +1,38 @@
+from django.db import migrations
+from django.db.models import OuterRef
+from django.db.models import Subquery
+
+BLOB_FIELDS = ["html_content_raw_blob", "html_content_blob", "xhtml_blob"]
+
+
+def backfill_time_created(apps, schema_editor):
+    """
+    Blobs moved out of documents by migration 0012 got the time of migration
+    0013 as their creation time, which is served as the Last-Modified time of
+    documents. Documents don't record when they were imported, so the
+    earliest publication time of the documents referring to a blob is used
+    instead, where it's earlier.
+    """
+    ContentBlob = apps.get_model("djalthingi", "ContentBlob")
+    Document = apps.get_model("djalthingi", "Document")
+
+    for field in BLOB_FIELDS:
+        earliest = Subquery(
+            Document.objects.filter(**{field: OuterRef("digest")})
+            .order_by("time_published")
+            .values("time_published")[:1]
+        )
+        ContentBlob.objects.filter(time_created__gt=earliest).update(
+            time_created=earliest
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("djalthingi", "0017_votecasting_votes_xml_digest"),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_time_created, migrations.RunPython.noop),
+    ]
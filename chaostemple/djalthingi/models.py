@@ -1,16 +1,20 @@
 import dateparser
+import gzip
 import re
-import requests
+import zlib
 from collections import OrderedDict
+from hashlib import sha256
 from djalthingi.althingi_settings import CURRENT_PARLIAMENT_NUM
 from djalthingi.althingi_settings import STATIC_DOCUMENT_DIR
 from djalthingi.exceptions import AlthingiException
 from djalthingi.exceptions import DataIntegrityException
 from djalthingi.exceptions import InvalidDocumentException
+from djalthingi import pdfcache
 from django.urls import reverse
 from djalthingi.utils import format_date
-from djalthingi.xmlutils import get_response
+from djalthingi.xmlutils import fetch_response
 from django.db import models
+from django.db import transaction
 from django.db.models import CASCADE
 from django.db.models import Case
 from django.db.models import Count
@@ -21,7 +25,9 @@ from django.db.models import PROTECT
 from django.db.models import Q
 from django.db.models import SET_NULL
 from django.db.models import Subquery
+from django.db.models import Sum
 from django.db.models import When
+from django.db.models.functions import TruncDate
 from django.template.defaultfilters import capfirst
 from django.template.defaultfilters import slugify
 from django.templatetags.static import static
@@ -32,6 +38,51 @@ from lxml import etree
 from lxml.etree import _Element
 from unidecode import unidecode
 
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+class IssueStatusEvidence:
+    """
+    The data from which an issue's status, committee, minister and fate are
+    determined. See `IssueQuerySet.status_evidence`.
+    """
+
+    def __init__(self):
+        self.discussion_types = set()  # Of session agenda items
+        self.speech_iterations = set()
+        self.vote_castings = []
+        self.committee_agenda_timings = []  # (timing_start_planned, timing_start)
+        self.documents = []  # (doc_type, time_published)
+
+    def filter_vote_castings(self, **kwargs):
+        return [
+            vc
+            for vc in self.vote_castings
+            if all(getattr(vc, key) == value for key, value in kwargs.items())
+        ]
+
+    def get_vote_casting(self, **kwargs):
+        # Behaves like `QuerySet.get`.
+        vote_castings = self.filter_vote_castings(**kwargs)
+        if len(vote_castings) == 0:
+            raise VoteCasting.DoesNotExist
+        elif len(vote_castings) > 1:
+            raise VoteCasting.MultipleObjectsReturned
+        return vote_castings[0]
+
+    def has_vote_casting(self, vote_casting_type):
+        return len(self.filter_vote_castings(vote_casting_type=vote_casting_type)) > 0
+
+    def has_document(self, doc_types, published_since=None):
+        return any(
+            doc_type in doc_types
+            and (published_since is None or time_published >= published_since)
+            for doc_type, time_published in self.documents
+        )
+
 
 class IssueQuerySet(models.QuerySet):
     def from_party(self, party):
@@ -43,6 +94,67 @@ class IssueQuerySet(models.QuerySet):
             proposers__order=1,
         ).distinct()
 
+    def status_evidence(self):
+        """
+        Gathers the data needed for determining the status, committee,
+        minister and fate of the issues in the query set, with a single
+        query for each kind of data regardless of the number of issues.
+        Returns a dictionary of `IssueStatusEvidence`, keyed by issue ID.
+        """
+        issue_ids = self.order_by().values("id")
+        evidence = {
+            issue_id: IssueStatusEvidence()
+            for issue_id in self.values_list("id", flat=True)
+        }
+
+        session_agenda_items = (
+            SessionAgendaItem.objects.filter(issue_id__in=issue_ids)
+            .order_by()
+            .values_list("issue_id", "discussion_type")
+            .distinct()
+        )
+        for issue_id, discussion_type in session_agenda_items:
+            evidence[issue_id].discussion_types.add(discussion_type)
+
+        speeches = (
+            Speech.objects.filter(issue_id__in=issue_ids)
+            .order_by()
+            .values_list("issue_id", "iteration")
+            .distinct()
+        )
+        for issue_id, iteration in speeches:
+            evidence[issue_id].speech_iterations.add(iteration)
+
+        vote_castings = VoteCasting.objects.select_related(
+            "to_committee", "to_minister"
+        ).filter(issue_id__in=issue_ids)
+        for vote_casting in vote_castings:
+            evidence[vote_casting.issue_id].vote_castings.append(vote_casting)
+
+        committee_agenda_items = (
+            CommitteeAgendaItem.objects.filter(issue_id__in=issue_ids)
+            .order_by()
+            .values_list(
+                "issue_id",
+                "committee_agenda__timing_start_planned",
+                "committee_agenda__timing_start",
+            )
+        )
+        for issue_id, timing_start_planned, timing_start in committee_agenda_items:
+            evidence[issue_id].committee_agenda_timings.append(
+                (timing_start_planned, timing_start)
+            )
+
+        documents = (
+            Document.objects.filter(issue_id__in=issue_ids)
+            .order_by()
+            .values_list("issue_id", "doc_type", "time_published")
+        )
+        for issue_id, doc_type, time_published in documents:
+            evidence[issue_id].documents.append((doc_type, time_published))
+
+        return evidence
+
 
 class PartyQuerySet(models.QuerySet):
     def annotate_mp_counts(self, parliament):
@@ -236,87 +348,19 @@ class SessionQuerySet(models.QuerySet):
         Session nr. 112 is planned on a specific day. <- timing_start_planned is accurately configured.
         Session nr. 113 is planned immediately following session nr. 112. <- timing_start_planned is None.
 
-    As a result, to include a session which is following the one requested,
-    such as in SessionManager.upcoming() and SessionManager.on_date(), more than one query is required.
+    To avoid walking through following sessions whenever sessions are looked up by date, the day on which
+    each session is held is resolved when sessions are imported and stored as effective_date.
+    See Session.resolve_effective_dates().
     This is undesirable but necessary until the XML properly designates "following session X".
     Currently this is only designated in manually entered text which cannot safely be parsed.
     If you notice that the XML has been updated to solve this problem, please revise this code accordingly.
     """
 
     def upcoming(self):
-        today = timezone.now().replace(hour=0, minute=0, second=0, microsecond=0)
-        try:
-            next_session = (
-                self.select_related("parliament")
-                .filter(timing_start_planned__gte=today)[0:1]
-                .get()
-            )
-            return self.filter(
-                session_num__gte=next_session.session_num,
-                parliament__parliament_num=next_session.parliament.parliament_num,
-            )
-
-        except Session.DoesNotExist:
-            return Session.objects.none()
+        return self.filter(effective_date__gte=timezone.localdate())
 
     def on_date(self, requested_date):
-        """
-        ON CODE:
-        Because of how session data is provided (see comment in top of class), this function needs to
-        execute its database queries immediately. Every retrieved session must be checked to see if
-        there is another one following it, so the number of queries executed are number_of_sesssions + 1.
-        Improvements are welcomed.
-        Note however that the resulting queryset is still chainable and is not executed until used.
-
-        For the sake of clarity and performance, "under the hood" queries are entirely separate from the
-        resulting queryset and are therefore called via 'Session.objects' rather than 'self'.
-        This does not impact performance since every "under the hood" query needs to be executed anyway.
-        In fact, if the main queryset were used and modified a lot before execution, it might negatively
-        affect performance.
-        """
-
-        requested_tomorrow = requested_date + timezone.timedelta(days=1)
-
-        # Get first session of day
-        first_session = (
-            Session.objects.select_related("parliament")
-            .filter(
-                timing_start_planned__gte=requested_date,
-                timing_start_planned__lt=requested_tomorrow,
-            )
-            .order_by("session_num")
-            .first()
-        )
-
-        # Return with empty result if no session exists on day
-        if first_session is None:
-            return Session.objects.none()
-
-        # Collect following sessions
-        session_nums = [first_session.session_num]
-        next_session = first_session
-        while next_session is not None:
-            try:
-                next_session = Session.objects.select_related("parliament").get(
-                    Q(timing_start_planned=None)
-                    | Q(
-                        timing_start_planned__gte=requested_date,
-                        timing_start_planned__lt=requested_tomorrow,
-                    ),
-                    parliament__parliament_num=next_session.parliament.parliament_num,
-                    session_num=next_session.session_num + 1,
-                )
-
-                session_nums.append(next_session.session_num)
-            except Session.DoesNotExist:
-                next_session = None
-                pass
-
-        # Return a chainable QuerySet object
-        return self.filter(
-            parliament__parliament_num=first_session.parliament.parliament_num,
-            session_num__in=session_nums,
-        )
+        return self.filter(effective_date=timezone.localdate(requested_date))
 
 
 class CommitteeQuerySet(models.QuerySet):
@@ -594,6 +638,11 @@ class Issue(models.Model):
     current_step = models.CharField(max_length=40, choices=ISSUE_STEPS, null=True)
     fate = models.CharField(max_length=40, choices=ISSUE_FATES, null=True)
 
+    # Digest of the issue's XML when it was last fully processed by the
+    # importer, including its document and review stubs. Used to skip issues
+    # that haven't changed.
+    xml_digest = models.CharField(max_length=64, null=True)
+
     # Django does not appear to support a default order for ManyToMany fields,
     # so we'll solve the problem this way instead of implementing and entire
     # through-model just for having a default order.
@@ -610,7 +659,10 @@ class Issue(models.Model):
             "parliament__parliament_num"
         )
 
-    def determine_status(self):
+    def get_status_evidence(self):
+        return Issue.objects.filter(id=self.id).status_evidence()[self.id]
+
+    def determine_status(self, evidence=None):
         # The overall status of an issue is composed of a sequence of steps.
         # Steps are booleans and a status is a sequential collection of
         # steps.
@@ -640,6 +692,9 @@ class Issue(models.Model):
         #
         # When taken together, these steps and information on whether they
         # have been taken or not, represent the overall status of the issue.
+        #
+        # The evidence is gathered with `IssueQuerySet.status_evidence`,
+        # which may be done for many issues at once and passed here.
         ISSUE_STEP_MAP = {
             "l": OrderedDict(self.ISSUE_STEPS_L),
             "a": OrderedDict(self.ISSUE_STEPS_A),
@@ -657,33 +712,29 @@ class Issue(models.Model):
         # Establish a clean set of steps.
         steps = OrderedDict([(x, False) for x in ISSUE_STEP_MAP[self.issue_type]])
 
+        if evidence is None:
+            evidence = self.get_status_evidence()
+
+        # Whether the issue has been on a committee agenda that has started.
+        committee_agenda_started = any(
+            timing_start_planned is not None and timing_start_planned < now
+            for timing_start_planned, timing_start in evidence.committee_agenda_timings
+        )
+
         # Check the steps of a legal bill.
         if self.issue_type == "l":
 
             steps["distributed"] = True
 
-            steps["iteration-1-waiting"] = (
-                self.session_agenda_items.filter(discussion_type="1").count() > 0
-            )
+            steps["iteration-1-waiting"] = "1" in evidence.discussion_types
 
-            steps["iteration-1-current"] = (
-                self.speeches.filter(iteration="1").count() > 0
-            )
+            steps["iteration-1-current"] = "1" in evidence.speech_iterations
 
-            steps["iteration-1-finished"] = (
-                self.vote_castings.filter(vote_casting_type="v2").count() > 0
-            )
+            steps["iteration-1-finished"] = evidence.has_vote_casting("v2")
 
-            steps["committee-1-waiting"] = (
-                self.vote_castings.filter(vote_casting_type="n2").count() > 0
-            )
+            steps["committee-1-waiting"] = evidence.has_vote_casting("n2")
 
-            steps["committee-1-current"] = (
-                self.committee_agenda_items.filter(
-                    committee_agenda__timing_start_planned__lt=now
-                ).count()
-                > 0
-            )
+            steps["committee-1-current"] = committee_agenda_started
 
             steps["committee-1-reviews-requested"] = (
                 self.review_deadline and self.review_deadline > now
@@ -693,39 +744,30 @@ class Issue(models.Model):
                 self.review_deadline and self.review_deadline < now
             )
 
-            steps["committee-1-finished"] = (
-                self.documents.filter(
-                    doc_type__in=[
-                        "nál. með brtt.",
-                        "nál. með frávt.",
-                        "nál. með rökst.",
-                        "nefndarálit",
-                    ]
-                ).count()
-                > 0
+            steps["committee-1-finished"] = evidence.has_document(
+                [
+                    "nál. með brtt.",
+                    "nál. með frávt.",
+                    "nál. með rökst.",
+                    "nefndarálit",
+                ]
             )
 
-            steps["iteration-2-waiting"] = (
-                self.session_agenda_items.filter(discussion_type="2").count() > 0
-            )
+            steps["iteration-2-waiting"] = "2" in evidence.discussion_types
 
-            steps["iteration-2-current"] = (
-                self.speeches.filter(iteration="2").count() > 0
-            )
+            steps["iteration-2-current"] = "2" in evidence.speech_iterations
 
-            steps["iteration-2-finished"] = (
-                self.vote_castings.filter(vote_casting_type="v3").count() > 0
-            )
+            steps["iteration-2-finished"] = evidence.has_vote_casting("v3")
 
             try:
-                vc = self.vote_castings.get(vote_casting_type="n3")
+                vc = evidence.get_vote_casting(vote_casting_type="n3")
                 steps["committee-2-waiting"] = True
 
-                steps["committee-2-current"] = (
-                    self.committee_agenda_items.filter(
-                        committee_agenda__timing_start__gt=vc.timing
-                    ).count()
-                    > 0
+                steps["committee-2-current"] = any(
+                    timing_start is not None and timing_start > vc.timing
+                    for timing_start_planned, timing_start in (
+                        evidence.committee_agenda_timings
+                    )
                 )
 
                 # NOTE/TODO:
@@ -740,36 +782,27 @@ class Issue(models.Model):
                 # committee returning an issue from its 2nd round to iteration
                 # 3 ("committee-2-finished"). Such indicators may still be
                 # unreliable, but they will still be better to have as well.
-                steps["committee-2-finished"] = (
-                    self.documents.filter(
-                        doc_type__in=[
-                            "framhaldsnefndarálit",
-                            "frhnál. með brtt.",
-                            "frhnál. með frávt.",
-                            "frhnál. með rökst.",
-                            "nál. með brtt.",
-                            "nál. með frávt.",
-                            "nál. með rökst.",
-                            "nefndarálit",
-                        ],
-                        time_published__gte=vc.timing,
-                    ).count()
-                    > 0
+                steps["committee-2-finished"] = evidence.has_document(
+                    [
+                        "framhaldsnefndarálit",
+                        "frhnál. með brtt.",
+                        "frhnál. með frávt.",
+                        "frhnál. með rökst.",
+                        "nál. með brtt.",
+                        "nál. með frávt.",
+                        "nál. með rökst.",
+                        "nefndarálit",
+                    ],
+                    published_since=vc.timing,
                 )
             except VoteCasting.DoesNotExist:
                 pass
 
-            steps["iteration-3-waiting"] = (
-                self.session_agenda_items.filter(discussion_type="3").count() > 0
-            )
+            steps["iteration-3-waiting"] = "3" in evidence.discussion_types
 
-            steps["iteration-3-current"] = (
-                self.speeches.filter(iteration="3").count() > 0
-            )
+            steps["iteration-3-current"] = "3" in evidence.speech_iterations
 
-            steps["iteration-3-finished"] = (
-                self.vote_castings.filter(vote_casting_type="lg").count() > 0
-            )
+            steps["iteration-3-finished"] = evidence.has_vote_casting("lg")
 
             # If no one spoke during the first iteration
             # TODO: Check if this scenario is even possible.
@@ -803,28 +836,15 @@ class Issue(models.Model):
 
             steps["distributed"] = True
 
-            steps["iteration-former-waiting"] = (
-                self.session_agenda_items.filter(discussion_type="F").count() > 0
-            )
+            steps["iteration-former-waiting"] = "F" in evidence.discussion_types
 
-            steps["iteration-former-current"] = (
-                self.speeches.filter(iteration="F").count() > 0
-            )
+            steps["iteration-former-current"] = "F" in evidence.speech_iterations
 
-            steps["iteration-former-finished"] = (
-                self.vote_castings.filter(vote_casting_type="vs").count() > 0
-            )
+            steps["iteration-former-finished"] = evidence.has_vote_casting("vs")
 
-            steps["committee-former-waiting"] = (
-                self.vote_castings.filter(vote_casting_type="ns").count() > 0
-            )
+            steps["committee-former-waiting"] = evidence.has_vote_casting("ns")
 
-            steps["committee-former-current"] = (
-                self.committee_agenda_items.filter(
-                    committee_agenda__timing_start_planned__lt=now
-                ).count()
-                > 0
-            )
+            steps["committee-former-current"] = committee_agenda_started
 
             steps["committee-former-reviews-requested"] = (
                 self.review_deadline and self.review_deadline > now
@@ -834,29 +854,20 @@ class Issue(models.Model):
                 self.review_deadline and self.review_deadline < now
             )
 
-            steps["committee-former-finished"] = (
-                self.documents.filter(
-                    doc_type__in=[
-                        "nál. með brtt.",
-                        "nál. með frávt.",
-                        "nál. með rökst.",
-                        "nefndarálit",
-                    ]
-                ).count()
-                > 0
+            steps["committee-former-finished"] = evidence.has_document(
+                [
+                    "nál. með brtt.",
+                    "nál. með frávt.",
+                    "nál. með rökst.",
+                    "nefndarálit",
+                ]
             )
 
-            steps["iteration-latter-waiting"] = (
-                self.session_agenda_items.filter(discussion_type="S").count() > 0
-            )
+            steps["iteration-latter-waiting"] = "S" in evidence.discussion_types
 
-            steps["iteration-latter-current"] = (
-                self.speeches.filter(iteration="S").count() > 0
-            )
+            steps["iteration-latter-current"] = "S" in evidence.speech_iterations
 
-            steps["iteration-latter-finished"] = (
-                self.vote_castings.filter(vote_casting_type="þa").count() > 0
-            )
+            steps["iteration-latter-finished"] = evidence.has_vote_casting("þa")
 
             # If no one spoke during the first iteration
             # TODO: Check if this scenario is even possible.
@@ -872,17 +883,13 @@ class Issue(models.Model):
 
         elif self.issue_type == "q":
             steps["distributed"] = True
-            steps["answered"] = self.documents.filter(doc_type="svar").count() > 0
+            steps["answered"] = evidence.has_document(["svar"])
             return steps
 
         elif self.issue_type == "b":
             steps["distributed"] = True
-            steps["voted-on"] = (
-                self.vote_castings.filter(vote_casting_type="bn").count() > 0
-            )
-            steps["report-delivered"] = (
-                self.documents.filter(doc_type="skýrsla (skv. beiðni)").count() > 0
-            )
+            steps["voted-on"] = evidence.has_vote_casting("bn")
+            steps["report-delivered"] = evidence.has_document(["skýrsla (skv. beiðni)"])
 
             if steps["report-delivered"]:
                 steps["concluded"] = True
@@ -896,35 +903,38 @@ class Issue(models.Model):
     # Determine the committee that this issue belongs to, if anyway. In the
     # unlikely and strange but conceivable case of it having been passed to
     # more than one committee, we'll prefer the latest one.
-    def determine_committee(self):
-        try:
-            return (
-                self.vote_castings.select_related("to_committee")
-                .exclude(to_committee=None)
-                .filter(Q(conclusion="samþykkt") | Q(conclusion=None))
-                .order_by("-timing")
-                .first()
-                .to_committee
-            )
-        except AttributeError:
+    def determine_committee(self, evidence=None):
+        if evidence is None:
+            evidence = self.get_status_evidence()
+
+        vote_castings = [
+            vc
+            for vc in evidence.vote_castings
+            if vc.to_committee_id is not None and vc.conclusion in ["samþykkt", None]
+        ]
+        if len(vote_castings) == 0:
             return None
 
+        return max(vote_castings, key=lambda vc: vc.timing).to_committee
+
     # Determine the minister that this issue was sent to, if anyway. In the
     # unlikely and strange but conceivable case of it having been sent to more
     # than one minister, we'll prefer the latest one.
-    def determine_minister(self):
-        try:
-            return (
-                self.vote_castings.select_related("to_minister")
-                .exclude(to_minister=None)
-                .order_by("-timing")
-                .first()
-                .to_minister
-            )
-        except AttributeError:
+    def determine_minister(self, evidence=None):
+        if evidence is None:
+            evidence = self.get_status_evidence()
+
+        vote_castings = [
+            vc for vc in evidence.vote_castings if vc.to_minister_id is not None
+        ]
+        if len(vote_castings) == 0:
             return None
 
-    def determine_fate(self):
+        return max(vote_castings, key=lambda vc: vc.timing).to_minister
+
+    def determine_fate(self, evidence=None):
+        if evidence is None:
+            evidence = self.get_status_evidence()
 
         if self.issue_type in ["l", "a"]:
 
@@ -942,9 +952,8 @@ class Issue(models.Model):
                 # For this reason, they are both called "sent-to-government",
                 # as that result is assumed to be the issue's fate, had the
                 # motion to dismiss and change the agenda been approved.
-                vote_casting = self.vote_castings.get(
-                    vote_casting_type="ft",
-                    conclusion="samþykkt"
+                vote_casting = evidence.get_vote_casting(
+                    vote_casting_type="ft", conclusion="samþykkt"
                 )
                 return "sent-to-government"
             except VoteCasting.DoesNotExist:
@@ -963,8 +972,9 @@ class Issue(models.Model):
                 # make it compatible with XML that's broken in this way. Note
                 # that we assume that the first such vote is the correct one,
                 # then. Revisit this if 2018-04-14 was a long time ago.
-                vote_casting = self.vote_castings.filter(vote_casting_type="lg").first()
-                if vote_casting:
+                vote_castings = evidence.filter_vote_castings(vote_casting_type="lg")
+                if vote_castings:
+                    vote_casting = vote_castings[0]
                     if vote_casting.conclusion == "samþykkt":
                         return "accepted"
                     elif vote_casting.conclusion == "Fellt":
@@ -988,7 +998,7 @@ class Issue(models.Model):
                 conclusions = set(
                     [
                         vc.conclusion
-                        for vc in self.vote_castings.filter(vote_casting_type="þa")
+                        for vc in evidence.filter_vote_castings(vote_casting_type="þa")
                     ]
                 )
                 if len(conclusions) == 1:
@@ -1005,7 +1015,7 @@ class Issue(models.Model):
         elif self.issue_type == "b":
             # Check if the request for the report was accepted.
             try:
-                vote_casting = self.vote_castings.get(vote_casting_type="bn")
+                vote_casting = evidence.get_vote_casting(vote_casting_type="bn")
                 if vote_casting.conclusion == "samþykkt":
                     return "accepted"
                 elif vote_casting.conclusion == "Fellt":
@@ -1137,16 +1147,15 @@ class Review(models.Model):
     # created a useful dossier tied to it.
     pending_deletion = models.BooleanField(default=False)
 
-    def pdf_content(self):
+    def pdf_path(self):
+        """
+        Returns the local path of the review's PDF file, either as downloaded
+        by the importer or as retrieved into the PDF cache.
+        """
         if self.pdf_filename:
-            filepath = "%s/%s" % (STATIC_DOCUMENT_DIR, self.pdf_filename)
-            with open(filepath, "rb") as f:
-                content = f.read()
+            return "%s/%s" % (STATIC_DOCUMENT_DIR, self.pdf_filename)
         else:
-            response = requests.get(self.pdf_remote_path)
-            content = response.content
-
-        return content
+            return pdfcache.get_pdf_path(self.pdf_remote_path)
 
     def save(self, *args, **kwargs):
         is_new = self.pk is None
@@ -1196,6 +1205,106 @@ class Review(models.Model):
         unique_together = ("issue", "log_num")
 
 
+class ContentBlob(models.Model):
+    """
+    Compressed text, such as the HTML of documents, stored apart from the
+    objects it belongs to so that it's only loaded when needed. Blobs are
+    addressed by the digest of their text, so identical texts are stored
+    only once.
+
+    Blobs that are served to browsers as they are, may also be stored in
+    gzip and brotli encodings, so that they can be delivered without
+    compressing them on every request. Brotli is only used when the
+    `brotli` package is installed.
+    """
+
+    digest = models.CharField(max_length=64, primary_key=True)
+    data = models.BinaryField()
+    gzip_data = models.BinaryField(null=True)
+    brotli_data = models.BinaryField(null=True)
+    time_created = models.DateTimeField(default=timezone.now)
+
+    # Fields of the available encodings, in order of preference.
+    ENCODING_FIELDS = {"gzip": "gzip_data"}
+    if brotli is not None:
+        ENCODING_FIELDS = {"br": "brotli_data", **ENCODING_FIELDS}
+
+    @staticmethod
+    def store(text, encoded=False):
+        """
+        Stores the given text, unless it's already stored, and returns its
+        blob. If `encoded` is True, its encoded variants are stored as well.
+        """
+        text_bytes = text.encode("utf-8")
+        blob, created = ContentBlob.objects.get_or_create(
+            digest=sha256(text_bytes).hexdigest(),
+            defaults={"data": zlib.compress(text_bytes, 9)},
+        )
+
+        if encoded:
+            blob.encode()
+
+        return blob
+
+    def encode(self):
+        """
+        Generates and saves the encoded variants of the blob which haven't
+        been stored yet.
+        """
+        update_fields = []
+        if self.gzip_data is None:
+            self.gzip_data = gzip.compress(self.text.encode("utf-8"), 9, mtime=0)
+            update_fields.append("gzip_data")
+        if self.brotli_data is None and brotli is not None:
+            self.brotli_data = brotli.compress(self.text.encode("utf-8"))
+            update_fields.append("brotli_data")
+
+        if update_fields:
+            self.save(update_fields=update_fields)
+
+    @property
+    def text(self):
+        return zlib.decompress(self.data).decode("utf-8")
+
+
+def blob_content(blob_field, encoded=False):
+    """
+    Returns a property for text stored in a `ContentBlob`, referred to by the
+    given foreign key. The text is loaded when first accessed and stored in a
+    blob by `store_blob_contents` when the object is saved, if it was
+    changed. Empty text is not stored at all. If `encoded` is True, the
+    blob's encoded variants are stored along with it.
+    """
+    cache_name = "_%s_content" % blob_field
+
+    def get_content(self):
+        if cache_name not in self.__dict__:
+            blob = getattr(self, blob_field)
+            self.__dict__[cache_name] = "" if blob is None else blob.text
+
+        return self.__dict__[cache_name]
+
+    def set_content(self, value):
+        self.__dict__[cache_name] = value
+        self.__dict__.setdefault("_changed_blob_fields", {})[blob_field] = encoded
+
+    return property(get_content, set_content)
+
+
+def store_blob_contents(instance):
+    """
+    Stores the changed blob contents of the given object in blobs, and
+    returns the names of the foreign keys that were changed as a result.
+    """
+    changed_blob_fields = instance.__dict__.pop("_changed_blob_fields", {})
+    for blob_field, encoded in changed_blob_fields.items():
+        text = instance.__dict__["_%s_content" % blob_field]
+        blob = ContentBlob.store(text, encoded=encoded) if text else None
+        setattr(instance, blob_field, blob)
+
+    return set(changed_blob_fields)
+
+
 class Document(models.Model):
     DOCUMENT_TYPES = (
         ("álit nefndar um skýrslu", "álit nefndar um skýrslu"),
@@ -1266,12 +1375,26 @@ class Document(models.Model):
     is_final = models.BooleanField(default=False)
 
     html_remote_path = models.CharField(max_length=500, null=True)
-    html_content_raw = models.TextField(default="")
-    html_content = models.TextField(default="")
     pdf_remote_path = models.CharField(max_length=500, null=True)
     pdf_filename = models.CharField(max_length=50)
 
-    xhtml = models.TextField()
+    # The bodies of documents are large and only needed when displaying or
+    # processing a single document, so they are stored compressed in blobs.
+    # Checking whether a body exists should be done with the foreign key's
+    # ID, which doesn't require loading the blob.
+    html_content_raw_blob = models.ForeignKey(
+        ContentBlob, null=True, related_name="+", on_delete=PROTECT
+    )
+    html_content_blob = models.ForeignKey(
+        ContentBlob, null=True, related_name="+", on_delete=PROTECT
+    )
+    xhtml_blob = models.ForeignKey(
+        ContentBlob, null=True, related_name="+", on_delete=PROTECT
+    )
+
+    html_content_raw = blob_content("html_content_raw_blob")
+    html_content = blob_content("html_content_blob", encoded=True)
+    xhtml = blob_content("xhtml_blob")
 
     def update_html_content(self) -> bool:
         """
@@ -1282,7 +1405,7 @@ class Document(models.Model):
         it further is the responsibility of some other mechanism, hence the
         variable name `html_content_raw`.
         """
-        response = get_response(self.html_remote_path)
+        response = fetch_response(self.html_remote_path)
         if response.status_code != 200:
             raise AlthingiException("Could not download document HTML at: %s" % self.html_remote_path)
         self.html_content_raw = response.text
@@ -1396,6 +1519,10 @@ class Document(models.Model):
     def save(self, *args, **kwargs):
         is_new = self.pk is None
 
+        changed_blob_fields = store_blob_contents(self)
+        if kwargs.get("update_fields") is not None:
+            kwargs["update_fields"] = set(kwargs["update_fields"]) | changed_blob_fields
+
         super(Document, self).save(*args, **kwargs)
 
         # If this is a main document, then the issue's publishing date should be the same.
@@ -1678,6 +1805,45 @@ class Session(models.Model):
     timing_end = models.DateTimeField(null=True)
     timing_text = models.CharField(max_length=200, null=True)
 
+    # The day on which the session is held, either according to
+    # timing_start_planned or inherited from the session it follows.
+    effective_date = models.DateField(null=True, db_index=True)
+
+    @staticmethod
+    def resolve_effective_dates(parliament, session_num=None):
+        """
+        Updates the effective date of every session in the given parliament.
+        Needed whenever a session is added, deleted or its planned timing
+        changes, since following sessions may inherit its date.
+
+        If a session number is given, only that session and the ones
+        following it are resolved, since preceding sessions are unaffected.
+        """
+        sessions = Session.objects.filter(parliament=parliament)
+
+        effective_date = None
+        if session_num is not None:
+            effective_date = (
+                sessions.filter(session_num__lt=session_num)
+                .order_by("-session_num")
+                .values_list("effective_date", flat=True)
+                .first()
+            )
+            sessions = sessions.filter(session_num__gte=session_num)
+
+        changed_sessions = []
+        for session in sessions.only(
+            "session_num", "timing_start_planned", "effective_date"
+        ).order_by("session_num"):
+            if session.timing_start_planned is not None:
+                effective_date = timezone.localdate(session.timing_start_planned)
+
+            if session.effective_date != effective_date:
+                session.effective_date = effective_date
+                changed_sessions.append(session)
+
+        Session.objects.bulk_update(changed_sessions, ["effective_date"])
+
     def __str__(self):
         return "%s" % self.name
 
@@ -1970,6 +2136,11 @@ class VoteCasting(models.Model):
 
     vote_casting_xml_id = models.IntegerField(unique=True)
 
+    # Digest of the XML listing the vote casting's votes when they were last
+    # written to the database by the importer. Used to skip vote castings
+    # whose votes haven't changed.
+    votes_xml_digest = models.CharField(max_length=64, null=True)
+
     def __str__(self):
         if self.specifics:
             return "%s (%s), %s @ %s" % (
@@ -2045,6 +2216,90 @@ class Speech(models.Model):
         ordering = ["timing_start"]
 
 
+class SpeechRollup(models.Model):
+    """
+    The total duration and number of speeches, per day, person, issue,
+    iteration, speech type and whether the speaker was presiding. Statistics
+    on speeches are calculated from these instead of the speeches themselves.
+    Kept up to date by `update_speeches`, by rebuilding the days on which
+    speeches have changed.
+    """
+
+    parliament = models.ForeignKey(
+        "Parliament", related_name="speech_rollups", on_delete=CASCADE
+    )
+    day = models.DateField()
+    person = models.ForeignKey(
+        "Person", related_name="speech_rollups", on_delete=CASCADE
+    )
+    issue = models.ForeignKey(
+        "Issue", null=True, related_name="speech_rollups", on_delete=CASCADE
+    )
+    iteration = models.CharField(max_length=3, null=True)
+    speech_type = models.CharField(max_length=30)
+    president = models.BooleanField(default=False)
+
+    seconds = models.IntegerField()
+    count = models.IntegerField()
+
+    @staticmethod
+    def rebuild(parliament, days=None):
+        """
+        Rebuilds the rollups of the given parliament from its speeches, for
+        the given days or otherwise for the whole parliament.
+        """
+        speeches = Speech.objects.filter(session__parliament=parliament)
+        rollups = SpeechRollup.objects.filter(parliament=parliament)
+        if days is not None:
+            speeches = speeches.filter(timing_start__date__in=days)
+            rollups = rollups.filter(day__in=days)
+
+        totals = (
+            speeches.values(
+                "person_id", "issue_id", "iteration", "speech_type", "president"
+            )
+            .annotate(
+                day=TruncDate("timing_start"),
+                total_seconds=Sum("seconds"),
+                total_count=Count("id"),
+            )
+            .order_by()
+        )
+
+        # Statistics must never be calculated from days whose rollups have
+        # been deleted but not yet re-created.
+        with transaction.atomic():
+            rollups.delete()
+            SpeechRollup.objects.bulk_create(
+                [
+                    SpeechRollup(
+                        parliament=parliament,
+                        day=total["day"],
+                        person_id=total["person_id"],
+                        issue_id=total["issue_id"],
+                        iteration=total["iteration"],
+                        speech_type=total["speech_type"],
+                        president=total["president"],
+                        seconds=total["total_seconds"],
+                        count=total["total_count"],
+                    )
+                    for total in totals
+                ],
+                batch_size=1000,
+            )
+
+    def __str__(self):
+        return "%s @ %s: %d seconds in %d speeches" % (
+            self.person,
+            self.day,
+            self.seconds,
+            self.count,
+        )
+
+    class Meta:
+        indexes = [models.Index(fields=["parliament", "day"])]
+
+
 class CategoryGroup(models.Model):
     name = models.CharField(max_length=200)
     slug = models.CharField(max_length=200)
@@ -2081,3 +2336,91 @@ class Category(models.Model):
 
     class Meta:
         ordering = ["name"]
+
+
+class ImportJournal(models.Model):
+    """
+    Progress of a lengthy run of the `update_althingi` command, so that a
+    run that fails midway, for example because the remote host is
+    unavailable, can be resumed with `update_althingi resume` instead of
+    starting over. The journal is deleted once the run finishes successfully.
+    """
+
+    args = models.JSONField()
+    parliament_nums = models.JSONField()
+    days = models.IntegerField(null=True)
+
+    timing_start = models.DateTimeField(default=timezone.now)
+    timing_failed = models.DateTimeField(null=True)
+    error = models.TextField(blank=True)
+
+    def is_done(self, parliament_num, feed):
+        return self.checkpoints.filter(
+            parliament_num=parliament_num, feed=feed, done=True
+        ).exists()
+
+    def get_position(self, parliament_num, feed):
+        """
+        Returns the key of the last entity processed in the given feed, or
+        None if none have been processed yet.
+        """
+        return (
+            self.checkpoints.filter(parliament_num=parliament_num, feed=feed)
+            .values_list("position", flat=True)
+            .first()
+        )
+
+    def set_position(self, parliament_num, feed, position):
+        self.checkpoints.update_or_create(
+            parliament_num=parliament_num,
+            feed=feed,
+            defaults={"position": str(position)},
+        )
+
+    def set_done(self, parliament_num, feed):
+        self.checkpoints.update_or_create(
+            parliament_num=parliament_num, feed=feed, defaults={"done": True}
+        )
+
+    def fail(self, error):
+        self.timing_failed = timezone.now()
+        self.error = str(error)
+        self.save(update_fields=["timing_failed", "error"])
+
+    def __str__(self):
+        return "%d: %s" % (
+            self.id,
+            " ".join(
+                name if value is None else "%s=%s" % (name, value)
+                for name, value in self.args.items()
+            ),
+        )
+
+    class Meta:
+        ordering = ["timing_start"]
+
+
+class ImportCheckpoint(models.Model):
+    """
+    Progress of a single feed, such as issues or speeches, of a parliament
+    within an import journal. Feeds that are processed entity by entity
+    record the key of the last processed entity as their position.
+    """
+
+    journal = models.ForeignKey(
+        "ImportJournal", related_name="checkpoints", on_delete=CASCADE
+    )
+    parliament_num = models.IntegerField()
+    feed = models.CharField(max_length=50)
+    position = models.CharField(max_length=50, null=True)
+    done = models.BooleanField(default=False)
+
+    def __str__(self):
+        return "%d. %s: %s" % (
+            self.parliament_num,
+            self.feed,
+            "done" if self.done else self.position,
+        )
+
+    class Meta:
+        unique_together = ("journal", "parliament_num", "feed")
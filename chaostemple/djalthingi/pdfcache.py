@@ -0,0 +1,225 @@
+import os
+import requests
+from concurrent.futures import ThreadPoolExecutor
+from hashlib import sha256
+from sys import stderr
+from tempfile import NamedTemporaryFile
+from threading import Lock
+from time import time
+
+from djalthingi import althingi_settings
+from djalthingi.exceptions import AlthingiException
+from djalthingi.exceptions import RemoteContentException
+from djalthingi.xmlutils import get_scraper
+from djalthingi.xmlutils import rate_limiter
+
+# A read-through cache of remote PDF files on disk, for those that haven't
+# been downloaded permanently by the importer (see `DOWNLOAD_DOCUMENTS` and
+# `DOWNLOAD_REVIEWS`). Files are named by the digest of their remote URL.
+#
+# The cache is bounded in size by `PDF_CACHE_MAX_SIZE`. When it grows beyond
+# that, the least recently used files are evicted. Use is tracked by the
+# access time of the files, which is set explicitly on every use so that it
+# doesn't depend on how the filesystem is mounted. The modification time is
+# left alone, to serve as the time at which the file was retrieved.
+#
+# Files used within the last `EVICTION_GRACE_PERIOD` seconds are never
+# evicted, so that a file isn't removed between being looked up and being
+# served. Downloads are serialized per file by a fixed number of locks, each
+# shared by the files whose names hash to it.
+#
+# Files are usually retrieved while a web request waits for them, so only a
+# single attempt is made, with a short timeout.
+
+EVICTION_GRACE_PERIOD = 60
+
+# Files are evicted until the cache is down to this fraction of its maximum
+# size, so that eviction isn't needed again after every single retrieval.
+EVICTION_TARGET = 0.9
+
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+
+download_locks = [Lock() for i in range(64)]
+
+# Estimated total size of the cache in bytes. It's counted when first needed
+# and when files are evicted, and kept up to date with the files retrieved by
+# this process in between. Files retrieved by other processes are therefore
+# only accounted for when the cache is counted again.
+cache_size = None
+cache_size_lock = Lock()
+
+prefetch_executor = None
+
+
+def cache_filename(remote_path):
+    digest = sha256(remote_path.encode("utf-8")).hexdigest()
+    return os.path.join(althingi_settings.PDF_CACHE_DIR, digest[:2], "%s.pdf" % digest)
+
+
+def get_download_lock(filename):
+    return download_locks[hash(filename) % len(download_locks)]
+
+
+def get_pdf_path(remote_path, timeout=None):
+    """
+    Returns the local path of the PDF file at the given remote path,
+    retrieving it first if it's not already in the cache. Raises an
+    AlthingiException if it cannot be retrieved.
+
+    The `timeout` in seconds defaults to `PDF_REQUEST_TIMEOUT`.
+    """
+    if timeout is None:
+        timeout = althingi_settings.PDF_REQUEST_TIMEOUT
+
+    filename = cache_filename(remote_path)
+
+    # Only one thread retrieves the same file at a time. Others wait for it
+    # and then find it in the cache.
+    with get_download_lock(filename):
+        try:
+            stat = os.stat(filename)
+        except FileNotFoundError:
+            size = download(remote_path, filename, timeout)
+        else:
+            os.utime(filename, (time(), stat.st_mtime))
+            return filename
+
+    add_cache_size(size)
+
+    return filename
+
+
+def download(remote_path, filename, timeout):
+    """
+    Retrieves the file at the given remote path to the given filename,
+    streaming it to disk. Returns its size in bytes.
+    """
+    os.makedirs(os.path.dirname(filename), exist_ok=True)
+
+    # Written to a temporary file first and then moved in place, so that
+    # other processes never see a partially written file.
+    with NamedTemporaryFile(dir=os.path.dirname(filename), delete=False) as f:
+        try:
+            fetch_to_file(remote_path, f, timeout)
+        except BaseException:
+            f.close()
+            os.remove(f.name)
+            raise
+        size = f.tell()
+    os.replace(f.name, filename)
+
+    return size
+
+
+def fetch_to_file(remote_path, f, timeout):
+    try:
+        rate_limiter.wait(remote_path)
+
+        with get_scraper().get(remote_path, stream=True, timeout=timeout) as response:
+            if response.status_code != 200:
+                raise RemoteContentException(
+                    "Got unexpected HTTP code %d from: %s"
+                    % (response.status_code, remote_path),
+                    remote_path,
+                )
+
+            for chunk in response.iter_content(DOWNLOAD_CHUNK_SIZE):
+                f.write(chunk)
+
+    except requests.RequestException as ex:
+        raise RemoteContentException(
+            "Failed retrieving URL: %s" % remote_path, remote_path
+        ) from ex
+
+
+def add_cache_size(size):
+    """
+    Adds the size of a newly retrieved file to the estimated size of the
+    cache, evicting files when the estimate exceeds `PDF_CACHE_MAX_SIZE`.
+    """
+    global cache_size
+
+    with cache_size_lock:
+        if cache_size is None:
+            cache_size = sum(file_size for atime, file_size, path in list_files())
+        else:
+            cache_size += size
+
+        if cache_size > althingi_settings.PDF_CACHE_MAX_SIZE:
+            cache_size = evict()
+
+
+def list_files():
+    """
+    Returns the access time, size and path of every file in the cache.
+    """
+    files = []
+    for dirpath, dirnames, filenames in os.walk(althingi_settings.PDF_CACHE_DIR):
+        for name in filenames:
+            # Temporary files of downloads in progress are left alone.
+            if not name.endswith(".pdf"):
+                continue
+
+            path = os.path.join(dirpath, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue  # Evicted by another process meanwhile.
+            files.append((stat.st_atime, stat.st_size, path))
+
+    return files
+
+
+def evict():
+    """
+    Removes the least recently used files from the cache until its total
+    size is within `EVICTION_TARGET` of `PDF_CACHE_MAX_SIZE`, except for
+    recently used ones. Returns the total size of the remaining files.
+    """
+    files = list_files()
+    total_size = sum(size for atime, size, path in files)
+
+    target_size = althingi_settings.PDF_CACHE_MAX_SIZE * EVICTION_TARGET
+    evictable_before = time() - EVICTION_GRACE_PERIOD
+
+    files.sort()
+    for atime, size, path in files:
+        if total_size <= target_size:
+            break
+        if atime > evictable_before:
+            break
+
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total_size -= size
+
+    return total_size
+
+
+def prefetch(remote_paths):
+    """
+    Retrieves the PDF files at the given remote paths into the cache in the
+    background, so that they're ready when first requested. The files are
+    retrieved by a thread pool which finishes its work before the process
+    exits.
+    """
+    global prefetch_executor
+
+    if prefetch_executor is None:
+        prefetch_executor = ThreadPoolExecutor(
+            max_workers=althingi_settings.PDF_PREFETCH_WORKERS
+        )
+
+    for remote_path in remote_paths:
+        prefetch_executor.submit(prefetch_one, remote_path)
+
+
+def prefetch_one(remote_path):
+    try:
+        # Nobody is waiting, so the usual timeout of the importer applies.
+        get_pdf_path(remote_path, althingi_settings.REMOTE_CONTENT_TIMEOUT)
+    except AlthingiException as ex:
+        # Not fatal. The file will be retrieved when it's requested.
+        print("Prefetching PDF failed: %s" % ex, file=stderr)
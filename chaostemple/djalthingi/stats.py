@@ -1,9 +1,8 @@
 import operator
-from datetime import timedelta
 from djalthingi.models import Parliament
 from djalthingi.models import Person
 from djalthingi.models import Speech
-from django.db.models import Count
+from djalthingi.models import SpeechRollup
 from django.db.models import Sum
 from django.utils import timezone
 
@@ -12,60 +11,54 @@ from django.utils import timezone
 # Some functionality should also be moved to the administration command.
 def stats_speeches(parliament_num: int, options):
 
-    if options["today"] is not None:
-        today = timezone.now().replace(
-            hour=0, minute=0, second=0, microsecond=0
-        )
-        date_from = today
-        date_to = today + timedelta(days=1)
-    else:
-        date_from = None
-        date_to = None
-
     parliament = Parliament.objects.get(parliament_num=parliament_num)
 
-    # Base conditions for person lookup.
-    # This must be constructed and then manipulated according to
-    # options because we have to issue a single filter.
-    q_conditions = {
-        "speeches__session__parliament": parliament,
-    }
+    # Statistics are calculated from the speech rollups of the parliament,
+    # which are narrowed down according to options.
+    rollups = SpeechRollup.objects.filter(parliament=parliament)
+
+    # Process option for limiting to today.
+    if options["today"] is not None:
+        rollups = rollups.filter(day=timezone.localdate())
 
     # Process option for limiting to current issue.
     if options["current_issue"] is not None:
         last_issue = Speech.objects.last().issue
-        q_conditions["speeches__issue"] = last_issue
+        rollups = rollups.filter(issue=last_issue)
 
         # Option implies skipping speaker.
         options["skip_speaker"] = True
 
     # Process option for limiting to given issue.
     if options["issue"] is not None:
-        q_conditions["speeches__issue__issue_num"] = options["issue"].pop()
-        q_conditions["speeches__issue__issue_group"] = "A"
+        rollups = rollups.filter(
+            issue__issue_num=options["issue"].pop(), issue__issue_group="A"
+        )
 
         # Option implies skipping speaker.
         options["skip_speaker"] = True
 
     # Process option for skipping speaker.
     if options["skip_speaker"] is not None:
-        q_conditions["speeches__president"] = False
+        rollups = rollups.filter(president=False)
 
     # Process option for only selecting main speeches.
     if options["only_main"] is not None:
-        q_conditions["speeches__speech_type"] = "ræða"
+        rollups = rollups.filter(speech_type="ræða")
 
     # Process option for selecting speeches by iteration.
     if options["iteration"] is not None:
-        q_conditions["speeches__iteration"] = options["iteration"].pop()
+        rollups = rollups.filter(iteration=options["iteration"].pop())
 
-    persons = Person.objects.filter(**q_conditions)
+    person_totals = {
+        total["person_id"]: (total["total_seconds"], total["total_count"])
+        for total in rollups.values("person_id")
+        .annotate(total_seconds=Sum("seconds"), total_count=Sum("count"))
+        .order_by()
+    }
 
-    # Add annotations and get more data.
     persons = (
-        persons.annotate(
-            seconds=Sum("speeches__seconds"), count=Count("speeches")
-        )
+        Person.objects.filter(id__in=person_totals.keys())
         .prefetch_latest_seats(parliament)
         .prefetch_latest_minister_seats(parliament)
     )
@@ -81,20 +74,8 @@ def stats_speeches(parliament_num: int, options):
         party_mp_counts[party.abbreviation_long] = party.mp_count
 
     mp_rows = []
-    for i, person in enumerate(persons):
-        if date_from and date_to:
-            speeches = person.speeches.filter(
-                session__parliament__parliament_num=parliament_num,
-                timing_start__gte=date_from,
-                timing_end__lte=date_to,
-            )
-
-            count = len(speeches)
-            seconds = sum([s.seconds for s in speeches])
-
-        else:
-            count = person.count
-            seconds = person.seconds
+    for person in persons:
+        seconds, count = person_totals[person.id]
 
         try:
             party = person.last_seat[0].party.abbreviation_long
@@ -1,14 +1,68 @@
+import gzip
 import os
 import sys
+import zlib
 
+from contextlib import redirect_stdout
+from datetime import date
 from datetime import timedelta
-
+from importlib import import_module
+from io import StringIO
+from tempfile import TemporaryDirectory
+from types import SimpleNamespace
+from unittest.mock import Mock
+from unittest.mock import patch
+
+import requests
+
+from django.apps import apps
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import DatabaseError
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.db.models import Count
+from django.db.models import Sum
+from django.db.models.functions import TruncDate
 from django.test import TestCase
+from django.test import TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
 from django.utils import timezone
+from lxml import etree
 
+from djalthingi import althingi_settings
+from djalthingi import pdfcache
+from djalthingi import xmlutils
 from djalthingi.althingi_settings import FIRST_PARLIAMENT_NUM
 from djalthingi.exceptions import AlthingiException
+from djalthingi.exceptions import RemoteContentException
+from djalthingi.icalfeeds import invalidate_committee
+from djalthingi.management.commands.run_importer import Command as RunImporterCommand
+from djalthingi.management.commands.run_importer import Feed
+from djalthingi.management.commands.update_althingi import PrefixedOutput
+from djalthingi.models import Committee
+from djalthingi.models import ContentBlob
+from djalthingi.models import CommitteeAgenda
+from djalthingi.models import CommitteeAgendaItem
+from djalthingi.models import Document
+from djalthingi.models import ImportJournal
+from djalthingi.models import Issue
+from djalthingi.models import IssueStep
+from djalthingi.models import Minister
+from djalthingi.models import Parliament
+from djalthingi.models import Person
+from djalthingi.models import Session
+from djalthingi.models import SessionAgendaItem
+from djalthingi.models import Speech
+from djalthingi.models import SpeechRollup
+from djalthingi.models import Vote
+from djalthingi.models import VoteCasting
+from djalthingi.models import store_blob_contents
+from djalthingi.stats import stats_speeches
+from djalthingi.updaters import already_haves
 from djalthingi.updaters import clear_already_haves
+from djalthingi.updaters import skip_journaled
 from djalthingi.updaters import update_categories
 from djalthingi.updaters import update_committee
 from djalthingi.updaters import update_committee_agenda
@@ -35,7 +89,7 @@ from djalthingi.updaters import update_sessions
 from djalthingi.updaters import update_speeches
 from djalthingi.updaters import update_vote_castings
 from djalthingi.utils import get_last_parliament_num
-
+from djalthingi.xmlutils import xml_url
 
 # Test dummies.
 test_dummy = (1166, 148, "Helgi Hrafn Gunnarsson")
@@ -398,3 +452,1854 @@ class AlthingiUpdaterTest(TestCase):
     @hidden_prints
     def test_update_categories(self):
         update_categories()
+
+
+class IssueStatusTest(TestCase):
+    """
+    Tests the determination of issue statuses from data already in the
+    database, without fetching anything.
+    """
+
+    def setUp(self):
+        clear_already_haves()
+
+        now = timezone.now()
+
+        self.parliament = Parliament.objects.create(
+            parliament_num=157, era="2026-2027", timing_start=now - timedelta(days=60)
+        )
+        already_haves["parliaments"][157] = self.parliament
+
+        self.committee = Committee.objects.create(
+            name="allsherjar- og menntamálanefnd",
+            abbreviation_short="am",
+            abbreviation_long="allsh.- og menntmn.",
+            parliament_num_first=157,
+            committee_xml_id=201,
+        )
+        self.minister = Minister.objects.create(
+            name="forsætisráðherra",
+            abbreviation_short="forsrh.",
+            abbreviation_long="forsætisrh.",
+            parliament_num_first=157,
+            minister_xml_id=1,
+        )
+        self.person = Person.objects.create(
+            name="Jón Jónsson",
+            ssn="0101802989",
+            birthdate=date(1980, 1, 1),
+            person_xml_id=1,
+        )
+        self.session = Session.objects.create(
+            parliament=self.parliament,
+            session_num=1,
+            name="1. fundur",
+            timing_start_planned=now - timedelta(days=30),
+        )
+        self.committee_agenda = CommitteeAgenda.objects.create(
+            parliament=self.parliament,
+            committee=self.committee,
+            timing_start_planned=now - timedelta(days=5),
+            timing_start=now - timedelta(days=5),
+            committee_agenda_xml_id=1,
+        )
+
+        # A bill in committee after its 1st debate.
+        self.create_issue(
+            1,
+            "l",
+            review_deadline=now - timedelta(days=1),
+            discussion_types=["1"],
+            speech_iterations=["1"],
+            vote_castings=[("v2", "samþykkt"), ("n2", "samþykkt")],
+            doc_types=["frumvarp", "nefndarálit"],
+            committee_agenda=True,
+        )
+        # A bill that has been passed into law, without a committee meeting.
+        self.create_issue(
+            2,
+            "l",
+            discussion_types=["1", "2", "3"],
+            speech_iterations=["1", "2"],
+            vote_castings=[
+                ("v2", "samþykkt"),
+                ("n2", "samþykkt"),
+                ("v3", "samþykkt"),
+                ("lg", "samþykkt"),
+            ],
+            doc_types=["frumvarp", "nál. með brtt."],
+        )
+        # A bill that has only been distributed.
+        self.create_issue(3, "l", doc_types=["frumvarp"])
+        # A motion that has been rejected.
+        self.create_issue(
+            4,
+            "a",
+            discussion_types=["F", "S"],
+            speech_iterations=["F"],
+            vote_castings=[("vs", "samþykkt"), ("þa", "Fellt")],
+            doc_types=["þáltill."],
+        )
+        # A question that has been answered.
+        self.create_issue(5, "q", doc_types=["fsp. til skrifl. svars", "svar"])
+        # A request for a report that has been accepted.
+        self.create_issue(
+            6,
+            "b",
+            vote_castings=[("bn", "samþykkt")],
+            doc_types=["beiðni um skýrslu"],
+        )
+        # An issue of a type whose status isn't determined.
+        self.create_issue(7, "s", doc_types=["skýrsla rh. (frumskjal)"])
+
+    def tearDown(self):
+        clear_already_haves()
+
+    def create_issue(
+        self,
+        issue_num,
+        issue_type,
+        review_deadline=None,
+        discussion_types=[],
+        speech_iterations=[],
+        vote_castings=[],
+        doc_types=[],
+        committee_agenda=False,
+    ):
+        issue = Issue.objects.create(
+            parliament=self.parliament,
+            issue_num=issue_num,
+            issue_group="A",
+            issue_type=issue_type,
+            name="Test issue %d" % issue_num,
+            review_deadline=review_deadline,
+        )
+
+        timing = self.parliament.timing_start
+        for order, discussion_type in enumerate(discussion_types):
+            SessionAgendaItem.objects.create(
+                session=self.session,
+                order=issue_num * 10 + order,
+                discussion_type=discussion_type,
+                issue=issue,
+            )
+
+        for iteration in speech_iterations:
+            Speech.objects.create(
+                person=self.person,
+                session=self.session,
+                issue=issue,
+                date=timing,
+                timing_start=timing,
+                timing_end=timing,
+                seconds=0,
+                speech_type="ræða",
+                iteration=iteration,
+            )
+
+        for vote_casting_type, conclusion in vote_castings:
+            timing += timedelta(days=1)
+            VoteCasting.objects.create(
+                timing=timing,
+                vote_casting_type=vote_casting_type,
+                conclusion=conclusion,
+                issue=issue,
+                session=self.session,
+                to_committee=self.committee if vote_casting_type[0] == "n" else None,
+                to_minister=self.minister if vote_casting_type == "bn" else None,
+                vote_casting_xml_id=VoteCasting.objects.count() + 1,
+            )
+
+        for doc_num, doc_type in enumerate(doc_types, start=issue_num * 10):
+            timing += timedelta(days=1)
+            Document.objects.create(
+                issue=issue,
+                doc_num=doc_num,
+                doc_type=doc_type,
+                time_published=timing,
+                is_main=doc_num == issue_num * 10,
+            )
+
+        if committee_agenda:
+            CommitteeAgendaItem.objects.create(
+                committee_agenda=self.committee_agenda,
+                order=issue_num,
+                name=issue.name,
+                issue=issue,
+            )
+
+        return issue
+
+    def assertStatuses(self):
+        """
+        Asserts that the issues' steps, committees, ministers and fates are
+        the ones determined by the rules for each issue on its own.
+        """
+        expected = {
+            1: (
+                [
+                    "distributed",
+                    "iteration-1-waiting",
+                    "iteration-1-current",
+                    "iteration-1-finished",
+                    "committee-1-waiting",
+                    "committee-1-current",
+                    "committee-1-reviews-arrived",
+                    "committee-1-finished",
+                ],
+                self.committee,
+                None,
+                None,
+            ),
+            2: (
+                [
+                    "distributed",
+                    "iteration-1-waiting",
+                    "iteration-1-current",
+                    "iteration-1-finished",
+                    "committee-1-waiting",
+                    "committee-1-finished",
+                    "iteration-2-waiting",
+                    "iteration-2-current",
+                    "iteration-2-finished",
+                    "iteration-3-waiting",
+                    "iteration-3-current",
+                    "iteration-3-finished",
+                    "concluded",
+                ],
+                self.committee,
+                None,
+                "accepted",
+            ),
+            3: (["distributed"], None, None, None),
+            4: (
+                [
+                    "distributed",
+                    "iteration-former-waiting",
+                    "iteration-former-current",
+                    "iteration-former-finished",
+                    "iteration-latter-waiting",
+                    "iteration-latter-current",
+                    "iteration-latter-finished",
+                    "concluded",
+                ],
+                None,
+                None,
+                "rejected",
+            ),
+            5: (["distributed", "answered"], None, None, None),
+            6: (["distributed", "voted-on"], None, self.minister, "accepted"),
+            7: ([], None, None, None),
+        }
+
+        for issue in Issue.objects.order_by("issue_num"):
+            steps, committee, minister, fate = expected[issue.issue_num]
+            with self.subTest(issue_num=issue.issue_num):
+                self.assertEqual(
+                    list(issue.steps.order_by("order").values_list("code", flat=True)),
+                    steps,
+                )
+                self.assertEqual(
+                    list(issue.steps.order_by("order").values_list("order", flat=True)),
+                    list(range(1, len(steps) + 1)),
+                )
+                self.assertEqual(issue.current_step, steps[-1] if steps else None)
+                self.assertEqual(issue.to_committee, committee)
+                self.assertEqual(issue.to_minister, minister)
+                self.assertEqual(issue.fate, fate)
+
+    @hidden_prints
+    def test_update_issue_status(self):
+        for issue_num in range(1, 8):
+            update_issue_status(issue_num, 157)
+
+        self.assertStatuses()
+
+    @hidden_prints
+    def test_update_issue_statuses(self):
+        # Leftovers from earlier statuses, which should be corrected.
+        issue = Issue.objects.get(issue_num=1)
+        IssueStep.objects.create(issue=issue, code="distributed", order=3)
+        IssueStep.objects.create(issue=issue, code="iteration-3-waiting", order=4)
+
+        update_issue_statuses(157)
+
+        self.assertStatuses()
+
+    def test_status_evidence(self):
+        """
+        The evidence gathered for many issues at once gives the same results
+        as the evidence gathered for each issue on its own.
+        """
+        issues = Issue.objects.filter(parliament=self.parliament)
+        evidence = issues.status_evidence()
+
+        for issue in issues:
+            with self.subTest(issue_num=issue.issue_num):
+                self.assertEqual(
+                    issue.determine_status(evidence[issue.id]),
+                    issue.determine_status(),
+                )
+                self.assertEqual(
+                    issue.determine_committee(evidence[issue.id]),
+                    issue.determine_committee(),
+                )
+                self.assertEqual(
+                    issue.determine_minister(evidence[issue.id]),
+                    issue.determine_minister(),
+                )
+                self.assertEqual(
+                    issue.determine_fate(evidence[issue.id]),
+                    issue.determine_fate(),
+                )
+
+
+class SessionEffectiveDateTest(TestCase):
+    def setUp(self):
+        now = timezone.now()
+        self.yesterday = now - timedelta(days=1)
+        self.tomorrow = now + timedelta(days=1)
+
+        self.parliament = Parliament.objects.create(
+            parliament_num=157, era="2026-2027", timing_start=now - timedelta(days=60)
+        )
+
+        # Sessions without a planned start are held after the preceding one.
+        for session_num, timing_start_planned in [
+            (1, None),
+            (2, self.yesterday),
+            (3, None),
+            (4, self.tomorrow),
+            (5, None),
+            (7, None),
+        ]:
+            Session.objects.create(
+                parliament=self.parliament,
+                session_num=session_num,
+                name="%d. fundur" % session_num,
+                timing_start_planned=timing_start_planned,
+            )
+
+        Session.resolve_effective_dates(self.parliament)
+
+    def effective_dates(self):
+        return dict(
+            Session.objects.filter(parliament=self.parliament).values_list(
+                "session_num", "effective_date"
+            )
+        )
+
+    def session_nums(self, sessions):
+        return sorted(session.session_num for session in sessions)
+
+    def test_resolve_effective_dates(self):
+        yesterday = timezone.localdate(self.yesterday)
+        tomorrow = timezone.localdate(self.tomorrow)
+
+        self.assertEqual(
+            self.effective_dates(),
+            {
+                1: None,
+                2: yesterday,
+                3: yesterday,
+                4: tomorrow,
+                5: tomorrow,
+                7: tomorrow,
+            },
+        )
+
+        # Following sessions inherit a changed date.
+        Session.objects.filter(parliament=self.parliament, session_num=4).update(
+            timing_start_planned=None
+        )
+        Session.resolve_effective_dates(self.parliament)
+
+        self.assertEqual(
+            self.effective_dates(),
+            {
+                1: None,
+                2: yesterday,
+                3: yesterday,
+                4: yesterday,
+                5: yesterday,
+                7: yesterday,
+            },
+        )
+
+        # Only sessions whose dates change are written.
+        with self.assertNumQueries(1):
+            Session.resolve_effective_dates(self.parliament)
+
+    def test_resolve_effective_dates_from(self):
+        yesterday = timezone.localdate(self.yesterday)
+        tomorrow = timezone.localdate(self.tomorrow)
+
+        Session.objects.filter(parliament=self.parliament, session_num=5).update(
+            timing_start_planned=self.yesterday
+        )
+        Session.objects.filter(parliament=self.parliament, session_num=2).update(
+            timing_start_planned=None
+        )
+
+        # Sessions preceding the given one are left alone.
+        Session.resolve_effective_dates(self.parliament, 5)
+        self.assertEqual(
+            self.effective_dates(),
+            {
+                1: None,
+                2: yesterday,
+                3: yesterday,
+                4: tomorrow,
+                5: yesterday,
+                7: yesterday,
+            },
+        )
+
+        # Following sessions inherit the date of the preceding one.
+        Session.objects.filter(parliament=self.parliament, session_num=5).update(
+            timing_start_planned=None
+        )
+        Session.resolve_effective_dates(self.parliament, 5)
+        self.assertEqual(self.effective_dates()[7], tomorrow)
+
+    def session_agenda_xml(self, session_num, timing_start_planned=None):
+        session_xml = etree.Element(
+            "þingfundur", þingnúmer="157", númer=str(session_num)
+        )
+        etree.SubElement(session_xml, "fundarheiti").text = "%d. fundur" % session_num
+        if timing_start_planned is not None:
+            etree.SubElement(
+                etree.SubElement(session_xml, "hefst"), "dagurtími"
+            ).text = timing_start_planned.strftime("%Y-%m-%dT%H:%M:%S")
+        etree.SubElement(session_xml, "dagskrá")
+        return session_xml
+
+    def update_with(self, xml_update, xml):
+        """
+        Runs the given updater on the given XML documents instead of remote
+        ones, counting the times effective dates are resolved.
+        """
+        clear_already_haves()
+        already_haves["parliaments"][157] = self.parliament
+
+        def get_xml(xml_url_name, *args):
+            return xml[(xml_url_name,) + args]
+
+        with patch("djalthingi.updaters.get_xml", get_xml), patch.object(
+            Session, "resolve_effective_dates", wraps=Session.resolve_effective_dates
+        ) as resolve_effective_dates:
+            xml_update()
+
+        clear_already_haves()
+        return resolve_effective_dates.call_count
+
+    @hidden_prints
+    def test_update_sessions(self):
+        day_after_tomorrow = self.tomorrow + timedelta(days=1)
+
+        # Sessions are listed latest first.
+        session_list_xml = etree.Element("þingfundir")
+        xml = {("SESSION_LIST_URL", 157): session_list_xml}
+        for session_num, timing_start_planned in [
+            (9, None),
+            (8, day_after_tomorrow),
+            (7, None),
+            (5, None),
+            (4, None),
+            (3, None),
+            (2, self.yesterday),
+            (1, None),
+        ]:
+            etree.SubElement(session_list_xml, "þingfundur", númer=str(session_num))
+
+            agenda_xml = etree.Element("dagskrá")
+            agenda_xml.append(
+                self.session_agenda_xml(session_num, timing_start_planned)
+            )
+            xml[("SESSION_AGENDA_URL", 157, session_num)] = agenda_xml
+
+        # Dates are resolved once, not for every added or changed session.
+        self.assertEqual(self.update_with(lambda: update_sessions(157), xml), 1)
+
+        yesterday = timezone.localdate(self.yesterday)
+        self.assertEqual(
+            self.effective_dates(),
+            {
+                1: None,
+                2: yesterday,
+                3: yesterday,
+                4: yesterday,
+                5: yesterday,
+                7: yesterday,
+                8: timezone.localdate(day_after_tomorrow),
+                9: timezone.localdate(day_after_tomorrow),
+            },
+        )
+
+    @hidden_prints
+    def test_update_next_sessions(self):
+        day_after_tomorrow = self.tomorrow + timedelta(days=1)
+
+        # Session 7 has been cancelled and session 5 postponed.
+        next_agenda_xml = etree.Element("dagskrá")
+        next_agenda_xml.append(self.session_agenda_xml(4, self.tomorrow))
+        next_agenda_xml.append(self.session_agenda_xml(5, day_after_tomorrow))
+        xml = {
+            ("SESSION_NEXT_AGENDA_URL",): next_agenda_xml,
+            ("SESSION_AGENDA_URL", 157, 7): etree.Element("dagskrá"),
+        }
+
+        # Once for the upcoming sessions, once after the cancelled ones.
+        self.assertEqual(self.update_with(update_next_sessions, xml), 2)
+
+        yesterday = timezone.localdate(self.yesterday)
+        self.assertEqual(
+            self.effective_dates(),
+            {
+                1: None,
+                2: yesterday,
+                3: yesterday,
+                4: timezone.localdate(self.tomorrow),
+                5: timezone.localdate(day_after_tomorrow),
+            },
+        )
+
+    def test_on_date(self):
+        sessions = Session.objects.filter(parliament=self.parliament)
+
+        self.assertEqual(self.session_nums(sessions.on_date(self.yesterday)), [2, 3])
+        self.assertEqual(self.session_nums(sessions.on_date(self.tomorrow)), [4, 5, 7])
+        self.assertEqual(self.session_nums(sessions.on_date(timezone.now())), [])
+
+        # The result can be filtered further.
+        self.assertEqual(
+            self.session_nums(sessions.on_date(self.tomorrow).exclude(session_num=5)),
+            [4, 7],
+        )
+
+    def test_upcoming(self):
+        sessions = Session.objects.filter(parliament=self.parliament)
+
+        self.assertEqual(self.session_nums(sessions.upcoming()), [4, 5, 7])
+        self.assertEqual(sessions.upcoming().first().session_num, 4)
+
+
+class SpeechRollupTest(TestCase):
+    def setUp(self):
+        self.parliament = Parliament.objects.create(
+            parliament_num=157,
+            era="2026-2027",
+            timing_start=timezone.now() - timedelta(days=60),
+        )
+        self.session = Session.objects.create(
+            parliament=self.parliament, session_num=1, name="1. fundur"
+        )
+        self.issues = [
+            Issue.objects.create(
+                parliament=self.parliament,
+                issue_num=issue_num,
+                issue_group="A",
+                issue_type="l",
+                name="Test issue %d" % issue_num,
+            )
+            for issue_num in [1, 2]
+        ]
+        self.persons = [
+            Person.objects.create(
+                name="Person %d" % person_xml_id,
+                ssn="",
+                birthdate=date(1980, 1, person_xml_id),
+                person_xml_id=person_xml_id,
+            )
+            for person_xml_id in [1, 2, 3]
+        ]
+
+        # Speeches of different persons, on different days and issues, of
+        # different types and by the presiding speaker.
+        timing = self.parliament.timing_start
+        for i in range(30):
+            timing += timedelta(hours=7)
+            Speech.objects.create(
+                person=self.persons[i % 3],
+                session=self.session,
+                issue=self.issues[i % 2] if i % 5 else None,
+                date=timing,
+                timing_start=timing,
+                timing_end=timing + timedelta(seconds=60 + i),
+                seconds=60 + i,
+                speech_type="ræða" if i % 4 else "andsvar",
+                president=i % 7 == 0,
+                iteration=str(1 + i % 3),
+            )
+
+    def speech_totals(self):
+        """
+        Returns the total duration and number of speeches per person and
+        day, aggregated directly from the speeches.
+        """
+        return {
+            (total["person_id"], total["day"]): (total["seconds"], total["count"])
+            for total in Speech.objects.annotate(day=TruncDate("timing_start"))
+            .values("person_id", "day")
+            .annotate(seconds=Sum("seconds"), count=Count("id"))
+            .order_by()
+        }
+
+    def rollup_totals(self):
+        return {
+            (total["person_id"], total["day"]): (total["seconds"], total["count"])
+            for total in SpeechRollup.objects.filter(parliament=self.parliament)
+            .values("person_id", "day")
+            .annotate(seconds=Sum("seconds"), count=Sum("count"))
+            .order_by()
+        }
+
+    def test_rebuild(self):
+        SpeechRollup.rebuild(self.parliament)
+
+        self.assertEqual(self.rollup_totals(), self.speech_totals())
+
+        # Rebuilding the days of changed speeches.
+        speech = Speech.objects.order_by("timing_start").last()
+        speech.seconds = 1000
+        speech.save()
+        Speech.objects.order_by("timing_start").first().delete()
+        SpeechRollup.rebuild(
+            self.parliament,
+            [
+                timezone.localdate(speech.timing_start),
+                timezone.localdate(self.parliament.timing_start + timedelta(hours=7)),
+            ],
+        )
+
+        self.assertEqual(self.rollup_totals(), self.speech_totals())
+
+    def test_rebuild_failure(self):
+        SpeechRollup.rebuild(self.parliament)
+        totals = self.rollup_totals()
+
+        Speech.objects.update(seconds=1)
+        with patch.object(
+            SpeechRollup.objects, "bulk_create", side_effect=DatabaseError
+        ):
+            with self.assertRaises(DatabaseError):
+                SpeechRollup.rebuild(self.parliament)
+
+        # The rollups are left as they were.
+        self.assertEqual(self.rollup_totals(), totals)
+
+    def test_stats_speeches(self):
+        SpeechRollup.rebuild(self.parliament)
+
+        options = dict.fromkeys(
+            [
+                "today",
+                "current_issue",
+                "issue",
+                "skip_speaker",
+                "only_main",
+                "iteration",
+            ]
+        )
+        mp_rows, party_rows = stats_speeches(157, options)
+
+        person_totals = {}
+        for (person_id, day), (seconds, count) in self.speech_totals().items():
+            total_seconds, total_count = person_totals.get(person_id, (0, 0))
+            person_totals[person_id] = (total_seconds + seconds, total_count + count)
+
+        self.assertEqual(
+            {row[1].id: (row[3], row[4]) for row in mp_rows}, person_totals
+        )
+
+
+class VoteCastingUpdateTest(TestCase):
+    """
+    Tests the updating of vote castings and their votes from XML documents
+    served by a fake remote host.
+    """
+
+    def setUp(self):
+        clear_already_haves()
+
+        self.parliament = Parliament.objects.create(
+            parliament_num=157, era="2026-2027", timing_start=timezone.now()
+        )
+        already_haves["parliaments"][157] = self.parliament
+
+        self.session = Session.objects.create(
+            parliament=self.parliament,
+            session_num=1,
+            name="1. fundur",
+            timing_start_planned=timezone.now(),
+        )
+        self.issue = Issue.objects.create(
+            parliament=self.parliament,
+            issue_num=1,
+            issue_group="A",
+            issue_type="l",
+            name="Test issue",
+        )
+        Document.objects.create(
+            issue=self.issue,
+            doc_num=1,
+            doc_type="frumvarp",
+            time_published=timezone.now(),
+            is_main=True,
+        )
+        for person_xml_id in [1, 2, 3]:
+            Person.objects.create(
+                name="Person %d" % person_xml_id,
+                ssn="010180%04d" % person_xml_id,
+                birthdate=date(1980, 1, 1),
+                person_xml_id=person_xml_id,
+            )
+
+        # XML documents of the fake remote host, by URL.
+        self.remote = {
+            xml_url("MINISTER_LIST_URL", 157): "<ráðherraembætti/>",
+            xml_url("COMMITTEE_LIST_URL", 157): "<nefndir/>",
+        }
+
+        cache_dir = TemporaryDirectory()
+        self.addCleanup(cache_dir.cleanup)
+        for name, value in [
+            ("XML_CACHE_DIR", cache_dir.name),
+            ("XML_USE_CACHE", False),
+            ("XML_REVALIDATE_CACHE", True),
+            ("XML_FETCH_WORKERS", 1),
+        ]:
+            settings_patcher = patch.object(althingi_settings, name, value)
+            settings_patcher.start()
+            self.addCleanup(settings_patcher.stop)
+
+    def tearDown(self):
+        clear_already_haves()
+
+    def fetch_response(self, url, headers=None):
+        return SimpleNamespace(status_code=200, text=self.remote[url], headers={})
+
+    def set_vote_castings(self, vote_castings):
+        """
+        Publishes the given vote castings on the fake remote host, each given
+        as a tuple of its XML ID, conclusion and the responses of persons by
+        their XML IDs.
+        """
+        listing = etree.Element("atkvæðagreiðslur")
+        for vote_casting_xml_id, conclusion, responses in vote_castings:
+            xml = etree.SubElement(
+                listing,
+                "atkvæðagreiðsla",
+                atkvæðagreiðslunúmer=str(vote_casting_xml_id),
+                málsnúmer="1",
+                málsflokkur="A",
+            )
+            etree.SubElement(xml, "tími").text = "2026-10-01T14:00:00"
+            etree.SubElement(xml, "þingskjal", skjalsnúmer="1")
+            etree.SubElement(xml, "tegund", tegund="ff").text = "frumvarpið í heild"
+            etree.SubElement(xml, "fundur").text = "1"
+            summary = etree.SubElement(xml, "samantekt")
+            etree.SubElement(summary, "aðferð").text = "atkvæðagreiðslukerfi"
+            etree.SubElement(summary, "afgreiðsla").text = conclusion
+
+            votes_xml = etree.Element("atkvæðagreiðsla")
+            vote_listing = etree.SubElement(votes_xml, "atkvæðaskrá")
+            for person_xml_id, vote_response in responses.items():
+                etree.SubElement(
+                    etree.SubElement(vote_listing, "þingmaður", id=str(person_xml_id)),
+                    "atkvæði",
+                ).text = vote_response
+
+            self.remote[xml_url("VOTE_CASTING_URL", vote_casting_xml_id)] = (
+                etree.tostring(votes_xml, encoding="unicode")
+            )
+
+        self.remote[xml_url("VOTE_CASTINGS_URL", 157)] = etree.tostring(
+            listing, encoding="unicode"
+        )
+
+    def update(self):
+        output = StringIO()
+        with patch(
+            "djalthingi.xmlutils.fetch_response", self.fetch_response
+        ), redirect_stdout(output):
+            update_vote_castings(157)
+
+        clear_already_haves()
+        already_haves["parliaments"][157] = self.parliament
+        return output.getvalue()
+
+    def votes(self):
+        return {
+            (vote.vote_casting.vote_casting_xml_id, vote.person.person_xml_id): (
+                vote.vote_response
+            )
+            for vote in Vote.objects.select_related("vote_casting", "person")
+        }
+
+    def test_update_vote_castings(self):
+        self.set_vote_castings(
+            [
+                (101, "samþykkt", {1: "já", 2: "nei"}),
+                (102, "samþykkt", {1: "já", 3: "greiðir ekki atkvæði"}),
+            ]
+        )
+
+        output = self.update()
+
+        self.assertIn("Added 2 vote castings", output)
+        self.assertIn("Added 4 votes", output)
+        self.assertNotIn("Added vote:", output)
+        self.assertEqual(
+            self.votes(),
+            {
+                (101, 1): "já",
+                (101, 2): "nei",
+                (102, 1): "já",
+                (102, 3): "greiðir ekki atkvæði",
+            },
+        )
+
+        # A vote added, changed and removed, and a vote casting removed.
+        self.set_vote_castings([(101, "fellt", {2: "já", 3: "nei"})])
+
+        output = self.update()
+
+        self.assertIn("Updated 1 vote castings", output)
+        self.assertIn("Added 1 votes", output)
+        self.assertIn("Updated 1 votes", output)
+        self.assertIn("Deleted 1 non-existent votes", output)
+        self.assertIn("Deleted non-existent vote casting", output)
+        self.assertEqual(self.votes(), {(101, 2): "já", (101, 3): "nei"})
+        self.assertEqual(
+            list(VoteCasting.objects.values_list("vote_casting_xml_id", "conclusion")),
+            [(101, "fellt")],
+        )
+
+        # Nothing is written when nothing has changed.
+        output = self.update()
+
+        self.assertIn("Already have 1 vote castings", output)
+        self.assertIn("Skipped votes of 1 unchanged vote castings", output)
+        self.assertNotIn("Added", output)
+        self.assertNotIn("Updated", output)
+        self.assertNotIn("Deleted", output)
+
+    def test_update_vote_castings_failure(self):
+        self.set_vote_castings([(101, "samþykkt", {1: "já", 2: "nei"})])
+        self.update()
+
+        # The votes change, but the run fails before writing them, when a
+        # person who isn't in the database can't be retrieved.
+        self.set_vote_castings([(101, "samþykkt", {1: "nei", 2: "nei", 4: "já"})])
+        with patch(
+            "djalthingi.updaters.update_person",
+            side_effect=RemoteContentException("Failed", "http://example.com/"),
+        ):
+            with self.assertRaises(RemoteContentException):
+                self.update()
+
+        self.assertEqual(self.votes(), {(101, 1): "já", (101, 2): "nei"})
+
+        # The votes are still processed when the run is repeated.
+        Person.objects.create(
+            name="Person 4",
+            ssn="0101800004",
+            birthdate=date(1980, 1, 1),
+            person_xml_id=4,
+        )
+        output = self.update()
+
+        self.assertIn("Updated 1 votes", output)
+        self.assertEqual(
+            self.votes(), {(101, 1): "nei", (101, 2): "nei", (101, 4): "já"}
+        )
+
+
+class FakePdfResponse:
+    status_code = 200
+
+    def __init__(self, content):
+        self.content = content
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+    def iter_content(self, chunk_size):
+        # Small chunks, to make sure that the file is written chunk by chunk.
+        for i in range(0, len(self.content), 10):
+            yield self.content[i : i + 10]
+
+
+class PdfCacheTest(TestCase):
+    """
+    Tests the cache of remote PDF files with a fake remote host.
+    """
+
+    def setUp(self):
+        cache_dir = TemporaryDirectory()
+        self.addCleanup(cache_dir.cleanup)
+
+        # Files of the fake remote host, by URL, and the requests made to it.
+        self.remote = {}
+        self.requests = []
+
+        for target, name, value in [
+            (althingi_settings, "PDF_CACHE_DIR", cache_dir.name),
+            (althingi_settings, "PDF_CACHE_MAX_SIZE", 250),
+            (althingi_settings, "XML_FETCH_RATE_LIMIT", 0),
+            (pdfcache, "cache_size", None),
+            (pdfcache, "get_scraper", lambda: self),
+        ]:
+            patcher = patch.object(target, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def get(self, url, stream=False, timeout=None):
+        self.requests.append((url, stream, timeout))
+
+        content = self.remote[url]
+        if isinstance(content, Exception):
+            raise content
+
+        return FakePdfResponse(content)
+
+    def cached_files(self):
+        return sorted(
+            name
+            for dirpath, dirnames, filenames in os.walk(althingi_settings.PDF_CACHE_DIR)
+            for name in filenames
+        )
+
+    def test_get_pdf_path(self):
+        self.remote["http://example.com/a.pdf"] = b"%PDF" + b"a" * 96
+
+        path = pdfcache.get_pdf_path("http://example.com/a.pdf")
+        self.assertEqual(pdfcache.get_pdf_path("http://example.com/a.pdf"), path)
+
+        with open(path, "rb") as f:
+            self.assertEqual(f.read(), self.remote["http://example.com/a.pdf"])
+
+        # The file is retrieved once, streamed, with the short timeout.
+        self.assertEqual(
+            self.requests,
+            [
+                (
+                    "http://example.com/a.pdf",
+                    True,
+                    althingi_settings.PDF_REQUEST_TIMEOUT,
+                )
+            ],
+        )
+        self.assertEqual(pdfcache.cache_size, 100)
+
+    def test_get_pdf_path_failure(self):
+        self.remote["http://example.com/a.pdf"] = requests.ConnectionError()
+
+        # A single attempt is made, leaving nothing behind.
+        with self.assertRaises(RemoteContentException):
+            pdfcache.get_pdf_path("http://example.com/a.pdf")
+        self.assertEqual(len(self.requests), 1)
+        self.assertEqual(self.cached_files(), [])
+
+    def test_evict(self):
+        paths = {}
+        for name in "abc":
+            self.remote["http://example.com/%s.pdf" % name] = b"x" * 100
+
+        with patch.object(pdfcache, "EVICTION_GRACE_PERIOD", -60), patch.object(
+            pdfcache, "list_files", wraps=pdfcache.list_files
+        ) as list_files:
+            for name in "ab":
+                paths[name] = pdfcache.get_pdf_path("http://example.com/%s.pdf" % name)
+
+            # The cache is only counted once until it's estimated to be full.
+            self.assertEqual(list_files.call_count, 1)
+
+            # The least recently used file is evicted when the cache is full,
+            # until it's within the eviction target.
+            os.utime(paths["a"], (1000, 1000))
+            os.utime(paths["b"], (2000, 2000))
+            paths["c"] = pdfcache.get_pdf_path("http://example.com/c.pdf")
+
+            self.assertEqual(list_files.call_count, 2)
+
+        self.assertFalse(os.path.exists(paths["a"]))
+        self.assertTrue(os.path.exists(paths["b"]))
+        self.assertTrue(os.path.exists(paths["c"]))
+        self.assertEqual(pdfcache.cache_size, 200)
+
+
+class DocumentViewTest(TestCase):
+    """
+    Tests serving the HTML content of documents from content blobs.
+    """
+
+    def setUp(self):
+        now = timezone.now()
+
+        parliament = Parliament.objects.create(
+            parliament_num=157, era="2026-2027", timing_start=now
+        )
+        issue = Issue.objects.create(
+            parliament=parliament,
+            issue_num=1,
+            issue_group="A",
+            issue_type="l",
+            name="Test issue",
+        )
+
+        self.text = "<p>1. gr. Lög þessi gilda um %s.</p>" % ("orð " * 100)
+
+        self.document = Document(
+            issue=issue,
+            doc_num=1,
+            doc_type="frumvarp",
+            time_published=now - timedelta(days=30),
+            is_main=True,
+        )
+        self.document.html_content = self.text
+        self.document.save()
+
+        # A document imported before encoded variants were stored.
+        self.old_text = "<p>Eldra þingskjal.</p>"
+        self.old_document = Document.objects.create(
+            issue=issue,
+            doc_num=2,
+            doc_type="nefndarálit",
+            time_published=now - timedelta(days=60),
+            html_content_blob=ContentBlob.store(self.old_text),
+        )
+
+    def get(self, document, **headers):
+        url = reverse("parliament_document", args=[157, document.doc_num])
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, headers=headers)
+
+        # Nothing is ever written while serving a document.
+        for query in queries:
+            self.assertTrue(query["sql"].startswith("SELECT"), query["sql"])
+        self.queries = queries
+
+        return response
+
+    def test_encodings(self):
+        response = self.get(self.document)
+        self.assertNotIn("Content-Encoding", response)
+        self.assertEqual(response.content.decode("utf-8"), self.text)
+        self.assertIn("Accept-Encoding", response["Vary"])
+
+        response = self.get(self.document, accept_encoding="gzip, deflate")
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertEqual(gzip.decompress(response.content).decode("utf-8"), self.text)
+
+        # Only the variant that is served is loaded, in a single query.
+        [query] = self.queries
+        self.assertIn('"djalthingi_contentblob"."gzip_data"', query["sql"])
+        self.assertNotIn('"djalthingi_contentblob"."data"', query["sql"])
+        self.assertNotIn('"djalthingi_contentblob"."brotli_data"', query["sql"])
+
+        response = self.get(self.document, accept_encoding="gzip;q=0, deflate")
+        self.assertNotIn("Content-Encoding", response)
+
+    def test_missing_variant(self):
+        response = self.get(self.old_document, accept_encoding="gzip")
+
+        self.assertNotIn("Content-Encoding", response)
+        self.assertEqual(response.content.decode("utf-8"), self.old_text)
+        self.assertIsNone(
+            ContentBlob.objects.get(
+                digest=self.old_document.html_content_blob_id
+            ).gzip_data
+        )
+
+    def test_conditional(self):
+        response = self.get(self.document)
+
+        response = self.get(self.document, if_none_match=response["ETag"])
+        self.assertEqual(response.status_code, 304)
+
+        response = self.get(self.document, if_modified_since=response["Last-Modified"])
+        self.assertEqual(response.status_code, 304)
+
+    def test_encode_content_blobs(self):
+        output = StringIO()
+        with redirect_stdout(output):
+            call_command("encode_content_blobs")
+
+        self.assertIn("Encoded 1 blobs.", output.getvalue())
+
+        blob = ContentBlob.objects.get(digest=self.old_document.html_content_blob_id)
+        self.assertEqual(gzip.decompress(blob.gzip_data).decode("utf-8"), self.old_text)
+
+        response = self.get(self.old_document, accept_encoding="gzip")
+        self.assertEqual(response["Content-Encoding"], "gzip")
+
+        # Nothing is left to encode.
+        output = StringIO()
+        with redirect_stdout(output):
+            call_command("encode_content_blobs")
+
+        self.assertIn("Encoded 0 blobs.", output.getvalue())
+
+    def test_backfill_time_created(self):
+        backfill_time_created = import_module(
+            "djalthingi.migrations.0018_backfill_contentblob_time_created"
+        ).backfill_time_created
+
+        backfill_time_created(apps, None)
+
+        # Blobs date from the publication of their documents, rather than
+        # from when they were moved into blobs.
+        for document in [self.document, self.old_document]:
+            self.assertEqual(
+                ContentBlob.objects.get(
+                    digest=document.html_content_blob_id
+                ).time_created,
+                document.time_published,
+            )
+
+
+class ICalFeedTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+        parliament = Parliament.objects.create(
+            parliament_num=157, era="2026-2027", timing_start=timezone.now()
+        )
+
+        self.committees = []
+        for committee_xml_id, name, abbreviation in [
+            (201, "allsherjar- og menntamálanefnd", "am"),
+            (202, "efnahags- og viðskiptanefnd", "ev"),
+        ]:
+            committee = Committee.objects.create(
+                name=name,
+                abbreviation_short=abbreviation,
+                abbreviation_long=abbreviation,
+                parliament_num_first=157,
+                committee_xml_id=committee_xml_id,
+            )
+            committee.parliaments.add(parliament)
+            self.committees.append(committee)
+
+        self.agendas = [
+            CommitteeAgenda.objects.create(
+                parliament=parliament,
+                committee=committee,
+                timing_start_planned=timezone.now() + timedelta(days=1),
+                timing_end=timezone.now() + timedelta(days=1, hours=1),
+                committee_agenda_xml_id=committee_agenda_xml_id,
+            )
+            for committee_agenda_xml_id, committee in enumerate(self.committees, 1)
+        ]
+
+    def get(self, committee=None, **headers):
+        url = reverse("ical")
+        if committee is not None:
+            url += "?committee=%s" % committee
+        return self.client.get(url, headers=headers)
+
+    def test_conditional(self):
+        response = self.get("am")
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("Allsherjar- og menntamálanefnd", response.content.decode())
+        self.assertNotIn("Efnahags- og viðskiptanefnd", response.content.decode())
+
+        response = self.get("am", if_none_match=response["ETag"])
+        self.assertEqual(response.status_code, 304)
+
+    def test_cached(self):
+        etag = self.get()["ETag"]
+
+        # Only the committees are looked up when the feed is cached.
+        with self.assertNumQueries(1):
+            self.assertEqual(self.get()["ETag"], etag)
+
+        # Feeds are cached for each set of committees.
+        self.assertNotEqual(self.get("am")["ETag"], etag)
+
+    def test_invalidate_committee(self):
+        etag = self.get()["ETag"]
+        other_etag = self.get("ev")["ETag"]
+
+        CommitteeAgenda.objects.filter(id=self.agendas[0].id).update(
+            timing_text="Frestað"
+        )
+        self.assertEqual(self.get()["ETag"], etag)
+
+        # Only the feeds including the committee are invalidated.
+        invalidate_committee(self.committees[0].id)
+        response = self.get()
+        self.assertNotEqual(response["ETag"], etag)
+        self.assertIn("(Frestað)", response.content.decode())
+        self.assertEqual(self.get("ev")["ETag"], other_etag)
+
+    @hidden_prints
+    def test_update_committee_agenda(self):
+        etag = self.get()["ETag"]
+
+        # The agenda has been cancelled, and thereby deleted in the XML.
+        clear_already_haves()
+        already_haves["parliaments"][157] = Parliament.objects.get()
+        with patch(
+            "djalthingi.updaters.get_xml",
+            lambda *args: etree.Element("nefndarfundur"),
+        ):
+            update_committee_agenda(1, 157)
+        clear_already_haves()
+
+        response = self.get()
+        self.assertNotEqual(response["ETag"], etag)
+        self.assertNotIn("committee-agenda-1@", response.content.decode())
+        self.assertIn("committee-agenda-2@", response.content.decode())
+
+
+class ExportTest(TestCase):
+    def setUp(self):
+        now = timezone.now()
+
+        # A closed parliament which has been fully updated since, and the
+        # current one.
+        self.closed_parliament = Parliament.objects.create(
+            parliament_num=156,
+            era="2025-2026",
+            timing_start=now - timedelta(days=400),
+            timing_end=now - timedelta(days=30),
+            last_full_update=now - timedelta(days=20),
+        )
+        self.parliament = Parliament.objects.create(
+            parliament_num=157, era="2026-2027", timing_start=now - timedelta(days=29)
+        )
+
+        for parliament in [self.closed_parliament, self.parliament]:
+            issue = Issue.objects.create(
+                parliament=parliament,
+                issue_num=1,
+                issue_group="A",
+                issue_type="l",
+                name="Test issue",
+            )
+            Document.objects.create(
+                issue=issue,
+                doc_num=1,
+                doc_type="frumvarp",
+                time_published=parliament.timing_start + timedelta(days=1),
+                is_main=True,
+                pdf_remote_path="https://www.althingi.is/%d/1.pdf"
+                % parliament.parliament_num,
+            )
+
+        cache_dir = TemporaryDirectory()
+        self.addCleanup(cache_dir.cleanup)
+        self.cache_dir = cache_dir.name
+        patcher = patch.object(althingi_settings, "EXPORT_CACHE_DIR", self.cache_dir)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def export(self):
+        response = self.client.get(
+            reverse("csv_parliaments_export", args=[156, 157, "documents"])
+        )
+        self.assertEqual(
+            response["Content-Disposition"],
+            'attachment; filename="documents-156-157.csv"',
+        )
+        return b"".join(response.streaming_content).decode("utf-8").splitlines()
+
+    def test_export(self):
+        header, *rows = self.export()
+
+        self.assertEqual(len(header.split(",")), 9)
+        self.assertEqual(
+            [row.split(",")[:3] + row.split(",")[-1:] for row in rows],
+            [
+                ["156", "1", "1", "https://www.althingi.is/156/1.pdf"],
+                ["157", "1", "1", "https://www.althingi.is/157/1.pdf"],
+            ],
+        )
+
+        response = self.client.get(
+            reverse("csv_parliament_export", args=[156, "nothing"])
+        )
+        self.assertEqual(response.status_code, 404)
+
+    def test_cached(self):
+        lines = self.export()
+
+        # Only the closed parliament is cached.
+        [filename] = os.listdir(self.cache_dir)
+        self.assertTrue(filename.startswith("documents-156-"))
+
+        Document.objects.update(pdf_remote_path=None)
+        self.assertEqual(self.export()[:2], lines[:2])
+        self.assertNotEqual(self.export()[2], lines[2])
+
+        # A new full update makes the changes visible and replaces the file.
+        self.closed_parliament.last_full_update = timezone.now()
+        self.closed_parliament.save()
+
+        self.assertNotEqual(self.export()[1], lines[1])
+        self.assertNotIn(filename, os.listdir(self.cache_dir))
+        self.assertEqual(len(os.listdir(self.cache_dir)), 1)
+
+    def test_interrupted(self):
+        response = self.client.get(
+            reverse("csv_parliament_export", args=[156, "documents"])
+        )
+
+        # The export isn't cached unless it's sent in full.
+        next(response.streaming_content)
+        next(response.streaming_content)
+        response.close()
+
+        self.assertEqual(os.listdir(self.cache_dir), [])
+
+
+class ContentBlobTest(TestCase):
+    def setUp(self):
+        parliament = Parliament.objects.create(
+            parliament_num=157, era="2026-2027", timing_start=timezone.now()
+        )
+        self.issue = Issue.objects.create(
+            parliament=parliament,
+            issue_num=1,
+            issue_group="A",
+            issue_type="l",
+            name="Test issue",
+        )
+
+    def create_document(self, doc_num, **contents):
+        document = Document(
+            issue=self.issue,
+            doc_num=doc_num,
+            doc_type="frumvarp",
+            time_published=timezone.now(),
+        )
+        for field, text in contents.items():
+            setattr(document, field, text)
+        document.save()
+        return document
+
+    def test_blob_content(self):
+        document = self.create_document(
+            1, html_content_raw="<p>Lög</p>", html_content="<p>Lög</p>"
+        )
+
+        # Identical texts are stored once, and empty ones not at all.
+        self.assertEqual(ContentBlob.objects.count(), 1)
+        self.assertEqual(
+            document.html_content_blob_id, document.html_content_raw_blob_id
+        )
+        self.assertIsNone(document.xhtml_blob)
+
+        # Only the blob of content that is served as it is gets encoded.
+        blob = ContentBlob.objects.get()
+        self.assertEqual(blob.text, "<p>Lög</p>")
+        self.assertIsNotNone(blob.gzip_data)
+
+        # Contents are loaded when first accessed.
+        with self.assertNumQueries(1):
+            document = Document.objects.get(id=document.id)
+        with self.assertNumQueries(1):
+            self.assertEqual(document.html_content, "<p>Lög</p>")
+            self.assertEqual(document.html_content, "<p>Lög</p>")
+        self.assertEqual(document.xhtml, "")
+
+    def test_store_blob_contents(self):
+        document = self.create_document(1, html_content="<p>Lög</p>")
+
+        # Blobs are only stored when contents are changed.
+        document = Document.objects.get(id=document.id)
+        self.assertEqual(document.html_content, "<p>Lög</p>")
+        self.assertEqual(store_blob_contents(document), set())
+
+        document.html_content = "<p>Breytt lög</p>"
+        document.xhtml = ""
+        document.save(update_fields=["doc_type"])
+
+        # Changed contents are saved along with the given fields.
+        document = Document.objects.get(id=document.id)
+        self.assertEqual(document.html_content, "<p>Breytt lög</p>")
+        self.assertIsNone(document.xhtml_blob_id)
+        self.assertEqual(ContentBlob.objects.count(), 2)
+
+
+class DocumentContentBlobsMigrationTest(TransactionTestCase):
+    """
+    Tests moving the contents of documents into content blobs and back.
+    """
+
+    migrate_from = [("djalthingi", "0011_issue_xml_digest")]
+    migrate_to = [("djalthingi", "0012_document_content_blobs")]
+
+    def setUp(self):
+        self.executor = MigrationExecutor(connection)
+        self.addCleanup(self.migrate_latest)
+
+        self.migrate(self.migrate_from)
+
+    def migrate(self, targets):
+        self.executor.loader.build_graph()
+        self.executor.migrate(targets)
+        return self.executor.loader.project_state(targets).apps
+
+    def migrate_latest(self):
+        self.executor.loader.build_graph()
+        self.migrate(self.executor.loader.graph.leaf_nodes())
+
+    def test_round_trip(self):
+        old_apps = self.executor.loader.project_state(self.migrate_from).apps
+        Parliament = old_apps.get_model("djalthingi", "Parliament")
+        Issue = old_apps.get_model("djalthingi", "Issue")
+        Document = old_apps.get_model("djalthingi", "Document")
+
+        issue = Issue.objects.create(
+            parliament=Parliament.objects.create(
+                parliament_num=157, era="2026-2027", timing_start=timezone.now()
+            ),
+            issue_num=1,
+            issue_group="A",
+            issue_type="l",
+            name="Test issue",
+        )
+        contents = {}
+        for doc_num, text in [(1, "<p>Lög</p>"), (2, "<p>Lög</p>"), (3, "")]:
+            Document.objects.create(
+                issue=issue,
+                doc_num=doc_num,
+                doc_type="frumvarp",
+                time_published=timezone.now(),
+                html_content_raw=text,
+                html_content=text,
+                xhtml="<p>XHTML %d</p>" % doc_num,
+            )
+            contents[doc_num] = (text, text, "<p>XHTML %d</p>" % doc_num)
+
+        new_apps = self.migrate(self.migrate_to)
+        ContentBlob = new_apps.get_model("djalthingi", "ContentBlob")
+        Document = new_apps.get_model("djalthingi", "Document")
+
+        self.assertEqual(ContentBlob.objects.count(), 4)
+        for document in Document.objects.all():
+            text, raw_text, xhtml = contents[document.doc_num]
+            for field, content in [
+                ("html_content_blob", text),
+                ("html_content_raw_blob", raw_text),
+                ("xhtml_blob", xhtml),
+            ]:
+                blob = getattr(document, field)
+                if content:
+                    self.assertEqual(zlib.decompress(blob.data).decode(), content)
+                else:
+                    self.assertIsNone(blob)
+
+        old_apps = self.migrate(self.migrate_from)
+        Document = old_apps.get_model("djalthingi", "Document")
+
+        self.assertEqual(
+            {
+                document.doc_num: (
+                    document.html_content_raw,
+                    document.html_content,
+                    document.xhtml,
+                )
+                for document in Document.objects.all()
+            },
+            contents,
+        )
+
+
+class ImportJournalTest(TestCase):
+    def update_althingi(self, *args, **updaters):
+        """
+        Runs the `update_althingi` command with the given updaters instead of
+        the real ones, returning its exit status.
+        """
+        updaters.setdefault("update_parliament", Mock())
+
+        patchers = [
+            patch("djalthingi.management.commands.update_althingi.%s" % name, updater)
+            for name, updater in updaters.items()
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        with redirect_stdout(StringIO()):
+            try:
+                call_command("update_althingi", *args)
+            except SystemExit as ex:
+                return ex.code
+        return 0
+
+    def test_resume(self):
+        calls = []
+
+        def updater(name, fail=False):
+            def update(parliament_num):
+                calls.append((name, parliament_num))
+                if fail:
+                    raise AlthingiException("Failed %s" % name)
+
+            return update
+
+        status = self.update_althingi(
+            "parties",
+            "constituencies",
+            "parliament=156-157",
+            update_parties=updater("parties"),
+            update_constituencies=updater("constituencies", fail=True),
+        )
+
+        self.assertEqual(status, 2)
+        self.assertEqual(calls, [("parties", 156), ("constituencies", 156)])
+
+        # The failure is recorded along with the steps that were done.
+        journal = ImportJournal.objects.get()
+        self.assertEqual(journal.parliament_nums, [156, 157])
+        self.assertEqual(journal.error, "Failed constituencies")
+        self.assertIsNotNone(journal.timing_failed)
+        self.assertTrue(journal.is_done(156, "parties"))
+        self.assertFalse(journal.is_done(156, "constituencies"))
+
+        # Resuming skips the steps that were done.
+        calls.clear()
+        status = self.update_althingi(
+            "resume",
+            update_parties=updater("parties"),
+            update_constituencies=updater("constituencies"),
+        )
+
+        self.assertEqual(status, 0)
+        self.assertEqual(
+            calls,
+            [
+                ("constituencies", 156),
+                ("parties", 157),
+                ("constituencies", 157),
+            ],
+        )
+        self.assertFalse(ImportJournal.objects.exists())
+
+    def test_not_resumable(self):
+        self.assertEqual(self.update_althingi("resume"), 2)
+
+        # Runs of a single feed that isn't journaled per entity are simply
+        # run again.
+        status = self.update_althingi(
+            "parties",
+            "parliament=157",
+            update_parties=Mock(side_effect=AlthingiException("Failed")),
+        )
+
+        self.assertEqual(status, 2)
+        self.assertFalse(ImportJournal.objects.exists())
+
+    def test_skip_journaled(self):
+        journal = ImportJournal.objects.create(
+            args={"issues": None}, parliament_nums=[157]
+        )
+        issue_nums = [1, 2, 3, 4, 5]
+
+        with redirect_stdout(StringIO()):
+            self.assertEqual(
+                skip_journaled(issue_nums, journal, 157, "issues"), issue_nums
+            )
+
+            journal.set_position(157, "issues", 3)
+            self.assertEqual(skip_journaled(issue_nums, journal, 157, "issues"), [4, 5])
+
+            # Positions are kept per parliament and feed.
+            self.assertEqual(
+                skip_journaled(issue_nums, journal, 156, "issues"), issue_nums
+            )
+            self.assertEqual(
+                skip_journaled(issue_nums, journal, 157, "sessions"), issue_nums
+            )
+
+            # An entity that is no longer listed doesn't skip anything.
+            self.assertEqual(
+                skip_journaled([1, 2, 4, 5], journal, 157, "issues"), [1, 2, 4, 5]
+            )
+            self.assertEqual(
+                skip_journaled(issue_nums, None, 157, "issues"), issue_nums
+            )
+
+
+class ImporterTest(TestCase):
+    def setUp(self):
+        self.parliament = Parliament.objects.create(
+            parliament_num=157, era="2026-2027", timing_start=timezone.now()
+        )
+
+        for name, value in [
+            ("IMPORTER_SITTING_HOURS", (0, 24)),
+            ("IMPORTER_JITTER", 0),
+            ("IMPORTER_RETRY_DELAY", 60),
+            ("IMPORTER_MAX_RETRY_DELAY", 300),
+        ]:
+            patcher = patch.object(althingi_settings, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def create_session(self):
+        now = timezone.now()
+        Session.objects.create(
+            parliament=self.parliament,
+            session_num=1,
+            name="1. fundur",
+            timing_start_planned=now,
+            effective_date=timezone.localdate(now),
+        )
+
+    def test_get_delay(self):
+        feed = Feed("speeches days=1", 600, 3600, 0)
+        self.assertEqual(feed.args, {"speeches": None, "days": "1"})
+
+        self.assertEqual(feed.get_delay(True, True), 600)
+        self.assertEqual(feed.get_delay(False, True), 3600)
+
+        # Failures are retried with a backoff, until the feed succeeds again.
+        self.assertEqual(
+            [feed.get_delay(True, False) for i in range(5)], [60, 120, 240, 300, 300]
+        )
+        self.assertEqual(feed.get_delay(False, False), 300)
+        self.assertEqual(feed.get_delay(True, True), 600)
+        self.assertEqual(feed.get_delay(True, False), 60)
+
+        # Feeds without an idle interval wait for parliament to sit.
+        feed = Feed("upcoming", 300, None, 0)
+        self.assertIsNone(feed.get_delay(False, True))
+
+    def test_jitter(self):
+        feed = Feed("upcoming", 300, None, 0)
+
+        with patch.object(althingi_settings, "IMPORTER_JITTER", 0.1):
+            delays = [feed.get_delay(True, True) for i in range(100)]
+
+        self.assertTrue(all(270 <= delay <= 330 for delay in delays))
+        self.assertGreater(len(set(delays)), 1)
+
+    def test_is_sitting(self):
+        command = RunImporterCommand()
+        self.assertFalse(command.is_sitting())
+
+        self.create_session()
+        self.assertTrue(command.is_sitting())
+
+        # Only within the sitting hours.
+        with patch.object(althingi_settings, "IMPORTER_SITTING_HOURS", (0, 0)):
+            self.assertFalse(command.is_sitting())
+
+    def run_importer(self, feeds, update_count):
+        """
+        Runs the importer with the given feeds until it has updated them the
+        given number of times, returning the feeds in the order updated.
+        """
+        command = RunImporterCommand()
+        updated = []
+
+        def update_feed(feed):
+            updated.append(feed.arguments)
+            if len(updated) == update_count:
+                command.stopping.set()
+            return True
+
+        with patch.object(althingi_settings, "IMPORTER_FEEDS", feeds), patch.object(
+            command, "update_feed", update_feed
+        ), patch("signal.signal"), redirect_stdout(StringIO()):
+            command.handle()
+
+        return updated
+
+    def test_schedule(self):
+        feeds = [("upcoming", 300, None), ("issues", 0, 0), ("persons", 600, 600)]
+
+        # Feeds due at the same time are updated in the order listed, and
+        # those without an idle interval only while parliament is sitting.
+        self.assertEqual(self.run_importer(feeds, 3), ["issues", "persons", "issues"])
+
+        self.create_session()
+        self.assertEqual(
+            self.run_importer(feeds, 4), ["upcoming", "issues", "persons", "issues"]
+        )
+
+
+class XmlUtilsTest(TestCase):
+    """
+    Tests retrieving and caching XML documents from a fake remote host.
+    """
+
+    def setUp(self):
+        cache_dir = TemporaryDirectory()
+        self.addCleanup(cache_dir.cleanup)
+        self.cache_dir = cache_dir.name
+
+        # Documents of the fake remote host, by URL, and the requests made to
+        # it. A list of documents is served one by one, and an exception is
+        # raised instead of being served.
+        self.remote = {}
+        self.requests = []
+
+        for target, name, value in [
+            (althingi_settings, "XML_CACHE_DIR", self.cache_dir),
+            (althingi_settings, "XML_USE_CACHE", False),
+            (althingi_settings, "XML_REVALIDATE_CACHE", True),
+            (althingi_settings, "XML_FETCH_WORKERS", 4),
+            (althingi_settings, "XML_SAVE_INVALID", False),
+            (xmlutils, "fetch_response", self.fetch_response),
+            (xmlutils, "fetch_executor", None),
+            (xmlutils, "prefetched_xml", {}),
+            (xmlutils, "sleep", lambda seconds: None),
+        ]:
+            patcher = patch.object(target, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        self.addCleanup(self.shutdown_executor)
+
+    def shutdown_executor(self):
+        if xmlutils.fetch_executor is not None:
+            xmlutils.fetch_executor.shutdown()
+
+    def fetch_response(self, url, headers=None):
+        self.requests.append(url)
+
+        content = self.remote[url]
+        if isinstance(content, list):
+            content = content.pop(0) if len(content) > 1 else content[0]
+        if isinstance(content, Exception):
+            raise content
+
+        return SimpleNamespace(status_code=200, text=content, headers={})
+
+    def cache_files(self):
+        return sorted(os.listdir(self.cache_dir))
+
+    def test_prefetch_xml(self):
+        for person_xml_id in [1, 2, 3]:
+            self.remote[xml_url("PERSON_URL", person_xml_id)] = (
+                "<þingmaður id='%d'/>" % person_xml_id
+            )
+
+        with redirect_stdout(StringIO()):
+            xmlutils.prefetch_xml("PERSON_URL", [1, 2, 3, 3])
+
+        self.assertEqual(len(self.requests), 3)
+
+        # Prefetched documents are read from the cache, only once.
+        for person_xml_id in [3, 1, 2]:
+            xml = xmlutils.get_xml("PERSON_URL", person_xml_id)
+            self.assertEqual(xml.attrib["id"], str(person_xml_id))
+        self.assertEqual(len(self.requests), 3)
+
+        xmlutils.get_xml("PERSON_URL", 1)
+        self.assertEqual(len(self.requests), 4)
+
+    def test_prefetch_xml_failure(self):
+        self.remote[xml_url("PERSON_URL", 1)] = "<þingmaður id='1'/>"
+        self.remote[xml_url("PERSON_URL", 2)] = [
+            RemoteContentException("Failed", xml_url("PERSON_URL", 2)),
+            "<þingmaður id='2'/>",
+        ]
+
+        errors = StringIO()
+        with redirect_stdout(StringIO()), patch.object(xmlutils, "stderr", errors):
+            xmlutils.prefetch_xml("PERSON_URL", [1, 2])
+
+        self.assertIn("Prefetching failed", errors.getvalue())
+
+        # Documents that failed are retrieved when they're needed.
+        self.assertEqual(xmlutils.get_xml("PERSON_URL", 2).attrib["id"], "2")
+        self.assertEqual(len(self.requests), 3)
+
+    def test_get_xml_invalid(self):
+        url = xml_url("PERSON_URL", 1)
+        self.remote[url] = ["<html>Villa", "<þingmaður id='1'/>"]
+
+        # Invalid documents are retrieved again.
+        self.assertEqual(xmlutils.get_xml("PERSON_URL", 1).attrib["id"], "1")
+        self.assertEqual(self.requests, [url, url])
+
+        self.remote[url] = "<html>Villa"
+        with self.assertRaises(etree.XMLSyntaxError):
+            xmlutils.get_xml("PERSON_URL", 1)
+
+        # Nothing invalid is left in the cache to be used or revalidated.
+        self.assertEqual(self.cache_files(), [])
+
+    def test_iter_xml(self):
+        self.remote[xml_url("SPEECHES_URL", 157)] = (
+            "<ræðulisti>%s</ræðulisti>"
+            % "".join("<ræða id='%d'><texti/></ræða>" % i for i in range(5))
+        )
+
+        ids = []
+        for speech_xml in xmlutils.iter_xml("SPEECHES_URL", "ræða", 157):
+            ids.append(speech_xml.attrib["id"])
+
+            # Elements that have been processed are removed.
+            self.assertLessEqual(len(list(speech_xml.itersiblings(preceding=True))), 1)
+
+        self.assertEqual(ids, ["0", "1", "2", "3", "4"])
+
+    def test_get_xml_file_invalid(self):
+        url = xml_url("SPEECHES_URL", 157)
+        self.remote[url] = ["<ræðulisti><ræða>", "<ræðulisti/>"]
+
+        # Files are checked before they're streamed, and retrieved again if
+        # they're invalid.
+        filename = xmlutils.get_xml_file("SPEECHES_URL", 157)
+        self.assertEqual(list(xmlutils.iter_xml_file(filename, "ræða")), [])
+        self.assertEqual(self.requests, [url, url])
+
+        self.remote[url] = "<ræðulisti><ræða>"
+        with self.assertRaises(etree.XMLSyntaxError):
+            xmlutils.get_xml_file("SPEECHES_URL", 157)
+
+        self.assertEqual(self.cache_files(), [])
+
+    def test_write_cache_file(self):
+        filename = os.path.join(self.cache_dir, "PERSON_URL.1.xml")
+        xmlutils.write_cache_file(filename, "<þingmaður/>")
+
+        # A failed write leaves the previous file in place, and no temporary
+        # files behind.
+        with self.assertRaises(TypeError):
+            xmlutils.write_cache_file(filename, None)
+
+        with open(filename, encoding="utf-8") as f:
+            self.assertEqual(f.read(), "<þingmaður/>")
+        self.assertEqual(self.cache_files(), ["PERSON_URL.1.xml"])
+
+    def test_fetch_xml_content_unchanged(self):
+        url = xml_url("PERSON_URL", 1)
+        filename = xmlutils.xml_cache_filename("PERSON_URL", 1)
+        self.remote[url] = ["<þingmaður/>", "<þingmaður/>", "<þingmaður id='1'/>"]
+
+        self.assertEqual(
+            [xmlutils.fetch_xml_content(filename, url)[1] for i in range(3)],
+            [False, True, False],
+        )
+        self.assertEqual(
+            self.cache_files(), ["PERSON_URL.1.xml", "PERSON_URL.1.xml.meta"]
+        )
+
+
+class PrefixedOutputTest(TestCase):
+    def test_write(self):
+        stream = StringIO()
+        output = PrefixedOutput(stream, "[157] ")
+
+        output.write("Processing")
+        output.write(" parliament\nDone\nUpdat")
+        self.assertEqual(stream.getvalue(), "[157] Processing parliament\n[157] Done\n")
+
+        output.write("ing")
+        output.flush()
+        self.assertEqual(stream.getvalue().splitlines()[-1], "[157] Updating")
@@ -1,10 +1,15 @@
 from collections import OrderedDict
 from datetime import datetime
 from datetime import timedelta
+from djalthingi.althingi_settings import DOWNLOAD_DOCUMENTS
+from djalthingi.althingi_settings import DOWNLOAD_REVIEWS
 from djalthingi.althingi_settings import FIRST_PARLIAMENT_NUM
+from djalthingi.althingi_settings import PDF_PREFETCH_DAYS
 from djalthingi.exceptions import AlthingiException
 from djalthingi.exceptions import DataIntegrityException
+from djalthingi.exceptions import RemoteContentException
 from djalthingi.gazette import get_gazette_law_info
+from djalthingi.icalfeeds import invalidate_committee as invalidate_committee_ical
 from djalthingi.models import Category
 from djalthingi.models import CategoryGroup
 from djalthingi.models import Committee
@@ -30,15 +35,23 @@ from djalthingi.models import Seat
 from djalthingi.models import Session
 from djalthingi.models import SessionAgendaItem
 from djalthingi.models import Speech
+from djalthingi.models import SpeechRollup
 from djalthingi.models import Vote
 from djalthingi.models import VoteCasting
+from djalthingi.pdfcache import prefetch as prefetch_pdfs
 from djalthingi.utils import get_last_parliament_num
 from djalthingi.utils import maybe_download_document
 from djalthingi.utils import maybe_download_review
 from djalthingi.utils import sensible_datetime
 from djalthingi.xmlutils import get_xml
+from djalthingi.xmlutils import get_xml_file
+from djalthingi.xmlutils import iter_xml
+from djalthingi.xmlutils import iter_xml_file
+from djalthingi.xmlutils import prefetch_xml
+from djalthingi.xmlutils import xml_digest
 from django.conf import settings
 from django.core.mail import send_mail
+from django.db import transaction
 from django.db.models import Q
 from django.utils import timezone
 from sys import stderr
@@ -86,11 +99,37 @@ already_haves = {
 }
 
 
+# Number of rows written per query when updaters write to the database in bulk.
+BULK_BATCH_SIZE = 500
+
+
 def clear_already_haves():
     for varname in already_haves:
         already_haves[varname] = {}
 
 
+def skip_journaled(keys, journal, parliament_num, feed):
+    """
+    Returns the keys of entities to process in a feed, without the ones that
+    the given import journal shows were processed in an earlier, failed run.
+    Callers record their progress with `journal.set_position` as they go.
+    """
+    if journal is None:
+        return keys
+
+    position = journal.get_position(parliament_num, feed)
+    positions = [str(key) for key in keys]
+    if position not in positions:
+        return keys
+
+    skip_count = positions.index(position) + 1
+    print(
+        "Resuming %s of parliament %d, skipping %d already processed"
+        % (feed, parliament_num, skip_count)
+    )
+    return keys[skip_count:]
+
+
 def update_parliament(parliament_num):
 
     last_parliament_num = get_last_parliament_num()
@@ -430,10 +469,40 @@ def update_vote_castings(parliament_num=None, days=None):
         )
     }
 
-    vote_casting_ids = []
-    for xml in get_xml(
+    # The listing can be very large, so it is streamed from the cache file,
+    # once for prefetching and again for processing.
+    vote_castings_filename = get_xml_file(
         "VOTE_CASTINGS_URL", parliament.parliament_num, days=days
-    ).findall("atkvæðagreiðsla"):
+    )
+
+    # Retrieve the individual vote castings, which contain the actual votes,
+    # all at once before processing them one by one.
+    prefetch_xml(
+        "VOTE_CASTING_URL",
+        [
+            int(xml.attrib["atkvæðagreiðslunúmer"])
+            for xml in iter_xml_file(vote_castings_filename, "atkvæðagreiðsla")
+            if xml.findtext("samantekt/aðferð") != "yfirlýsing forseta/mál gengur"
+        ],
+    )
+
+    # Changes are collected while processing the XML and then applied in
+    # bulk, in a single transaction, once everything has been processed.
+    new_vote_castings = []
+    changed_vote_castings = []
+    unchanged_vote_casting_count = 0
+    new_votes = []
+    changed_votes = []
+    unchanged_vote_count = 0
+    unchanged_vote_listing_count = 0
+
+    # Keep track of votes that are still in the XML, so that we can delete
+    # those that are not.
+    vote_keys = set()
+    vote_listed_vote_casting_xml_ids = set()
+
+    vote_casting_xml_ids = []
+    for xml in iter_xml_file(vote_castings_filename, "atkvæðagreiðsla"):
 
         vote_casting_xml_id = int(xml.attrib["atkvæðagreiðslunúmer"])
 
@@ -449,14 +518,16 @@ def update_vote_castings(parliament_num=None, days=None):
             except KeyError:
                 issue = update_issue(issue_num, parliament.parliament_num)
 
+            # Documents are looked up in the prefetched documents rather
+            # than the database.
+            #
+            # A missing document is a very unusual state, but may occur when
+            # the document that's being voted on hasn't been published on
+            # Parliament's website when the vote takes place.
             doc_num = int(xml.find("þingskjal").attrib["skjalsnúmer"])
-            try:
-                document = issue.documents.get(doc_num=doc_num)
-            except Document.DoesNotExist:
-                # This is a very unusual state, but may occur when the
-                # document that's being voted on hasn't been published on
-                # Parliament's website when the vote takes place.
-                document = None
+            document = next(
+                (d for d in issue.documents.all() if d.doc_num == doc_num), None
+            )
 
         # NOTE / TODO: Waiting for B-issue types to appear in XML for vote castings.
         # elif issue_group == 'B':
@@ -627,12 +698,6 @@ def update_vote_castings(parliament_num=None, days=None):
                 vote_casting.to_minister = to_minister
                 changed = True
 
-            if changed:
-                vote_casting.save()
-                print("Updated vote casting: %s" % vote_casting)
-            else:
-                print("Already have vote casting: %s" % vote_casting)
-
         else:
             vote_casting = VoteCasting()
 
@@ -652,56 +717,174 @@ def update_vote_castings(parliament_num=None, days=None):
             vote_casting.to_minister = to_minister
             vote_casting.vote_casting_xml_id = vote_casting_xml_id
 
-            vote_casting.save()
-
-            print("Added vote casting: %s" % vote_casting)
+            new_vote_castings.append(vote_casting)
 
         if method != "yfirlýsing forseta/mál gengur":
 
+            # The votes of a vote casting only need to be processed if their
+            # XML has changed since they were last written to the database.
+            # The digest is stored along with the votes, so that a run that
+            # fails before writing them doesn't leave them looking unchanged.
             xml = get_xml("VOTE_CASTING_URL", vote_casting_xml_id)
+            digest = xml_digest(xml)
 
-            # Process actual votes, if they exist.
-            for vote_xml in xml.findall("atkvæðaskrá/þingmaður"):
-                person_xml_id = int(vote_xml.attrib["id"])
-                vote_response = vote_xml.find("atkvæði").text
+            if vote_casting.votes_xml_digest == digest:
+                unchanged_vote_listing_count += 1
+            else:
+                vote_casting.votes_xml_digest = digest
+                changed = True
 
-                # NOTE: To be removed when XML is fixed.
-                if vote_response == "f: óþekktur kóði":
-                    vote_response = "boðaði fjarvist"
+                vote_listed_vote_casting_xml_ids.add(vote_casting_xml_id)
 
-                try:
-                    person = pref_persons[person_xml_id]
-                except KeyError:
-                    person = update_person(person_xml_id, parliament.parliament_num)
+                # Process actual votes, if they exist.
+                for vote_xml in xml.findall("atkvæðaskrá/þingmaður"):
+                    person_xml_id = int(vote_xml.attrib["id"])
+                    vote_response = vote_xml.find("atkvæði").text
 
-                if "%s-%s" % (vote_casting_xml_id, person_xml_id) in pref_votes:
-                    vote = pref_votes["%s-%s" % (vote_casting_xml_id, person_xml_id)]
+                    # NOTE: To be removed when XML is fixed.
+                    if vote_response == "f: óþekktur kóði":
+                        vote_response = "boðaði fjarvist"
 
-                    changed = False
-                    if vote.vote_response != vote_response:
-                        vote.vote_response = vote_response
-                        changed = True
+                    try:
+                        person = pref_persons[person_xml_id]
+                    except KeyError:
+                        person = update_person(person_xml_id, parliament.parliament_num)
 
-                    if changed:
-                        vote.save()
-                        print("Updated vote: %s" % vote)
+                    vote_key = "%d-%d" % (vote_casting_xml_id, person_xml_id)
+                    vote_keys.add(vote_key)
+
+                    if vote_key in pref_votes:
+                        vote = pref_votes[vote_key]
+
+                        changed = False
+                        if vote.vote_response != vote_response:
+                            vote.vote_response = vote_response
+                            changed = True
+
+                        if changed:
+                            changed_votes.append(vote)
+                        else:
+                            unchanged_vote_count += 1
                     else:
-                        print("Already have vote: %s" % vote)
-                else:
-                    vote = Vote()
-                    vote.vote_casting_id = vote_casting.id
-                    vote.person_id = person.id
-                    vote.vote_response = vote_response
+                        vote = Vote()
+                        vote.vote_casting = vote_casting
+                        vote.person = person
+                        vote.vote_response = vote_response
+
+                        new_votes.append(vote)
+
+        if vote_casting.id is not None:
+            if changed:
+                changed_vote_castings.append(vote_casting)
+            else:
+                unchanged_vote_casting_count += 1
+
+        vote_casting_xml_ids.append(vote_casting_xml_id)
+
+    # Votes that have disappeared from the XML of vote castings that we have
+    # just processed.
+    deletable_vote_ids = [
+        vote.id
+        for vote_key, vote in pref_votes.items()
+        if vote.vote_casting.vote_casting_xml_id in vote_listed_vote_casting_xml_ids
+        and vote_key not in vote_keys
+    ]
+
+    with transaction.atomic():
+        _apply_vote_casting_changes(
+            new_vote_castings, changed_vote_castings, new_votes, changed_votes
+        )
+
+        for i in range(0, len(deletable_vote_ids), BULK_BATCH_SIZE):
+            Vote.objects.filter(
+                id__in=deletable_vote_ids[i : i + BULK_BATCH_SIZE]
+            ).delete()
+
+        # Only counts are printed, since there may be hundreds of thousands
+        # of votes in a parliament.
+        if new_vote_castings:
+            print("Added %d vote castings" % len(new_vote_castings))
+        if changed_vote_castings:
+            print("Updated %d vote castings" % len(changed_vote_castings))
+        if unchanged_vote_casting_count:
+            print("Already have %d vote castings" % unchanged_vote_casting_count)
+        if new_votes:
+            print("Added %d votes" % len(new_votes))
+        if changed_votes:
+            print("Updated %d votes" % len(changed_votes))
+        if unchanged_vote_count:
+            print("Already have %d votes" % unchanged_vote_count)
+        if unchanged_vote_listing_count:
+            print(
+                "Skipped votes of %d unchanged vote castings"
+                % unchanged_vote_listing_count
+            )
+        if deletable_vote_ids:
+            print("Deleted %d non-existent votes" % len(deletable_vote_ids))
 
-                    vote.save()
+        _delete_vote_castings(parliament, vote_casting_xml_ids, days)
 
-                    print("Added vote: %s" % vote)
 
-        vote_casting_ids.append(vote_casting.id)
+def _apply_vote_casting_changes(
+    new_vote_castings, changed_vote_castings, new_votes, changed_votes
+):
+    """
+    Writes the vote castings and votes collected by `update_vote_castings` to
+    the database with as few queries as possible.
+    """
+
+    VoteCasting.objects.bulk_create(new_vote_castings, batch_size=BULK_BATCH_SIZE)
+
+    VoteCasting.objects.bulk_update(
+        changed_vote_castings,
+        [
+            "timing",
+            "vote_casting_type",
+            "vote_casting_type_text",
+            "specifics",
+            "method",
+            "count_yes",
+            "count_no",
+            "count_abstain",
+            "conclusion",
+            "issue",
+            "document",
+            "session",
+            "to_committee",
+            "to_minister",
+            "votes_xml_digest",
+        ],
+        batch_size=BULK_BATCH_SIZE,
+    )
+
+    # Not all database backends return primary keys from `bulk_create`, so we
+    # look them up for votes belonging to newly created vote castings.
+    if any(vote_casting.id is None for vote_casting in new_vote_castings):
+        vote_casting_ids = dict(
+            VoteCasting.objects.filter(
+                vote_casting_xml_id__in=[
+                    vc.vote_casting_xml_id for vc in new_vote_castings
+                ]
+            ).values_list("vote_casting_xml_id", "id")
+        )
+        for vote_casting in new_vote_castings:
+            vote_casting.id = vote_casting_ids[vote_casting.vote_casting_xml_id]
+
+    for vote in new_votes:
+        vote.vote_casting_id = vote.vote_casting.id
+
+    Vote.objects.bulk_create(new_votes, batch_size=BULK_BATCH_SIZE)
+
+    Vote.objects.bulk_update(
+        changed_votes, ["vote_response"], batch_size=BULK_BATCH_SIZE
+    )
+
+
+def _delete_vote_castings(parliament, vote_casting_xml_ids, days=None):
 
     deletable_vote_castings = VoteCasting.objects.filter(
         session__parliament_id=parliament.id
-    ).exclude(id__in=vote_casting_ids)
+    ).exclude(vote_casting_xml_id__in=vote_casting_xml_ids)
     if days is not None:
         # If we're limiting by day count, we'll only want to mark vote
         # castings within that range as deletable.
@@ -936,27 +1119,47 @@ def update_committee(committee_xml_id, parliament_num=None):
     return committee
 
 
-def update_issues(parliament_num=None):
+def update_issues(parliament_num=None, force=False, journal=None):
     """
     Fetch a list of "recent" issues on Althingi and update our database accordingly.
+
+    Issues whose XML hasn't changed since they were last processed are
+    skipped, unless `force` is set. When an import journal is given, issues
+    processed in an earlier run of it are skipped as well.
     """
 
     parliament = update_parliament(parliament_num)
 
-    xml = get_xml("ISSUE_LIST_URL", parliament.parliament_num).findall("mál")
+    # We are only interested in A-issues (with documents).
+    issue_nums = [
+        int(issue_xml.attrib["málsnúmer"])
+        for issue_xml in iter_xml("ISSUE_LIST_URL", "mál", parliament.parliament_num)
+        if issue_xml.attrib["málsflokkur"] == "A"
+    ]
 
-    for issue_xml in xml:
-        # We are only interested in A-issues (with documents).
-        if issue_xml.attrib["málsflokkur"] != "A":
-            continue
+    issue_nums = skip_journaled(
+        issue_nums, journal, parliament.parliament_num, "issues"
+    )
 
-        issue_num = int(issue_xml.attrib["málsnúmer"])
+    prefetch_xml(
+        "ISSUE_URL",
+        [
+            (parliament.parliament_num, issue_num)
+            for issue_num in issue_nums
+            if "%d-%d" % (parliament.parliament_num, issue_num)
+            not in already_haves["issues"]
+        ],
+    )
+
+    for issue_num in issue_nums:
+        update_issue(issue_num, parliament_num=parliament.parliament_num, force=force)
 
-        update_issue(issue_num, parliament_num=parliament.parliament_num)
+        if journal is not None:
+            journal.set_position(parliament.parliament_num, "issues", issue_num)
 
 
 # NOTE: Only updates "A" issues, those with documents, reviews etc.
-def update_issue(issue_num, parliament_num=None):
+def update_issue(issue_num, parliament_num=None, force=False):
 
     parliament = update_parliament(parliament_num)
 
@@ -988,6 +1191,24 @@ def update_issue(issue_num, parliament_num=None):
             % (issue_num, parliament.parliament_num)
         )
 
+    # The issue XML contains the stubs of all of its documents and reviews,
+    # so if it hasn't changed since the issue was last processed, only its
+    # summary needs refreshing, unless some of its content is still missing.
+    digest = xml_digest(xml)
+    if not force:
+        issue = Issue.objects.filter(
+            issue_num=issue_num,
+            issue_group="A",
+            parliament=parliament,
+            xml_digest=digest,
+        ).first()
+        if issue is not None and not _issue_downloads_pending(issue):
+            print("Issue unchanged: %s" % issue.detailed())
+            if issue_xml.find("samantekt") is not None:
+                _update_issue_summary(parliament, issue)
+            already_haves["issues"][ah_key] = issue
+            return issue
+
     issue_type = issue_xml.find("málstegund").attrib["málstegund"]
 
     name = issue_xml.find("málsheiti").text.strip()
@@ -1094,99 +1315,19 @@ def update_issue(issue_num, parliament_num=None):
         previously_published_as.append([previous_parliament_num, previous_issue_num])
 
     # See if this issue has summary information
-    summary_xml_try = issue_xml.find("samantekt")
-    if summary_xml_try is not None:
-        # Yes, it has summary information
-        summary_xml = get_xml(
-            "ISSUE_SUMMARY_URL", parliament.parliament_num, issue.issue_num
-        )
-
-        purpose = summary_xml.find("markmið").text
-        try:
-            change_description = summary_xml.find("helstuBreytingar").text
-        except AttributeError:
-            change_description = ""
-        try:
-            changes_to_law = summary_xml.find("breytingaráLögum").text
-        except AttributeError:
-            changes_to_law = ""
-        try:
-            cost_and_revenue = summary_xml.find("kostnaðurOgTekjur").text
-        except AttributeError:
-            cost_and_revenue = ""
-        try:
-            other_info = summary_xml.find("aðrarUpplýsingar").text
-        except AttributeError:
-            other_info = ""
-        try:
-            review_description = summary_xml.find("umsagnir").text
-        except AttributeError:
-            review_description = ""
-        try:
-            fate = summary_xml.find("afgreiðsla").text
-        except AttributeError:
-            fate = ""
-        try:
-            media_coverage = summary_xml.find("fjölmiðlaumfjöllun").text
-        except AttributeError:
-            media_coverage = ""
-
-        try:
-            issue_summary = IssueSummary.objects.get(issue_id=issue.id)
-
-            changed = False
-            if issue_summary.purpose != purpose:
-                issue_summary.purpose = purpose
-                changed = True
-
-            if issue_summary.change_description != change_description:
-                issue_summary.change_description = change_description
-                changed = True
-
-            if issue_summary.changes_to_law != changes_to_law:
-                issue_summary.changes_to_law = changes_to_law
-                changed = True
-
-            if issue_summary.cost_and_revenue != cost_and_revenue:
-                issue_summary.cost_and_revenue = cost_and_revenue
-                changed = True
-
-            if issue_summary.other_info != other_info:
-                issue_summary.other_info = other_info
-                changed = True
-
-            if issue_summary.review_description != review_description:
-                issue_summary.review_description = review_description
-                changed = True
-
-            if issue_summary.fate != fate:
-                issue_summary.fate = fate
-                changed = True
-
-            if issue_summary.media_coverage != media_coverage:
-                issue_summary.media_coverage = media_coverage
-                changed = True
-
-            if changed:
-                issue_summary.save()
-                print("Updated issue summary for issue: %s" % issue.detailed())
-            else:
-                print("Already have issue summary for issue: %s" % issue.detailed())
-
-        except IssueSummary.DoesNotExist:
-            issue_summary = IssueSummary()
-            issue_summary.issue_id = issue.id
-            issue_summary.purpose = purpose
-            issue_summary.change_description = change_description
-            issue_summary.changes_to_law = changes_to_law
-            issue_summary.cost_and_revenue = cost_and_revenue
-            issue_summary.other_info = other_info
-            issue_summary.review_description = review_description
-            issue_summary.fate = fate
-            issue_summary.media_coverage = media_coverage
-            issue_summary.save()
-
-            print("Added issue summary for issue: %s" % issue.detailed())
+    if issue_xml.find("samantekt") is not None:
+        _update_issue_summary(parliament, issue)
+
+    # Retrieve all of the issue's documents before processing them.
+    prefetch_xml(
+        "DOCUMENT_URL",
+        [
+            (parliament.parliament_num, int(docstub_xml.attrib["skjalsnúmer"]))
+            for docstub_xml in docstubs_xml
+            if int(docstub_xml.attrib["málsnúmer"]) == issue.issue_num
+            and int(docstub_xml.attrib["þingnúmer"]) == parliament.parliament_num
+        ],
+    )
 
     # Process documents.
     doc_nums = (
@@ -1278,7 +1419,7 @@ def update_issue(issue_num, parliament_num=None):
                 doc.pdf_remote_path = path_pdf
                 changed = True
 
-            if len(doc.html_content_raw) == 0 and len(doc.html_remote_path) > 0:
+            if doc.html_content_raw_blob_id is None and len(doc.html_remote_path) > 0:
                 doc.update_html_content()
                 changed = True
 
@@ -1460,6 +1601,8 @@ def update_issue(issue_num, parliament_num=None):
     log_nums = (
         []
     )  # Keep track of legit reviews. Sometimes reviews get deleted from the XML and so should be deleted locally.
+    prefetch_remote_paths = []  # PDF files of newly arrived reviews.
+    prefetch_since = datetime.now() - timedelta(days=PDF_PREFETCH_DAYS)
     for review_xml in reviews_xml:
         log_num = int(review_xml.attrib["dagbókarnúmer"])
 
@@ -1575,6 +1718,18 @@ def update_issue(issue_num, parliament_num=None):
 
             print("Added review: %s" % review)
 
+            if (
+                not pdf_filename
+                and date_arrived is not None
+                and date_arrived >= prefetch_since
+            ):
+                prefetch_remote_paths.append(path_pdf)
+
+    # Committee members tend to open new reviews right away, so their files
+    # are retrieved in the background while the importer continues.
+    if PDF_PREFETCH_DAYS and prefetch_remote_paths:
+        prefetch_pdfs(prefetch_remote_paths)
+
     # Delete local reviews that no longer exist online.
     for review in Review.objects.filter(issue_id=issue.id).exclude(
         log_num__in=log_nums
@@ -1623,6 +1778,7 @@ def update_issue(issue_num, parliament_num=None):
     already_haves["issues"][ah_key] = issue
 
     # Process previous publications of issue, if any
+    previous_issues_missing = False
     for previous_parliament_num, previous_issue_num in previously_published_as:
         try:
             previous_issue = Issue.objects.get(
@@ -1637,11 +1793,149 @@ def update_issue(issue_num, parliament_num=None):
             # If the issue was published in a previous parliament, we expect
             # that parliament to have already been processed. If it hasn't
             # been processed yet, we'll just move on with our lives.
-            pass
+            previous_issues_missing = True
+
+    # Only recorded once everything has been processed successfully. If a
+    # previous issue was missing, for example because its parliament is
+    # being processed at the same time by another worker, the issue will be
+    # processed again next time so that the previous issue gets connected.
+    # The same goes for documents and reviews that are still missing content.
+    if (
+        not previous_issues_missing
+        and not _issue_downloads_pending(issue)
+        and issue.xml_digest != digest
+    ):
+        issue.xml_digest = digest
+        issue.save()
 
     return issue
 
 
+def _update_issue_summary(parliament, issue):
+    """
+    Updates the summary of an issue. It is not a part of the issue XML, so it
+    is fetched even when the issue itself hasn't changed.
+    """
+
+    summary_xml = get_xml(
+        "ISSUE_SUMMARY_URL", parliament.parliament_num, issue.issue_num
+    )
+
+    purpose = summary_xml.find("markmið").text
+    try:
+        change_description = summary_xml.find("helstuBreytingar").text
+    except AttributeError:
+        change_description = ""
+    try:
+        changes_to_law = summary_xml.find("breytingaráLögum").text
+    except AttributeError:
+        changes_to_law = ""
+    try:
+        cost_and_revenue = summary_xml.find("kostnaðurOgTekjur").text
+    except AttributeError:
+        cost_and_revenue = ""
+    try:
+        other_info = summary_xml.find("aðrarUpplýsingar").text
+    except AttributeError:
+        other_info = ""
+    try:
+        review_description = summary_xml.find("umsagnir").text
+    except AttributeError:
+        review_description = ""
+    try:
+        fate = summary_xml.find("afgreiðsla").text
+    except AttributeError:
+        fate = ""
+    try:
+        media_coverage = summary_xml.find("fjölmiðlaumfjöllun").text
+    except AttributeError:
+        media_coverage = ""
+
+    try:
+        issue_summary = IssueSummary.objects.get(issue_id=issue.id)
+
+        changed = False
+        if issue_summary.purpose != purpose:
+            issue_summary.purpose = purpose
+            changed = True
+
+        if issue_summary.change_description != change_description:
+            issue_summary.change_description = change_description
+            changed = True
+
+        if issue_summary.changes_to_law != changes_to_law:
+            issue_summary.changes_to_law = changes_to_law
+            changed = True
+
+        if issue_summary.cost_and_revenue != cost_and_revenue:
+            issue_summary.cost_and_revenue = cost_and_revenue
+            changed = True
+
+        if issue_summary.other_info != other_info:
+            issue_summary.other_info = other_info
+            changed = True
+
+        if issue_summary.review_description != review_description:
+            issue_summary.review_description = review_description
+            changed = True
+
+        if issue_summary.fate != fate:
+            issue_summary.fate = fate
+            changed = True
+
+        if issue_summary.media_coverage != media_coverage:
+            issue_summary.media_coverage = media_coverage
+            changed = True
+
+        if changed:
+            issue_summary.save()
+            print("Updated issue summary for issue: %s" % issue.detailed())
+        else:
+            print("Already have issue summary for issue: %s" % issue.detailed())
+
+    except IssueSummary.DoesNotExist:
+        issue_summary = IssueSummary()
+        issue_summary.issue_id = issue.id
+        issue_summary.purpose = purpose
+        issue_summary.change_description = change_description
+        issue_summary.changes_to_law = changes_to_law
+        issue_summary.cost_and_revenue = cost_and_revenue
+        issue_summary.other_info = other_info
+        issue_summary.review_description = review_description
+        issue_summary.fate = fate
+        issue_summary.media_coverage = media_coverage
+        issue_summary.save()
+
+        print("Added issue summary for issue: %s" % issue.detailed())
+
+
+def _issue_downloads_pending(issue):
+    """
+    Whether the issue has documents or reviews whose content the importer
+    hasn't managed to download yet.
+    """
+    documents = Document.objects.filter(issue_id=issue.id)
+
+    if (
+        documents.filter(html_content_raw_blob_id=None)
+        .exclude(html_remote_path=None)
+        .exclude(html_remote_path="")
+        .exists()
+    ):
+        return True
+
+    if DOWNLOAD_DOCUMENTS and documents.filter(pdf_filename="").exists():
+        return True
+
+    if (
+        DOWNLOAD_REVIEWS
+        and Review.objects.filter(issue_id=issue.id, pdf_filename="").exists()
+    ):
+        return True
+
+    return False
+
+
 def _process_docless_issue(issue_xml):
 
     issue_num = int(issue_xml.attrib["málsnúmer"])
@@ -1736,18 +2030,31 @@ def _process_docless_issue(issue_xml):
     return issue
 
 
-def update_sessions(parliament_num=None):
+def update_sessions(parliament_num=None, journal=None):
 
     parliament = update_parliament(parliament_num)
 
     xml = get_xml("SESSION_LIST_URL", parliament.parliament_num).findall("þingfundur")
-    for session_xml in reversed(xml):
-        session_num = int(session_xml.attrib["númer"])
+    session_nums = skip_journaled(
+        [int(session_xml.attrib["númer"]) for session_xml in reversed(xml)],
+        journal,
+        parliament.parliament_num,
+        "sessions",
+    )
+    for session_num in session_nums:
+        update_session(
+            session_num, parliament.parliament_num, resolve_effective_dates=False
+        )
 
-        update_session(session_num, parliament.parliament_num)
+        if journal is not None:
+            journal.set_position(parliament.parliament_num, "sessions", session_num)
 
+    # Resolved once for the whole parliament instead of for every session,
+    # also covering sessions processed by an earlier, interrupted run.
+    Session.resolve_effective_dates(parliament)
 
-def update_session(session_num, parliament_num=None):
+
+def update_session(session_num, parliament_num=None, resolve_effective_dates=True):
 
     parliament = update_parliament(parliament_num)
 
@@ -1770,6 +2077,8 @@ def update_session(session_num, parliament_num=None):
                 parliament__parliament_num=parliament.parliament_num,
             )
             nonexistent_session.delete()
+            if resolve_effective_dates:
+                Session.resolve_effective_dates(parliament, session_num)
 
             print("Deleted non-existent session: %s" % nonexistent_session)
             return
@@ -1780,7 +2089,7 @@ def update_session(session_num, parliament_num=None):
                 % (session_num, parliament.parliament_num)
             )
 
-    session = _process_session_agenda_xml(xml)
+    session = _process_session_agenda_xml(xml, resolve_effective_dates)
 
     already_haves["sessions"][ah_key] = session
 
@@ -1793,9 +2102,15 @@ def update_next_sessions():
 
     sessions = []
     for session_xml in xml:
-        session = _process_session_agenda_xml(session_xml)
+        session = _process_session_agenda_xml(session_xml, False)
         sessions.append(session)
 
+    # Effective dates are resolved once per parliament after all changes.
+    for parliament in Parliament.objects.filter(
+        id__in={session.parliament_id for session in sessions}
+    ):
+        Session.resolve_effective_dates(parliament)
+
     # These are sessions that are upcoming according to the database but not according to the XML.
     # We run them through update_session() for consistency's sake, which will delete or update them appropriately.
     dubious_sessions = (
@@ -1805,9 +2120,14 @@ def update_next_sessions():
     )
     for dubious_session in dubious_sessions:
         update_session(
-            dubious_session.session_num, dubious_session.parliament.parliament_num
+            dubious_session.session_num,
+            dubious_session.parliament.parliament_num,
+            resolve_effective_dates=False,
         )
 
+    for parliament in {session.parliament for session in dubious_sessions}:
+        Session.resolve_effective_dates(parliament)
+
 
 def update_constituencies(parliament_num=None):
 
@@ -2071,9 +2391,11 @@ def update_committee_agenda(committee_agenda_xml_id, parliament_num=None):
     if not "númer" in xml.attrib:
         try:
             # Committee agenda has been deleted in XML, meaning cancelled.
-            CommitteeAgenda.objects.get(
+            committee_agenda = CommitteeAgenda.objects.get(
                 committee_agenda_xml_id=committee_agenda_xml_id
-            ).delete()
+            )
+            committee_agenda.delete()
+            invalidate_committee_ical(committee_agenda.committee_id)
 
             print("Deleted non-existent committee agenda: %d" % committee_agenda_xml_id)
             return
@@ -2086,10 +2408,12 @@ def update_committee_agenda(committee_agenda_xml_id, parliament_num=None):
     elif int(xml.attrib["þingnúmer"]) != parliament.parliament_num:
         # Committee agenda exists, but not in this parliament. (A corrected
         # mistake in the XML, most likely.)
-        CommitteeAgenda.objects.get(
+        committee_agenda = CommitteeAgenda.objects.get(
             committee_agenda_xml_id=committee_agenda_xml_id,
             parliament__parliament_num=parliament.parliament_num,
-        ).delete()
+        )
+        committee_agenda.delete()
+        invalidate_committee_ical(committee_agenda.committee_id)
         print(
             "Deleted committee agenda from parliament: %d (parliament %d)"
             % (committee_agenda_xml_id, parliament.parliament_num)
@@ -2148,6 +2472,9 @@ def _process_committee_agenda_xml(xml):
     except AttributeError:
         location = None
 
+    # Whether anything shown in the committee's calendar feed has changed.
+    feed_changed = False
+
     try:
         committee_agenda = CommitteeAgenda.objects.get(
             committee_agenda_xml_id=committee_agenda_xml_id, parliament=parliament
@@ -2172,6 +2499,7 @@ def _process_committee_agenda_xml(xml):
 
         if changed:
             committee_agenda.save()
+            feed_changed = True
             print("Updated committee agenda: %s" % committee_agenda)
         else:
             print("Already have committee agenda: %s" % committee_agenda)
@@ -2187,6 +2515,7 @@ def _process_committee_agenda_xml(xml):
         committee_agenda.timing_text = timing_text
         committee_agenda.location = location
         committee_agenda.save()
+        feed_changed = True
 
         print("Added committee agenda: %s" % committee_agenda)
 
@@ -2215,6 +2544,9 @@ def _process_committee_agenda_xml(xml):
             # with documents, not for example 'B' or 'N'.
             try:
                 issue = update_issue(issue_num, issue_parliament_num)
+            except RemoteContentException:
+                # Not a problem with the XML, so it shouldn't be ignored.
+                raise
             except AlthingiException:
                 # If the update_issue function fails here, something is wrong
                 # in the XML. We'll move on with our lives. Probably, the only
@@ -2238,6 +2570,7 @@ def _process_committee_agenda_xml(xml):
 
             if changed:
                 item.save()
+                feed_changed = True
                 print("Updated committee agenda item: %s" % item)
             else:
                 print("Already have committee agenda item: %s" % item)
@@ -2249,19 +2582,25 @@ def _process_committee_agenda_xml(xml):
             item.name = name
             item.issue = issue
             item.save()
+            feed_changed = True
 
             print("Added committee agenda item: %s" % item)
 
     # Delete items higher than the max_order since that means items has been dropped
-    CommitteeAgendaItem.objects.filter(
+    deleted, _ = CommitteeAgendaItem.objects.filter(
         order__gt=max_order, committee_agenda=committee_agenda
     ).delete()
+    if deleted:
+        feed_changed = True
+
+    if feed_changed:
+        invalidate_committee_ical(committee_agenda.committee_id)
 
     return committee_agenda
 
 
 # NOTE: To become a private function once we turn this into some sort of class
-def _process_session_agenda_xml(session_xml):
+def _process_session_agenda_xml(session_xml, resolve_effective_dates=True):
 
     parliament_num = int(session_xml.attrib["þingnúmer"])
     session_num = int(session_xml.attrib["númer"])
@@ -2292,6 +2631,9 @@ def _process_session_agenda_xml(session_xml):
     except AttributeError:
         timing_end = None
 
+    # Whether the effective dates of sessions need to be resolved again.
+    planning_changed = False
+
     try:
         session = Session.objects.get(session_num=session_num, parliament=parliament)
 
@@ -2299,6 +2641,7 @@ def _process_session_agenda_xml(session_xml):
         if session.timing_start_planned != timing_start_planned:
             session.timing_start_planned = timing_start_planned
             changed = True
+            planning_changed = True
         if session.timing_start != timing_start:
             session.timing_start = timing_start
             changed = True
@@ -2325,8 +2668,14 @@ def _process_session_agenda_xml(session_xml):
         session.timing_end = timing_end
         session.timing_text = timing_text
         session.save()
+        planning_changed = True
         print("Added session: %s" % session)
 
+    # Callers processing many sessions resolve effective dates when done.
+    if planning_changed and resolve_effective_dates:
+        Session.resolve_effective_dates(parliament, session_num)
+        session.refresh_from_db(fields=["effective_date"])
+
     max_order = 0
     for session_agenda_item_xml in session_xml.findall("dagskrá/dagskrárliður"):
         issue_xml = session_agenda_item_xml.find("mál")
@@ -2421,7 +2770,9 @@ def update_speeches(parliament_num=None, days=None):
     if parliament.parliament_num in already_haves["speeches"]:
         return already_haves["speeches"][parliament.parliament_num]
 
-    xml = get_xml("SPEECHES_URL", parliament.parliament_num, days=days)
+    speeches_xml = iter_xml(
+        "SPEECHES_URL", "ræða", parliament.parliament_num, days=days
+    )
 
     pref_persons = dict((p.person_xml_id, p) for p in Person.objects.all())
     pref_sessions = dict(
@@ -2441,7 +2792,12 @@ def update_speeches(parliament_num=None, days=None):
 
     speeches = []
     speech_orders = {}
-    for speech_xml in xml.findall("ræða"):
+
+    # Days on which speeches have been added, changed or deleted, whose
+    # rollups need to be rebuilt.
+    changed_days = set()
+
+    for speech_xml in speeches_xml:
 
         timing_start = sensible_datetime(speech_xml.find("ræðahófst").text)
 
@@ -2599,6 +2955,7 @@ def update_speeches(parliament_num=None, days=None):
 
             if changed:
                 speech.save()
+                changed_days.add(timezone.localdate(speech.timing_start))
                 print("Updated speech: %s" % speech)
             else:
                 print("Already have speech: %s" % speech)
@@ -2622,6 +2979,7 @@ def update_speeches(parliament_num=None, days=None):
             speech.text_remote_path = text_remote_path
             speech.sound_remote_path = sound_remote_path
             speech.save()
+            changed_days.add(timezone.localdate(speech.timing_start))
 
             print("Added speech: %s" % speech)
 
@@ -2643,8 +3001,13 @@ def update_speeches(parliament_num=None, days=None):
 
     for deletable_speech in deletable_speeches:
         deletable_speech.delete()
+        changed_days.add(timezone.localdate(deletable_speech.timing_start))
         print("Deleted non-existent speech: %s" % deletable_speech)
 
+    if len(changed_days) > 0:
+        SpeechRollup.rebuild(parliament, changed_days)
+        print("Rebuilt speech rollups for %d day(s)" % len(changed_days))
+
     already_haves["speeches"][parliament.parliament_num] = speeches
 
     return speeches
@@ -2689,8 +3052,7 @@ def update_issue_statuses(parliament_num=None):
 
     parliament = update_parliament(parliament_num)
 
-    for issue_num in [i.issue_num for i in parliament.issues.filter(issue_group="A")]:
-        update_issue_status(issue_num, parliament.parliament_num)
+    _update_issue_statuses(parliament.issues.filter(issue_group="A"))
 
 
 def update_issue_status(issue_num, parliament_num=None):
@@ -2701,9 +3063,8 @@ def update_issue_status(issue_num, parliament_num=None):
 
     parliament = update_parliament(parliament_num)
 
-    try:
-        issue = parliament.issues.get(issue_num=issue_num, issue_group="A")
-    except Issue.DoesNotExist:
+    issues = parliament.issues.filter(issue_num=issue_num, issue_group="A")
+    if not issues.exists():
         msg = "Issue %d/%d does not exist and is not automatically fetched." % (
             issue_num,
             parliament.parliament_num,
@@ -2714,90 +3075,127 @@ def update_issue_status(issue_num, parliament_num=None):
         )
         raise AlthingiException(msg)
 
-    # Figure out issue's status, if supported.
-    status = issue.determine_status()
-    if status is not None:
+    _update_issue_statuses(issues)
 
-        current_step_order_query = (
-            issue.steps.all()
-        )  # Current according to database, that is.
 
-        # Map the current steps to their order according to database.
-        current_step_order_map = OrderedDict(
-            [(s.code, s.order) for s in current_step_order_query]
-        )
+def _update_issue_statuses(issues):
+    """
+    Updates the status, committee, minister and fate of the given issues.
+    The evidence for all of them is gathered up front with a handful of
+    queries, the rules are evaluated in memory and the resulting changes are
+    written in bulk.
+    """
 
-        if len(current_step_order_query) != len(current_step_order_map):
-            # This means that there are duplicates of at least one step in the
-            # database, which makes no sense. This should not happen and is
-            # dealt with here as a precaution. We'll just delete all the rows
-            # and insert them all from scratch.
-            issue.steps.all().delete()
-            current_step_order_map.clear()
+    evidence = issues.status_evidence()
 
-        changed = False
-        last_step = None
-        order = 0
-        for step, taken in status.items():
-            # Has this step been taken in the issue type's legislative process?
-            if taken:
-                order += 1  # Must be the next step, then!
-
-                if not step in current_step_order_map:
-                    IssueStep(issue=issue, code=step, order=order).save()
-                    changed = True
-                elif (
-                    step in current_step_order_map
-                    and current_step_order_map[step] != order
-                ):
-                    IssueStep.objects.filter(issue=issue, code=step).update(order=order)
-                    changed = True
+    # Current steps according to database, that is.
+    current_steps = {}
+    for step in IssueStep.objects.filter(issue__in=issues):
+        current_steps.setdefault(step.issue_id, []).append(step)
 
-                # Record the last step known to be taken.
-                last_step = step
+    new_steps = []
+    reordered_steps = []
+    deleted_step_ids = []
+    changed_issues = []
 
-            else:
-                if step in current_step_order_map:
-                    IssueStep.objects.get(issue=issue, code=step).delete()
-                    changed = True
+    for issue in issues.select_related("to_committee", "to_minister"):
+        changed_fields = []
 
-        # Set the last step as the new current one.
-        if issue.current_step != last_step:
-            issue.current_step = last_step
-            issue.save()
-            changed = True
+        # Figure out issue's status, if supported.
+        status = issue.determine_status(evidence[issue.id])
+        if status is not None:
 
-        # Remove steps that have nothing to do with this issue type (only as a precaution).
-        issue.steps.exclude(code__in=status.keys()).delete()
+            issue_steps = current_steps.get(issue.id, [])
 
-        if changed:
-            print("Updated status of issue: %s" % issue)
-        else:
-            print("Already have status of issue: %s" % issue)
+            # Map the current steps to their codes.
+            current_step_map = OrderedDict([(s.code, s) for s in issue_steps])
 
-    # Determine the committee which the issue belongs to, if any.
-    committee = issue.determine_committee()
-    if issue.to_committee != committee:
-        issue.to_committee = committee
-        issue.save()
-        print("Updated committee of issue %s to %s" % (issue, issue.to_committee))
+            if len(issue_steps) != len(current_step_map):
+                # This means that there are duplicates of at least one step in
+                # the database, which makes no sense. This should not happen
+                # and is dealt with here as a precaution. We'll just delete all
+                # the rows and insert them all from scratch.
+                deleted_step_ids += [s.id for s in issue_steps]
+                current_step_map.clear()
 
-    # Determine the minister which the issue was sent to, if any.
-    minister = issue.determine_minister()
-    if issue.to_minister != minister:
-        issue.to_minister = minister
-        issue.save()
-        print("Updated minister of issue %s to %s" % (issue, issue.to_minister))
-
-    # Determine the issue's fate (if any).
-    # This is done so near the end of the processing of the issue because it
-    # relies on the status, which in turn relies on things processed after the
-    # issue's basic attributes have been figured out.
-    fate = issue.determine_fate()
-    if issue.fate != fate:
-        issue.fate = fate
-        issue.save()
-        print('Updated issue fate to "%s": %s' % (fate, issue))
+            changed = False
+            last_step = None
+            order = 0
+            for step, taken in status.items():
+                # Has this step been taken in the issue type's legislative process?
+                if taken:
+                    order += 1  # Must be the next step, then!
+
+                    if not step in current_step_map:
+                        new_steps.append(IssueStep(issue=issue, code=step, order=order))
+                        changed = True
+                    elif current_step_map[step].order != order:
+                        current_step_map[step].order = order
+                        reordered_steps.append(current_step_map[step])
+                        changed = True
+
+                    # Record the last step known to be taken.
+                    last_step = step
+
+                else:
+                    if step in current_step_map:
+                        deleted_step_ids.append(current_step_map[step].id)
+                        changed = True
+
+            # Set the last step as the new current one.
+            if issue.current_step != last_step:
+                issue.current_step = last_step
+                changed_fields.append("current_step")
+                changed = True
+
+            # Remove steps that have nothing to do with this issue type (only as a precaution).
+            deleted_step_ids += [
+                s.id for code, s in current_step_map.items() if code not in status
+            ]
+
+            if changed:
+                print("Updated status of issue: %s" % issue)
+            else:
+                print("Already have status of issue: %s" % issue)
+
+        # Determine the committee which the issue belongs to, if any.
+        committee = issue.determine_committee(evidence[issue.id])
+        if issue.to_committee != committee:
+            issue.to_committee = committee
+            changed_fields.append("to_committee")
+            print("Updated committee of issue %s to %s" % (issue, issue.to_committee))
+
+        # Determine the minister which the issue was sent to, if any.
+        minister = issue.determine_minister(evidence[issue.id])
+        if issue.to_minister != minister:
+            issue.to_minister = minister
+            changed_fields.append("to_minister")
+            print("Updated minister of issue %s to %s" % (issue, issue.to_minister))
+
+        # Determine the issue's fate (if any).
+        # This is done so near the end of the processing of the issue because it
+        # relies on the status, which in turn relies on things processed after the
+        # issue's basic attributes have been figured out.
+        fate = issue.determine_fate(evidence[issue.id])
+        if issue.fate != fate:
+            issue.fate = fate
+            changed_fields.append("fate")
+            print('Updated issue fate to "%s": %s' % (fate, issue))
+
+        if changed_fields:
+            changed_issues.append((issue, changed_fields))
+
+    with transaction.atomic():
+        IssueStep.objects.filter(id__in=deleted_step_ids).delete()
+        IssueStep.objects.bulk_create(new_steps, batch_size=BULK_BATCH_SIZE)
+        IssueStep.objects.bulk_update(
+            reordered_steps, ["order"], batch_size=BULK_BATCH_SIZE
+        )
+
+        # Issues are saved individually, since few of them change in a
+        # typical run and saving them retains their signals.
+        for issue, changed_fields in changed_issues:
+            issue.save(update_fields=changed_fields)
 
 
 def update_ministers(parliament_num=None):
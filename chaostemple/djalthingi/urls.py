@@ -11,6 +11,16 @@ urlpatterns = [
         dataviews.csv_parliament_issues,
         name="csv_parliament_issues",
     ),
+    path(
+        "parliament/<int:parliament_num>/<slug:export_name>/csv/",
+        dataviews.csv_parliament_export,
+        name="csv_parliament_export",
+    ),
+    path(
+        "parliaments/<int:first_parliament_num>-<int:last_parliament_num>/<slug:export_name>/csv/",
+        dataviews.csv_parliaments_export,
+        name="csv_parliaments_export",
+    ),
     path(
         "parliament/<int:parliament_num>/issue/<int:issue_num>/speeches/csv/",
         dataviews.csv_parliament_issue_speeches,
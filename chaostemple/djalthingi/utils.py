@@ -7,7 +7,7 @@ from datetime import date
 from datetime import datetime
 
 from djalthingi import althingi_settings
-from djalthingi.xmlutils import get_response
+from djalthingi.xmlutils import fetch_response
 
 # We simply **cannot** be bothered to figure out the fancy locale-based way of
 # doing this. These months will always be Icelandic and in no other language,
@@ -64,7 +64,7 @@ def maybe_download_document(remote_path, parliament_num, issue_num):
         "djalthingi", parliament_num.__str__(), issue_num.__str__(), basename
     )
 
-    content = get_response(remote_path).content
+    content = fetch_response(remote_path).content
     localpath = os.path.join(althingi_settings.STATIC_DOCUMENT_DIR, local_filename)
     mkpath(os.path.dirname(localpath))
     with open(localpath, "wb") as outfile:
@@ -87,7 +87,7 @@ def maybe_download_review(remote_path, log_num, parliament_num, issue_num):
     stdout.write("Downloading review with log number %d..." % log_num)
     stdout.flush()
 
-    response = get_response(remote_path)
+    response = fetch_response(remote_path)
 
     filename = os.path.basename(remote_path)
     local_filename = os.path.join(
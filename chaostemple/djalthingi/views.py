@@ -1,23 +1,92 @@
+import os
+import re
+from djalthingi.exceptions import AlthingiException
 from djalthingi.exceptions import InvalidDocumentException
+from djalthingi.models import ContentBlob
 from djalthingi.models import Document
 from djalthingi.models import Review
+from django.http import FileResponse
+from django.http import Http404
 from django.http import HttpRequest
 from django.http import HttpResponse
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
+from django.utils.cache import get_conditional_response
+from django.utils.cache import patch_vary_headers
+from django.utils.http import http_date
+
+FILE_CHUNK_SIZE = 64 * 1024
 
 
 def parliament_document(request: HttpRequest, parliament_num: int, doc_num: int):
+    encoding = select_content_encoding(request)
+    field = "data" if encoding is None else ContentBlob.ENCODING_FIELDS[encoding]
+
+    # Only the variant of the content that is going to be served is loaded.
     document: Document = get_object_or_404(
-        Document,
+        Document.objects.select_related("html_content_blob").defer(
+            *[
+                "html_content_blob__%s" % other_field
+                for other_field in ["data", "gzip_data", "brotli_data"]
+                if other_field != field
+            ]
+        ),
         issue__parliament__parliament_num=parliament_num,
-        doc_num=doc_num
+        doc_num=doc_num,
     )
 
-    response = HttpResponse(document.html_content)
+    blob = document.html_content_blob
+    if blob is None:
+        response = HttpResponse("")
+        response["X-Frame-Options"] = "SAMEORIGIN"
+        return response
+
+    # The ETag is weak because the content may be delivered in different
+    # encodings, which are all semantically equivalent.
+    etag = 'W/"%s"' % blob.digest
+    last_modified = int(blob.time_created.timestamp())
+
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        # Variants are stored when documents are imported, and by the
+        # `encode_content_blobs` command for older ones. Until then, the
+        # content is delivered as it is.
+        if encoding is None or getattr(blob, field) is None:
+            response = HttpResponse(blob.text)
+        else:
+            response = HttpResponse(getattr(blob, field))
+            response["Content-Encoding"] = encoding
+
+    response["ETag"] = etag
+    response["Last-Modified"] = http_date(last_modified)
+    patch_vary_headers(response, ["Accept-Encoding"])
     response["X-Frame-Options"] = "SAMEORIGIN"
     return response
 
 
+def select_content_encoding(request: HttpRequest):
+    """
+    Returns the preferred encoding of stored content accepted by the client,
+    or None if the content should be delivered as it is.
+    """
+    accepted = set()
+    for part in request.headers.get("Accept-Encoding", "").split(","):
+        coding, _, params = part.partition(";")
+        match = re.search(r"q=([0-9.]+)", params)
+        try:
+            quality = float(match.group(1)) if match else 1.0
+        except ValueError:
+            quality = 0.0
+        if quality > 0:
+            accepted.add(coding.strip().lower())
+
+    for encoding in ContentBlob.ENCODING_FIELDS:
+        if encoding in accepted:
+            return encoding
+
+    return None
+
+
 def parliament_review(request: HttpRequest, parliament_num: int, log_num: int):
     review = get_object_or_404(
         Review,
@@ -25,8 +94,101 @@ def parliament_review(request: HttpRequest, parliament_num: int, log_num: int):
         log_num=log_num
     )
 
-    content = review.pdf_content()
+    try:
+        path = review.pdf_path()
+    except AlthingiException:
+        return HttpResponse("Could not retrieve the review's PDF file.", status=502)
 
-    response = HttpResponse(content, content_type="application/pdf")
+    response = file_response(request, path, "application/pdf")
     response["X-Frame-Options"] = "SAMEORIGIN"
     return response
+
+
+def file_response(request: HttpRequest, path: str, content_type: str):
+    """
+    Streams the file at the given path, supporting conditional requests by
+    ETag and modification time, and requests for a single byte range.
+    """
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        raise Http404
+
+    size = stat.st_size
+    last_modified = int(stat.st_mtime)
+    etag = '"%x-%x"' % (last_modified, size)
+
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is not None:
+        return response
+
+    byte_range = parse_byte_range(request, etag, size)
+    if byte_range is None:
+        response = FileResponse(open(path, "rb"), content_type=content_type)
+    elif byte_range is False:
+        response = HttpResponse(status=416)
+        response["Content-Range"] = "bytes */%d" % size
+    else:
+        start, end = byte_range
+        response = StreamingHttpResponse(
+            read_file_range(path, start, end - start + 1),
+            content_type=content_type,
+            status=206,
+        )
+        response["Content-Length"] = end - start + 1
+        response["Content-Range"] = "bytes %d-%d/%d" % (start, end, size)
+
+    response["Accept-Ranges"] = "bytes"
+    response["ETag"] = etag
+    response["Last-Modified"] = http_date(last_modified)
+    return response
+
+
+def parse_byte_range(request: HttpRequest, etag: str, size: int):
+    """
+    Returns the first and last byte requested by the request's Range header,
+    None if the whole file should be served, or False if the requested range
+    cannot be satisfied. Only single ranges are supported. Requests for
+    multiple ranges, or malformed ones, are served the whole file.
+    """
+    range_header = request.headers.get("Range")
+    if range_header is None:
+        return None
+
+    # The range only applies if the file hasn't changed since the client
+    # last saw it. Otherwise, the whole new file is served.
+    if_range = request.headers.get("If-Range")
+    if if_range is not None and if_range != etag:
+        return None
+
+    match = re.fullmatch(r"bytes=(\d*)-(\d*)", range_header.strip())
+    if match is None or match.groups() == ("", ""):
+        return None
+
+    first, last = match.groups()
+    if first == "":
+        # A suffix range, such as "bytes=-500" for the last 500 bytes.
+        length = min(int(last), size)
+        if length == 0:
+            return False
+        return size - length, size - 1
+
+    start = int(first)
+    end = size - 1 if last == "" else min(int(last), size - 1)
+    if start >= size:
+        return False
+    if end < start:
+        return None
+
+    return start, end
+
+
+def read_file_range(path: str, start: int, length: int):
+    with open(path, "rb") as f:
+        f.seek(start)
+        while length > 0:
+            chunk = f.read(min(FILE_CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
@@ -1,12 +1,22 @@
+import json
 import os
 from cloudscraper import create_scraper
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import as_completed
 from datetime import datetime
+from hashlib import sha256
 from sys import stderr
+from tempfile import NamedTemporaryFile
+from threading import Lock
+from threading import local
+from urllib.parse import urlparse
 
 from lxml import etree
 
 from djalthingi import althingi_settings
 from djalthingi.exceptions import AlthingiException
+from djalthingi.exceptions import RemoteContentException
+from time import monotonic
 from time import sleep
 
 xml_urls = {
@@ -54,92 +64,358 @@ def xml_cache_filename(xml_url_name, *args, **kwargs):
     return filename
 
 
+# Construct the remote URL of an XML document.
+def xml_url(xml_url_name, *args, **kwargs):
+    url = xml_urls[xml_url_name] % args
+
+    if "days" in kwargs and kwargs["days"] is not None:
+        url += "&" if "?" in url else "?"
+        url += "dagar=%d" % kwargs["days"]
+
+    return url
+
+
+# Filename of the metadata stored alongside a cached XML file, used for
+# revalidating it against the remote host.
+def xml_meta_filename(cache_filename):
+    return "%s.meta" % cache_filename
+
+
+def read_xml_meta(cache_filename):
+    meta_filename = xml_meta_filename(cache_filename)
+    if not os.path.isfile(cache_filename) or not os.path.isfile(meta_filename):
+        return {}
+
+    try:
+        with open(meta_filename, "r") as f:
+            return json.load(f)
+    except ValueError:
+        return {}
+
+
+def forget_xml_meta(cache_filename):
+    meta_filename = xml_meta_filename(cache_filename)
+    if os.path.isfile(meta_filename):
+        os.unlink(meta_filename)
+
+
+def fetch_xml_content(cache_filename, url, fetch=None):
+    """
+    Retrieves XML content from the remote host and writes it to the cache.
+    Returns a tuple of the XML content and whether it is unchanged since it
+    was last retrieved.
+
+    When XML_REVALIDATE_CACHE is enabled, the ETag and Last-Modified headers
+    of the response are stored along with a hash of the content, and used for
+    a conditional request the next time around. A document is considered
+    unchanged if the remote host responds with "304 Not Modified", or if its
+    content hash is the same as before, for when the remote host doesn't
+    support conditional requests.
+
+    The `fetch` function defaults to `fetch_response`.
+    """
+    if fetch is None:
+        fetch = fetch_response
+
+    meta = {}
+    headers = {}
+    if althingi_settings.XML_REVALIDATE_CACHE:
+        meta = read_xml_meta(cache_filename)
+        if meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+
+    response = fetch(url, headers=headers)
+
+    if response.status_code == 304:
+        with open(cache_filename, "r", encoding="utf-8") as f:
+            return f.read(), True
+
+    xml_content = response.text
+    content_hash = sha256(xml_content.encode("utf-8")).hexdigest()
+    unchanged = meta.get("hash") == content_hash
+
+    if not unchanged:
+        # Write the XML contents to cache file.
+        write_cache_file(cache_filename, xml_content)
+
+    if althingi_settings.XML_REVALIDATE_CACHE:
+        write_cache_file(
+            xml_meta_filename(cache_filename),
+            json.dumps(
+                {
+                    "etag": response.headers.get("ETag"),
+                    "last_modified": response.headers.get("Last-Modified"),
+                    "hash": content_hash,
+                }
+            ),
+        )
+
+    return xml_content, unchanged
+
+
+# Write a file to the XML cache. It's written to a temporary file first and
+# then moved in place, so that other threads and worker processes reading
+# the cache never see a partially written file.
+def write_cache_file(filename, content):
+    with NamedTemporaryFile(
+        "w",
+        encoding="utf-8",
+        dir=os.path.dirname(filename),
+        prefix="%s." % os.path.basename(filename),
+        suffix=".tmp",
+        delete=False,
+    ) as f:
+        try:
+            f.write(content)
+        except BaseException:
+            f.close()
+            os.remove(f.name)
+            raise
+    os.replace(f.name, filename)
+
+
+"""
+prefetched_xml
+--------------
+Cache filenames of XML documents that have been retrieved by `prefetch_xml`
+but not yet consumed by `get_xml`, mapped to whether they were unchanged. A
+prefetched document is read from its cache file exactly once regardless of
+the XML_USE_CACHE setting, after which `get_xml` goes back to its normal
+behavior for that document.
+"""
+prefetched_xml = {}
+
+
+# Retrieve a listing of XML documents concurrently, so that a subsequent
+# sequential processing of them with `get_xml` does not have to wait for each
+# of them in turn. Each item in `args_list` is the argument tuple (or a single
+# argument) that would otherwise be given to `get_xml`.
+def prefetch_xml(xml_url_name, args_list, **kwargs):
+
+    jobs = {}
+    for args in args_list:
+        if not isinstance(args, tuple):
+            args = (args,)
+
+        cache_filename = xml_cache_filename(xml_url_name, *args, **kwargs)
+        if cache_filename in prefetched_xml or cache_filename in jobs:
+            continue
+        if althingi_settings.XML_USE_CACHE and os.path.isfile(cache_filename):
+            continue
+
+        jobs[cache_filename] = xml_url(xml_url_name, *args, **kwargs)
+
+    # Nothing to gain from a thread pool in these cases. The documents will
+    # simply be retrieved one by one by `get_xml`.
+    if althingi_settings.XML_FETCH_WORKERS < 2 or len(jobs) < 2:
+        return
+
+    if not os.path.isdir(althingi_settings.XML_CACHE_DIR):
+        os.makedirs(althingi_settings.XML_CACHE_DIR)
+
+    print("Prefetching %d XML documents: %s" % (len(jobs), xml_url_name))
+
+    def fetch_to_cache(cache_filename, url):
+        xml_content, unchanged = fetch_xml_content(
+            cache_filename, url, fetch=fetch_response
+        )
+        return unchanged
+
+    executor = get_fetch_executor()
+    futures = {
+        executor.submit(fetch_to_cache, cache_filename, url): cache_filename
+        for cache_filename, url in jobs.items()
+    }
+    for future in as_completed(futures):
+        try:
+            prefetched_xml[futures[future]] = future.result()
+        except AlthingiException as ex:
+            # Not fatal here. The document will be retrieved again by
+            # `get_xml` when it's needed, which fails properly if needed.
+            print("Prefetching failed: %s" % ex, file=stderr)
+
+
+# Digest of parsed XML, for detecting whether it has changed since some
+# earlier point in time.
+def xml_digest(xml):
+    return sha256(etree.tostring(xml, encoding="utf-8")).hexdigest()
+
+
+# Retrieve XML into the cache and return the cache filename, without parsing
+# it into memory. Used for streaming large XML documents with `iter_xml_file`.
+def get_xml_file(xml_url_name, *args, **kwargs):
+
+    cache_filename = xml_cache_filename(xml_url_name, *args, **kwargs)
+    url = xml_url(xml_url_name, *args, **kwargs)
+
+    if not os.path.isdir(althingi_settings.XML_CACHE_DIR):
+        os.makedirs(althingi_settings.XML_CACHE_DIR)
+
+    # Like `get_xml`, we'll try a couple of times in case we get an error
+    # document instead of XML. The file is checked before it's handed over,
+    # so that streaming it doesn't fail halfway through processing.
+    tries = 2
+    while True:
+        if cache_filename in prefetched_xml:
+            prefetched_xml.pop(cache_filename)
+        elif not (althingi_settings.XML_USE_CACHE and os.path.isfile(cache_filename)):
+            fetch_xml_content(cache_filename, url)
+
+        try:
+            check_xml_file(cache_filename)
+            return cache_filename
+        except etree.XMLSyntaxError as ex:
+            with open(cache_filename, "r", encoding="utf-8", errors="replace") as f:
+                xml_content = f.read()
+
+            # The invalid file must neither be revalidated as unchanged nor
+            # used as a cached copy.
+            forget_xml_meta(cache_filename)
+            os.unlink(cache_filename)
+
+            tries -= 1
+            if tries > 0:
+                sleep(2)
+                continue
+
+            raise_invalid_xml(ex, cache_filename, url, xml_content)
+
+
+# Check that an XML file is well-formed, raising an `etree.XMLSyntaxError`
+# if it's not, without holding the entire document in memory.
+def check_xml_file(filename):
+    for event, element in etree.iterparse(filename, events=("end",)):
+        element.clear()
+
+
+# Iterate through the elements with the given tag in an XML file, without
+# ever holding the entire document in memory. Each element is cleared after
+# it has been processed, along with its preceding siblings, so elements must
+# not be used outside of the iteration in which they are yielded.
+def iter_xml_file(filename, tag):
+    try:
+        for event, element in etree.iterparse(filename, events=("end",), tag=tag):
+            yield element
+
+            element.clear()
+            while element.getprevious() is not None:
+                del element.getparent()[0]
+
+    except etree.XMLSyntaxError:
+        # Make sure that the invalid content doesn't get revalidated as
+        # unchanged next time.
+        forget_xml_meta(filename)
+        raise
+
+
+# Streaming counterpart of `get_xml` for large listings, yielding the
+# elements with the given tag, for example "ræða" in "SPEECHES_URL".
+def iter_xml(xml_url_name, tag, *args, **kwargs):
+    return iter_xml_file(get_xml_file(xml_url_name, *args, **kwargs), tag)
+
+
 # Retrieve XML and cache it
 def get_xml(xml_url_name, *args, **kwargs):
 
+    cache_filename = xml_cache_filename(xml_url_name, *args, **kwargs)
+
     def get_xml_content():
         """
         Internal function to abstract the cache away.
         """
-        cache_filename = xml_cache_filename(xml_url_name, *args, **kwargs)
-
         if not os.path.isdir(althingi_settings.XML_CACHE_DIR):
             os.makedirs(althingi_settings.XML_CACHE_DIR)
 
+        # Prefetched documents are only used once, so that retries after
+        # invalid XML get a fresh copy from the remote host.
+        if cache_filename in prefetched_xml:
+            prefetched_xml.pop(cache_filename)
+            with open(cache_filename, "r", encoding="utf-8") as f:
+                return f.read()
+
         if althingi_settings.XML_USE_CACHE and os.path.isfile(cache_filename):
-            with open(cache_filename, "r") as f:
+            with open(cache_filename, "r", encoding="utf-8") as f:
                 xml_content = f.read()
                 f.close()
 
-        else:
-            url = xml_urls[xml_url_name] % args
-
-            if "days" in kwargs and kwargs["days"] is not None:
-                url += "&" if "?" in url else "?"
-                url += "dagar=%d" % kwargs["days"]
-
-            response = get_response(url)
-            xml_content = response.text
+            return xml_content
 
-            # Write the XML contents to cache file.
-            with open(cache_filename, "w") as f:
-                f.write(xml_content)
-                f.close()
+        else:
+            url = xml_url(xml_url_name, *args, **kwargs)
 
+            xml_content, unchanged = fetch_xml_content(cache_filename, url)
             return xml_content
 
     # We sporadically get some kind of error document that makes no sense in
     # an XML context, instead of the XML content we expect. So we'll try a
     # couple of times.
     tries = 2
-    while tries > 0:
+    while True:
         try:
             xml_content = get_xml_content()
             result = etree.fromstring(xml_content.encode("utf-8"))
             return result
         except etree.XMLSyntaxError as ex:
 
+            # Make sure that the invalid content doesn't get revalidated as
+            # unchanged, or read from the cache, when we try again.
+            forget_xml_meta(cache_filename)
+            if os.path.isfile(cache_filename):
+                os.unlink(cache_filename)
+
+            tries -= 1
             if tries > 0:
                 # Sleeping for an arbitrary amount of time, hoping that the
                 # error goes away in the meantime.
                 sleep(2)
-                tries -= 1
                 continue
 
-            # List of strings of errors that we would like to suppress because we
-            # already know that we're not going to do anything about them.
-            suppressed_errors = [
-                # Random/unknown errors on XML provider's side are shown as HTML,
-                # not XML. This happens sporadically and there's nothing we can do
-                # about it except try again.
-                "Entity 'THORN' not defined",
-            ]
-            for suppressed_error in suppressed_errors:
-                if suppressed_error in ex.msg:
-                    print(
-                        "Known but unspecified, unrecoverable error received from remote host. Quitting."
-                    )
-                    quit()
+            raise_invalid_xml(
+                ex, cache_filename, xml_url(xml_url_name, *args, **kwargs), xml_content
+            )
 
-            # When XML breaks, we'll want to save the document so that it can be
-            # researched by whoever receives notification of the error. Optional
-            # and configurable through settings variable.
-            if althingi_settings.XML_SAVE_INVALID:
 
-                if not os.path.isdir(althingi_settings.XML_ERROR_DIR):
-                    os.makedirs(althingi_settings.XML_ERROR_DIR)
-
-                filename = "%s.%s" % (
-                    datetime.now().strftime("%Y-%m-%d.%H-%M-%S"),
-                    os.path.basename(cache_filename),
-                )
-                with open(
-                    os.path.join(althingi_settings.XML_ERROR_DIR, filename), "w"
-                ) as f:
-                    f.write(xml_content)
-
-            # Pass on exception so that it gets caught by runtime environment.
-            raise
+def raise_invalid_xml(ex, cache_filename, url, xml_content):
+    """
+    Raises an appropriate exception for XML content that could not be
+    parsed, after all attempts at retrieving it have failed.
+    """
+
+    # List of strings of errors that we would like to suppress because we
+    # already know that we're not going to do anything about them.
+    suppressed_errors = [
+        # Random/unknown errors on XML provider's side are shown as HTML,
+        # not XML. This happens sporadically and there's nothing we can do
+        # about it except try again.
+        "Entity 'THORN' not defined",
+    ]
+    for suppressed_error in suppressed_errors:
+        if suppressed_error in ex.msg:
+            raise RemoteContentException(
+                "Known but unspecified, unrecoverable error received from remote host: %s"
+                % url,
+                url,
+            ) from ex
+
+    # When XML breaks, we'll want to save the document so that it can be
+    # researched by whoever receives notification of the error. Optional
+    # and configurable through settings variable.
+    if althingi_settings.XML_SAVE_INVALID:
+
+        if not os.path.isdir(althingi_settings.XML_ERROR_DIR):
+            os.makedirs(althingi_settings.XML_ERROR_DIR)
+
+        filename = "%s.%s" % (
+            datetime.now().strftime("%Y-%m-%d.%H-%M-%S"),
+            os.path.basename(cache_filename),
+        )
+        with open(os.path.join(althingi_settings.XML_ERROR_DIR, filename), "w") as f:
+            f.write(xml_content)
+
+    # Pass on exception so that it gets caught by runtime environment.
+    raise ex
 
 
 # Clear XML cache.
@@ -150,19 +426,103 @@ def clear_xml_cache():
             os.unlink(fullpath)
 
 
-def get_response(web_url):
-    scraper = create_scraper()
+"""
+Remote connections
+------------------
+Scrapers are kept per thread, so that connections to the remote host are
+pooled and kept alive between requests instead of a new session being set up
+for every single document, while still being safe to use from the threads of
+`prefetch_xml`. Those threads belong to a single pool that lives as long as
+the process, so that their scrapers are reused by every call to it.
+
+A forked process, such as a worker of `update_althingi`, starts with neither
+threads nor scrapers, instead of sharing the connections of its parent.
+
+Requests to each host are spaced according to XML_FETCH_RATE_LIMIT, across
+all threads, so that concurrency does not translate into hammering the
+remote host.
+"""
+scrapers = local()
+
+
+fetch_executor = None
+
+
+def get_scraper():
+    if not hasattr(scrapers, "scraper"):
+        scrapers.scraper = create_scraper()
+    return scrapers.scraper
+
+
+def get_fetch_executor():
+    global fetch_executor
+    if fetch_executor is None:
+        fetch_executor = ThreadPoolExecutor(
+            max_workers=althingi_settings.XML_FETCH_WORKERS,
+            thread_name_prefix="fetch_xml",
+        )
+    return fetch_executor
+
+
+def forget_connections():
+    global fetch_executor, scrapers
+    fetch_executor = None
+    scrapers = local()
+
+
+os.register_at_fork(after_in_child=forget_connections)
+
+
+class HostRateLimiter:
+    def __init__(self):
+        self.lock = Lock()
+        self.next_slots = {}
+
+    def wait(self, url):
+        rate_limit = althingi_settings.XML_FETCH_RATE_LIMIT
+        if not rate_limit:
+            return
+
+        host = urlparse(url).netloc
+
+        # Reserve the next available slot for the host and sleep outside the
+        # lock until it arrives.
+        with self.lock:
+            now = monotonic()
+            slot = max(now, self.next_slots.get(host, now))
+            self.next_slots[host] = slot + 1.0 / rate_limit
+
+        if slot > now:
+            sleep(slot - now)
+
+
+rate_limiter = HostRateLimiter()
+
+
+def fetch_response(web_url, headers=None):
+    """
+    Retrieves the given URL, retrying a few times before raising a
+    RemoteContentException. Safe to use from multiple threads.
+
+    If request headers are given, they are assumed to be conditional, and a
+    "304 Not Modified" response is accepted as well.
+    """
+    scraper = get_scraper()
 
     retry_count = 5
 
-    success = False
-    while not success and retry_count > -1:
+    while retry_count > -1:
         try:
+            rate_limiter.wait(web_url)
+
             response = scraper.get(
                 web_url,
+                headers=headers,
                 timeout=althingi_settings.REMOTE_CONTENT_TIMEOUT,
             )
-            success = True
+
+            if response.status_code == 304 and headers:
+                return response
 
             if response.status_code != 200:
                 raise AlthingiException(
@@ -172,7 +532,7 @@ def get_response(web_url):
                     )
                 )
 
-            scraper.close()
+            return response
         except (AlthingiException, IOError):
             print("Retrieving remote content failed, retries left: %s..." % retry_count)
             retry_count = retry_count - 1
@@ -180,8 +540,4 @@ def get_response(web_url):
             # Waiting a bit before trying again.
             sleep(2)
 
-    if success:
-        return response
-    else:
-        print("Error: Failed retrieving URL: %s" % web_url, file=stderr)
-        quit(1)
+    raise RemoteContentException("Failed retrieving URL: %s" % web_url, web_url)
@@ -0,0 +1,195 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.core.management.base import CommandError
+from django.db import transaction
+
+from sys import stdout
+
+from djalthingi.models import Issue
+from djalthingi.models import Parliament
+
+from core.models import IssueMonitor
+from core.models import Subscription
+
+from dossier.models import Dossier
+from dossier.models import DossierStatistic
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuilds dossier statistics from the dossiers they count, for a"
+        " parliament, a user or the whole database. Intended for use after"
+        " fixing data, for example with `move_dossiers` or"
+        " `cleanup_duplicate_dossiers`."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("parliament_num", nargs="?", type=int)
+        parser.add_argument(
+            "--user",
+            help="Only rebuild the statistics of the user with this username.",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Show the changes that would be made without saving them.",
+        )
+
+    def handle(self, *args, **options):
+        parliament_num = options["parliament_num"]
+        username = options["user"]
+        dry_run = options["dry_run"]
+
+        stats = DossierStatistic.objects.all()
+        dossiers = Dossier.objects.all()
+        monitors = IssueMonitor.objects.all()
+        subscriptions = Subscription.objects.all()
+
+        if username is not None:
+            try:
+                user = User.objects.get(username=username)
+            except User.DoesNotExist:
+                raise CommandError('User "%s" does not exist' % username)
+
+            stats = stats.filter(user_id=user.id)
+            dossiers = dossiers.filter(user_id=user.id)
+            monitors = monitors.filter(user_id=user.id)
+            subscriptions = subscriptions.filter(user_id=user.id)
+
+        # Statistics are rebuilt one parliament at a time, to keep memory
+        # usage in check when rebuilding the whole database.
+        parliaments = Parliament.objects.order_by("parliament_num")
+        if parliament_num is not None:
+            parliaments = parliaments.filter(parliament_num=parliament_num)
+            if not parliaments.exists():
+                raise CommandError("Parliament %d does not exist" % parliament_num)
+
+        stat_count = 0
+        changed_count = 0
+        created_count = 0
+        for parliament in parliaments:
+            (
+                parliament_stat_count,
+                parliament_changed_count,
+                parliament_created_count,
+            ) = self.rebuild(
+                parliament,
+                stats.filter(issue__parliament_id=parliament.id),
+                dossiers.filter(issue__parliament_id=parliament.id),
+                monitors.filter(issue__parliament_id=parliament.id),
+                subscriptions,
+                dry_run,
+            )
+            stat_count += parliament_stat_count
+            changed_count += parliament_changed_count
+            created_count += parliament_created_count
+
+        stdout.write(
+            "%s %d of %d dossier statistics.\n"
+            % ("Would change" if dry_run else "Changed", changed_count, stat_count)
+        )
+        stdout.write(
+            "%s %d missing dossier statistics.\n"
+            % ("Would create" if dry_run else "Created", created_count)
+        )
+
+    def rebuild(self, parliament, stats, dossiers, monitors, subscriptions, dry_run):
+        """
+        Rebuilds the given statistics of a parliament from the given
+        dossiers, creating those that are missing for users who have
+        dossiers in an issue. Returns a tuple of the number of existing
+        statistics, the number of changed ones and the number of created
+        ones.
+        """
+        counter_fields = DossierStatistic.counter_fields()
+        update_fields = counter_fields + ["has_useful_info"]
+
+        stat_list = list(stats.select_related("user", "issue"))
+        counts = DossierStatistic.count_dossiers(dossiers)
+
+        missing_keys = set(counts) - {
+            (stat.issue_id, stat.user_id) for stat in stat_list
+        }
+        issues = Issue.objects.in_bulk({issue_id for issue_id, user_id in missing_keys})
+        users = User.objects.in_bulk({user_id for issue_id, user_id in missing_keys})
+        new_stats = [
+            DossierStatistic(issue=issues[issue_id], user=users[user_id])
+            for issue_id, user_id in sorted(missing_keys)
+        ]
+
+        if not stat_list and not new_stats:
+            return 0, 0, 0
+
+        # Monitors and subscriptions are needed for determining whether
+        # statistics have useful information.
+        monitored = set(monitors.values_list("user_id", "issue_id"))
+        subscribed = set(
+            subscriptions.filter(
+                committee__issues__parliament_id=parliament.id
+            ).values_list("user_id", "committee__issues__id")
+        ) | set(
+            subscriptions.filter(
+                category__issues__parliament_id=parliament.id
+            ).values_list("user_id", "category__issues__id")
+        )
+
+        changed_stats = []
+        for stat in stat_list + new_stats:
+            key = (stat.issue_id, stat.user_id)
+            old_values = {field: getattr(stat, field) for field in update_fields}
+
+            new_counts = dict.fromkeys(counter_fields, 0)
+            new_counts.update(counts.get(key, {}))
+            for field, count in new_counts.items():
+                setattr(stat, field, count)
+
+            stat.update_has_useful_info(
+                is_monitored=(stat.user_id, stat.issue_id) in monitored,
+                is_subscribed=(stat.user_id, stat.issue_id) in subscribed,
+            )
+
+            if stat._state.adding:
+                if dry_run:
+                    stdout.write(
+                        "%s, issue %d/%d: missing\n"
+                        % (stat.user, stat.issue.issue_num, parliament.parliament_num)
+                    )
+                continue
+
+            changes = [
+                (field, old_value, getattr(stat, field))
+                for field, old_value in old_values.items()
+                if getattr(stat, field) != old_value
+            ]
+            if not changes:
+                continue
+
+            changed_stats.append(stat)
+
+            if dry_run:
+                for field, old_value, new_value in changes:
+                    stdout.write(
+                        "%s, issue %d/%d: %s %s -> %s\n"
+                        % (
+                            stat.user,
+                            stat.issue.issue_num,
+                            parliament.parliament_num,
+                            field,
+                            old_value,
+                            new_value,
+                        )
+                    )
+
+        if not dry_run:
+            with transaction.atomic():
+                DossierStatistic.objects.bulk_update(
+                    changed_stats, update_fields, batch_size=500
+                )
+                DossierStatistic.objects.bulk_create(new_stats, batch_size=500)
+
+                # Seen counts are not derived from the user's dossiers
+                # alone, so they are recalculated separately, including
+                # those of the created statistics.
+                stats.update_seen_counts()
+
+        return len(stat_list), len(changed_stats), len(new_stats)
@@ -0,0 +1,68 @@
+from django.core.management.base import BaseCommand
+from django.core.management.base import CommandError
+
+from sys import stdout
+
+from dossier.models import DossierStatistic
+
+
+class Command(BaseCommand):
+    help = (
+        "Verifies that the counters of dossier statistics, which are"
+        " incremented and decremented as dossiers change, match a full"
+        " recount of the dossiers."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("parliament_num", nargs="?", type=int)
+        parser.add_argument(
+            "--fix",
+            action="store_true",
+            help="Save the recounted values of statistics that do not match.",
+        )
+
+    def handle(self, *args, **options):
+        parliament_num = options["parliament_num"]
+        fix = options["fix"]
+
+        stats = DossierStatistic.objects.select_related("user", "issue__parliament")
+        if parliament_num is not None:
+            stats = stats.filter(issue__parliament__parliament_num=parliament_num)
+
+        stat_count = 0
+        mismatch_count = 0
+        for stat in stats.order_by("issue_id", "user_id").iterator():
+            stat_count += 1
+
+            mismatches = {
+                field: count
+                for field, count in stat.recount().items()
+                if getattr(stat, field) != count
+            }
+            if not mismatches:
+                continue
+
+            mismatch_count += 1
+            for field, count in mismatches.items():
+                stdout.write(
+                    "%s, issue %d/%d: %s is %d but should be %d\n"
+                    % (
+                        stat.user,
+                        stat.issue.issue_num,
+                        stat.issue.parliament.parliament_num,
+                        field,
+                        getattr(stat, field),
+                        count,
+                    )
+                )
+
+            if fix:
+                stat.update_stats_quite_inefficiently_please(show_output=False)
+
+        stdout.write(
+            "Verified %d dossier statistics, %d of which did not match.\n"
+            % (stat_count, mismatch_count)
+        )
+
+        if mismatch_count and not fix:
+            raise CommandError("Dossier statistics do not match a full recount.")
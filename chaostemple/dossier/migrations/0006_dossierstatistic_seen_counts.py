@@ -0,0 +1,79 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:56
+
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models import Q
+
+
+def calculate_seen_counts(apps, schema_editor):
+    # Mirrors `DossierManager.seen_by` and `DossierStatistic.update_seen_counts`,
+    # which are not available on historical models.
+    Access = apps.get_model("core", "Access")
+    Dossier = apps.get_model("dossier", "Dossier")
+    DossierStatistic = apps.get_model("dossier", "DossierStatistic")
+    UserProfile = apps.get_model("core", "UserProfile")
+
+    user_ids = DossierStatistic.objects.values_list("user_id", flat=True).distinct()
+    for userprofile in UserProfile.objects.filter(user_id__in=user_ids):
+        user = userprofile.user
+
+        conditions = Q(user_id=user.id)
+        if userprofile.setting_seen_if_worked_by_others:
+            accesses = Access.objects.prefetch_related("issues").filter(
+                Q(friend_id=user.id, friend_group_id=None)
+                | Q(friend_group__in=user.groups.all(), friend_id=None)
+            )
+            visible_conditions = Q(
+                user_id__in=[a.user_id for a in accesses if a.full_access]
+            )
+            for partial_access in [a for a in accesses if not a.full_access]:
+                visible_conditions |= Q(
+                    user_id=partial_access.user_id,
+                    issue_id__in=[i.id for i in partial_access.issues.all()],
+                )
+            conditions |= visible_conditions & Q(is_useful=True)
+
+        seen_counts = {
+            c["issue_id"]: c
+            for c in Dossier.objects.filter(conditions)
+            .values("issue_id")
+            .annotate(
+                documents=Count("document", distinct=True),
+                reviews=Count("review", distinct=True),
+            )
+        }
+
+        stats = list(
+            DossierStatistic.objects.filter(
+                user_id=user.id, issue_id__in=seen_counts.keys()
+            )
+        )
+        for stat in stats:
+            stat.seen_document_count = seen_counts[stat.issue_id]["documents"]
+            stat.seen_review_count = seen_counts[stat.issue_id]["reviews"]
+
+        DossierStatistic.objects.bulk_update(
+            stats, ["seen_document_count", "seen_review_count"], batch_size=500
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0018_userprofile_setting_seen_if_worked_by_others"),
+        ("dossier", "0005_auto_20200329_2242"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="dossierstatistic",
+            name="seen_document_count",
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="dossierstatistic",
+            name="seen_review_count",
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(calculate_seen_counts, migrations.RunPython.noop),
+    ]
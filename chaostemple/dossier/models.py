@@ -1,5 +1,6 @@
 import re
 
+from core.extravars import invalidate_user
 from core.models import AccessUtilities
 from core.models import Subscription
 
@@ -43,25 +44,9 @@ class DossierManager(models.Manager):
             )
         """
 
-        # Get access objects and sort them
-        accesses = {"partial": [], "full": []}
-        for access in AccessUtilities.get_access():
-            accesses["full" if access.full_access else "partial"].append(access)
-
-        visible_user_ids = [a.user_id for a in accesses["full"]]
-
-        partial_conditions = []
-        for partial_access in accesses["partial"]:
-            for partial_issue in partial_access.issues.all():
-                partial_conditions.append(
-                    Q(user_id=partial_access.user_id) & Q(issue_id=partial_issue.id)
-                )
-
-        # Add dossiers from users who have given full access
-        filter_params = Q(user_id__in=visible_user_ids) | Q(user_id=user.id)
-        # Add dossiers from users who have given access to this particular issue
-        if len(partial_conditions) > 0:
-            filter_params.add(Q(reduce(operator.or_, partial_conditions)), Q.OR)
+        # Dossiers of the user and those given access to by other users,
+        # either fully or to particular issues.
+        filter_params = AccessUtilities.get_access_filter()
 
         # Add prefetch query but leave out useless information from other users
         visible_dossiers = (
@@ -86,6 +71,101 @@ class DossierManager(models.Manager):
 
         return visible_dossiers
 
+    def seen_by(self, user):
+        """
+        Filters dossiers that count toward documents and reviews being seen
+        by the given user. Those are the user's own dossiers, along with the
+        useful dossiers visible to the user if the user has the setting
+        `setting_seen_if_worked_by_others` enabled.
+
+        Unlike `by_user`, this works for any user and not only the one
+        currently logged in.
+        """
+        conditions = Q(user_id=user.id)
+
+        if user.userprofile.setting_seen_if_worked_by_others:
+            Access = apps.get_model("core", "Access")
+            accesses = Access.objects.prefetch_related("issues").filter(
+                Q(friend_id=user.id, friend_group_id=None)
+                | Q(friend_group__in=user.groups.all(), friend_id=None)
+            )
+
+            visible_conditions = Q(
+                user_id__in=[a.user_id for a in accesses if a.full_access]
+            )
+            for partial_access in [a for a in accesses if not a.full_access]:
+                visible_conditions |= Q(
+                    user_id=partial_access.user_id,
+                    issue_id__in=[i.id for i in partial_access.issues.all()],
+                )
+
+            conditions |= visible_conditions & Q(is_useful=True)
+
+        return self.filter(conditions)
+
+
+class DossierStatisticQuerySet(models.QuerySet):
+
+    def apply_deltas(self, issue_id, user_id, deltas):
+        """
+        Atomically applies the given changes to the counters of a user's
+        statistic for an issue, and returns a tuple of the updated statistic
+        and whether it was created. A statistic that does not exist yet is
+        created by counting the user's dossiers instead.
+
+        The counters are updated in the database, so concurrent changes are
+        not lost. The statistic's other fields are derived from them and
+        should be saved afterwards with `DossierStatistic.DERIVED_FIELDS`.
+        """
+        statistics = self.filter(issue_id=issue_id, user_id=user_id)
+
+        if deltas:
+            statistics.update(
+                **{field: F(field) + delta for field, delta in deltas.items()}
+            )
+
+        statistic = statistics.select_related("user__userprofile").first()
+        if statistic is None:
+            statistic = DossierStatistic(issue_id=issue_id, user_id=user_id)
+            statistic.update_stats_quite_inefficiently_please(show_output=False)
+            return statistic, True
+
+        return statistic, False
+
+    def update_seen_counts(self):
+        """
+        Recalculates `seen_document_count` and `seen_review_count` for the
+        statistics in the query set, with a single query per user.
+        """
+        stats_by_user = {}
+        for stat in self.select_related("user__userprofile"):
+            stats_by_user.setdefault(stat.user, []).append(stat)
+
+        for user, stats in stats_by_user.items():
+            seen_counts = {
+                c["issue_id"]: c
+                for c in Dossier.objects.seen_by(user)
+                .filter(issue_id__in=[stat.issue_id for stat in stats])
+                .values("issue_id")
+                .annotate(
+                    documents=Count("document", distinct=True),
+                    reviews=Count("review", distinct=True),
+                )
+            }
+
+            for stat in stats:
+                counts = seen_counts.get(stat.issue_id, {"documents": 0, "reviews": 0})
+                stat.seen_document_count = counts["documents"]
+                stat.seen_review_count = counts["reviews"]
+
+            DossierStatistic.objects.bulk_update(
+                stats, ["seen_document_count", "seen_review_count"]
+            )
+
+            # Bulk updates send no signals, so the user's cached news must be
+            # invalidated explicitly.
+            invalidate_user(user.id)
+
 
 class Dossier(models.Model):
     objects = DossierManager()
@@ -183,63 +263,64 @@ class Dossier(models.Model):
 
     is_useful = models.BooleanField(default=False)
 
-    def update_statistic(self, statistic, field, old_value, new_value):
-        # Short-hands
-        issue_id = self.issue_id
-        user_id = self.user_id
-        dossier_type = self.dossier_type
-
-        exclude_kwargs = {}  # Will be empty and without effect if nothing is excluded
-        excluded_doc_types = []
-        if dossier_type == "document":
-            for doc_type in Dossier.DOC_TYPE_EXCLUSIONS:
-                if field in Dossier.DOC_TYPE_EXCLUSIONS[doc_type]:
-                    excluded_doc_types += [doc_type]
-        if len(excluded_doc_types):
-            exclude_kwargs.update({"document__doc_type__in": excluded_doc_types})
-
-        if old_value is not None:
-            statistic_field = "%s_%s_%s" % (dossier_type, field, old_value)
-            if hasattr(statistic, statistic_field):
-                kwargs = {
-                    "issue_id": issue_id,
-                    "user_id": user_id,
-                    "dossier_type": dossier_type,
-                    field: old_value,
-                }
-                count = (
-                    Dossier.objects.filter(**kwargs).exclude(**exclude_kwargs).count()
-                )
-                setattr(statistic, statistic_field, count)
-
-        if new_value is not None:
-            statistic_field = "%s_%s_%s" % (dossier_type, field, new_value)
-            if hasattr(statistic, statistic_field):
-                kwargs = {
-                    "issue_id": issue_id,
-                    "user_id": user_id,
-                    "dossier_type": dossier_type,
-                    field: new_value,
-                }
-                count = (
-                    Dossier.objects.filter(**kwargs).exclude(**exclude_kwargs).count()
-                )
-                setattr(statistic, statistic_field, count)
+    def statistic_deltas(self, old_values, new_values):
+        """
+        Returns the changes to the counters of the user's DossierStatistic
+        for the issue, as a dictionary keyed by counter, when this dossier's
+        status fields change from the old values to the new ones. A missing
+        value means that the dossier does not count toward the status field,
+        as is the case before it is created and after it is deleted.
+        """
+        if self.dossier_type == "document":
+            doc_type = self.document.doc_type
+        else:
+            doc_type = None
 
-    def update_counts(self, statistic, dossier_type):
-        # Son, never trust an input value that doesn't drink.
-        if dossier_type not in dict(self.DOSSIER_TYPES).keys():
-            return
+        deltas = {}
+        for status_type, status_type_name in Dossier.STATUS_TYPES:
+            old_value = old_values.get(status_type)
+            new_value = new_values.get(status_type)
+
+            if old_value == new_value:
+                continue
+
+            # Some document types are excluded from some statistics.
+            if not Dossier.fieldstate_applicable(doc_type, status_type):
+                continue
+
+            for value, delta in [(old_value, -1), (new_value, 1)]:
+                statistic_field = "%s_%s_%s" % (self.dossier_type, status_type, value)
+                if value is not None and hasattr(DossierStatistic, statistic_field):
+                    deltas[statistic_field] = deltas.get(statistic_field, 0) + delta
+
+        return {field: delta for field, delta in deltas.items() if delta != 0}
+
+    def update_seen_counts_of_others(self):
+        """
+        Updates the seen counts of other users who have access to this
+        dossier and count it as seen. Only needed when the dossier's
+        usefulness changes, because only useful dossiers are visible to
+        other users.
+        """
+        Access = apps.get_model("core", "Access")
+        accesses = Access.objects.filter(
+            Q(full_access=True) | Q(issues__id=self.issue_id), user_id=self.user_id
+        )
 
-        count = Dossier.objects.filter(
-            issue_id=self.issue_id, user_id=self.user_id, dossier_type=dossier_type
-        ).count()
-        setattr(statistic, "%s_count" % dossier_type, count)
+        DossierStatistic.objects.filter(
+            Q(user__friend_access__in=accesses)
+            | Q(user__groups__friend_group_access__in=accesses),
+            issue_id=self.issue_id,
+            user__userprofile__setting_seen_if_worked_by_others=True,
+        ).exclude(user_id=self.user_id).distinct().update_seen_counts()
 
     def save(self, input_statistic=None, *args, **kwargs):
         # Check if dossier is new.
         new = self.pk is None
 
+        # Other users may see this dossier depending on its usefulness.
+        was_useful = self.is_useful and not new
+
         # Auto-fill issue_id and denote dossier type.
         if self.document_id:
             self.issue_id = self.document.issue_id
@@ -285,40 +366,59 @@ class Dossier(models.Model):
         # Make sure that standard stuff happens.
         super(Dossier, self).save(*args, **kwargs)
 
-        # Treat DossierStatistic.
-        if input_statistic is None:
-            statistic, created = DossierStatistic.objects.get_or_create(
-                issue_id=self.issue_id, user_id=self.user_id
-            )
+        # Treat DossierStatistic. Rather than counting dossiers again, the
+        # counters affected by the change are incremented and decremented.
+        status_values = {field: getattr(self, field) for field in self.tracker.fields}
+        if new:
+            deltas = self.statistic_deltas({}, status_values)
+            deltas["%s_count" % self.dossier_type] = 1
         else:
-            statistic = input_statistic
+            deltas = self.statistic_deltas(
+                changed, {field: status_values[field] for field in changed}
+            )
 
-        for field, old_value in changed.items():
-            self.update_statistic(statistic, field, old_value, getattr(self, field))
+        usefulness_changed = self.is_useful != was_useful
 
-        if new:
-            self.update_counts(statistic, self.dossier_type)
+        if input_statistic is not None:
+            statistic = input_statistic
+            created = False
+            for field, delta in deltas.items():
+                setattr(statistic, field, getattr(statistic, field) + delta)
+        elif deltas or usefulness_changed:
+            statistic, created = DossierStatistic.objects.apply_deltas(
+                self.issue_id, self.user_id, deltas
+            )
+        else:
+            # Nothing that the statistic reflects has changed.
+            return
+
+        # The user's own dossiers count as seen regardless of usefulness, but
+        # other users only see useful ones.
+        if new and not created:
+            statistic.update_seen_counts()
+        if usefulness_changed:
+            self.update_seen_counts_of_others()
 
-        if input_statistic is None:
-            statistic.save()
+        if input_statistic is None and not created:
+            statistic.save(update_fields=DossierStatistic.DERIVED_FIELDS)
 
     def delete(self):
-        statistic = DossierStatistic.objects.get(
-            issue_id=self.issue_id, user_id=self.user_id
+        deltas = self.statistic_deltas(
+            {field: self.tracker.previous(field) for field in self.tracker.fields}, {}
         )
-        dossier_type = self.dossier_type
+        deltas["%s_count" % self.dossier_type] = -1
 
         super(Dossier, self).delete()
 
-        dossier_count = Dossier.objects.filter(
-            issue_id=self.issue_id, user_id=self.user_id
-        ).count()
-
-        for field in self.tracker.fields:
-            self.update_statistic(statistic, field, getattr(self, field), None)
-        self.update_counts(statistic, dossier_type)
+        statistic, created = DossierStatistic.objects.apply_deltas(
+            self.issue_id, self.user_id, deltas
+        )
+        if not created:
+            statistic.update_seen_counts()
+            statistic.save(update_fields=DossierStatistic.DERIVED_FIELDS)
 
-        statistic.save()
+        if self.is_useful:
+            self.update_seen_counts_of_others()
 
     @staticmethod
     def fieldstate_applicable(doc_type, fieldstate):
@@ -330,6 +430,8 @@ class Dossier(models.Model):
 
 
 class DossierStatistic(models.Model):
+    objects = DossierStatisticQuerySet.as_manager()
+
     issue = models.ForeignKey(Issue, on_delete=CASCADE)
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL, related_name="dossier_statistics", on_delete=CASCADE
@@ -376,10 +478,35 @@ class DossierStatistic(models.Model):
 
     review_count = models.IntegerField(default=0)
 
+    # Number of the issue's documents and reviews that the user has seen,
+    # which may include those worked on by others. See `Dossier.seen_by`.
+    # Used for determining the number of new documents and reviews without
+    # counting dossiers on every request. See `IssueQuerySet.annotate_news`.
+    seen_document_count = models.IntegerField(default=0)
+    seen_review_count = models.IntegerField(default=0)
+
+    # Fields that are derived from the counters above or from other data,
+    # rather than incremented and decremented. See `apply_deltas`.
+    DERIVED_FIELDS = ["has_useful_info", "seen_document_count", "seen_review_count"]
+
     def save(self, *args, **kwargs):
+        if self._state.adding:
+            self.update_seen_counts()
         self.update_has_useful_info()
         super(DossierStatistic, self).save(*args, **kwargs)
 
+    def update_seen_counts(self):
+        counts = (
+            Dossier.objects.seen_by(self.user)
+            .filter(issue_id=self.issue_id)
+            .aggregate(
+                documents=Count("document", distinct=True),
+                reviews=Count("review", distinct=True),
+            )
+        )
+        self.seen_document_count = counts["documents"]
+        self.seen_review_count = counts["reviews"]
+
     def update_has_useful_info(self, is_monitored=None, is_subscribed=None):
 
         for dossier_type, dossier_type_name in Dossier.DOSSIER_TYPES:
@@ -445,31 +572,48 @@ class DossierStatistic(models.Model):
         # seen by the user.
         return self.document_count == self.review_count == 0
 
-    def update_stats_quite_inefficiently_please(self, show_output=True):
+    @staticmethod
+    def counter_fields():
         """
-        WARNING: This function is intended only for diagnostic and data-fixing purposes.
-        Do not use it for general production purposes. That would be silly.
-        It should not alter data if everything is working as expected.
+        Returns the names of the fields that count dossiers.
+        """
+        return [
+            "%s_count" % dossier_type for dossier_type, name in Dossier.DOSSIER_TYPES
+        ] + [
+            "%s_%s_%s" % (dossier_type, status_type, fieldstate)
+            for dossier_type, name in Dossier.DOSSIER_TYPES
+            for status_type, name in Dossier.STATUS_TYPES
+            for fieldstate, name in getattr(Dossier, "%s_STATES" % status_type.upper())
+            if hasattr(
+                DossierStatistic, "%s_%s_%s" % (dossier_type, status_type, fieldstate)
+            )
+        ]
 
-        Preferably, it should only function as a code-guide to how stats are expected to work.
+    @staticmethod
+    def count_dossiers(dossiers):
+        """
+        Counts the given dossiers toward the counters of the statistics they
+        belong to, with a single grouped query per dossier type. Returns a
+        dictionary of counter values, keyed by tuples of issue ID and user
+        ID. Statistics without dossiers are left out.
         """
+        counts = {}
+
         # For both 'document' and 'review'
         for dossier_type, dossier_type_name in Dossier.DOSSIER_TYPES:
+            aggregates = {"%s_count" % dossier_type: Count("id")}
+
             for status_type, status_type_name in Dossier.STATUS_TYPES:
 
                 # Figure out which doc-types to exclude, if we're dealing with a document
-                exclude_kwargs = (
-                    {}
-                )  # Will be empty and without effect if nothing is excluded
+                included = Q()
                 excluded_doc_types = []
                 if dossier_type == "document":
                     for doc_type in Dossier.DOC_TYPE_EXCLUSIONS:
                         if status_type in Dossier.DOC_TYPE_EXCLUSIONS[doc_type]:
                             excluded_doc_types += [doc_type]
                 if len(excluded_doc_types):
-                    exclude_kwargs.update(
-                        {"document__doc_type__in": excluded_doc_types}
-                    )
+                    included = ~Q(document__doc_type__in=excluded_doc_types)
 
                 fieldstates = "%s_STATES" % status_type.upper()
                 for fieldstate, fieldstate_name in getattr(Dossier, fieldstates):
@@ -478,33 +622,50 @@ class DossierStatistic(models.Model):
                         status_type,
                         fieldstate,
                     )
-                    if hasattr(self, stat_field_name):
-                        kwargs = {
-                            "issue_id": self.issue_id,
-                            "user_id": self.user_id,
-                            "dossier_type": dossier_type,
-                            status_type: fieldstate,
-                        }
-                        count = (
-                            Dossier.objects.filter(**kwargs)
-                            .exclude(**exclude_kwargs)
-                            .count()
+                    if hasattr(DossierStatistic, stat_field_name):
+                        aggregates[stat_field_name] = Count(
+                            "id", filter=Q(**{status_type: fieldstate}) & included
                         )
-                        if show_output and getattr(self, stat_field_name) != count:
-                            print(
-                                "(%s, %s) %s: %d"
-                                % (self.user, self.issue, stat_field_name, count)
-                            )
-                        setattr(self, stat_field_name, count)
-
-            count_fieldname = "%s_count" % dossier_type
-            count = Dossier.objects.filter(
-                issue_id=self.issue_id, user_id=self.user_id, dossier_type=dossier_type
-            ).count()
-            if show_output and getattr(self, count_fieldname) != count:
-                print(
-                    "(%s, %s) %s: %d" % (self.user, self.issue, count_fieldname, count)
-                )
-            setattr(self, count_fieldname, count)
+
+            rows = (
+                dossiers.filter(dossier_type=dossier_type)
+                .order_by()
+                .values("issue_id", "user_id")
+                .annotate(**aggregates)
+            )
+            for row in rows:
+                key = (row.pop("issue_id"), row.pop("user_id"))
+                counts.setdefault(key, {}).update(row)
+
+        return counts
+
+    def recount(self):
+        """
+        Counts the user's dossiers for the issue from scratch. Returns a
+        dictionary of the values that the statistic's counters should have.
+        """
+        counts = dict.fromkeys(DossierStatistic.counter_fields(), 0)
+        counts.update(
+            DossierStatistic.count_dossiers(
+                Dossier.objects.filter(issue_id=self.issue_id, user_id=self.user_id)
+            ).get((self.issue_id, self.user_id), {})
+        )
+
+        return counts
+
+    def update_stats_quite_inefficiently_please(self, show_output=True):
+        """
+        WARNING: This function is intended only for diagnostic and data-fixing purposes.
+        Do not use it for general production purposes. That would be silly.
+        It should not alter data if everything is working as expected.
+
+        Preferably, it should only function as a code-guide to how stats are expected to work.
+        """
+        for field, count in self.recount().items():
+            if show_output and getattr(self, field) != count:
+                print("(%s, %s) %s: %d" % (self.user, self.issue, field, count))
+            setattr(self, field, count)
+
+        self.update_seen_counts()
 
         self.save()
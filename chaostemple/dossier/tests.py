@@ -1,3 +1,225 @@
+from io import StringIO
+from unittest.mock import patch
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
 from django.test import TestCase
+from django.utils import timezone
+
+from core.models import IssueMonitor
+from core.models import UserProfile
+
+from djalthingi.models import Document
+from djalthingi.models import Issue
+from djalthingi.models import Parliament
+from djalthingi.models import Review
+
+from dossier.models import Dossier
+from dossier.models import DossierStatistic
+
+
+class DossierTestCase(TestCase):
+    def setUp(self):
+        self.parliament = Parliament.objects.create(
+            parliament_num=157, era="2026-2027", timing_start=timezone.now()
+        )
+
+        self.issues = []
+        self.documents = []
+        self.reviews = []
+        for issue_num in [1, 2]:
+            issue = Issue.objects.create(
+                parliament=self.parliament,
+                issue_num=issue_num,
+                issue_group="A",
+                issue_type="l",
+                name="Test issue %d" % issue_num,
+            )
+            self.issues.append(issue)
+
+            # A bill, which isn't supported or opposed, and a committee
+            # report, which is.
+            for doc_num, doc_type in [(1, "frumvarp"), (2, "nefndarálit")]:
+                self.documents.append(
+                    Document.objects.create(
+                        issue=issue,
+                        doc_num=issue_num * 10 + doc_num,
+                        doc_type=doc_type,
+                        time_published=timezone.now(),
+                        is_main=doc_num == 1,
+                    )
+                )
+
+            self.reviews.append(
+                Review.objects.create(
+                    issue=issue,
+                    log_num=issue_num,
+                    sender_name="Test sender",
+                    review_type="um",
+                )
+            )
+
+        self.users = [self.create_user("user%d" % i) for i in range(2)]
+
+    def create_user(self, username):
+        # The user's profile is created when the user is saved.
+        user = User.objects.create_user(username, "%s@example.com" % username)
+        UserProfile.objects.filter(user_id=user.id).update(
+            name=username, initials=username
+        )
+        return user
+
+    def create_dossiers(self):
+        """
+        Creates dossiers of both users in various states, which are recorded
+        in their statistics as they are saved.
+        """
+        for user in self.users:
+            for document in self.documents:
+                Dossier.objects.create(
+                    user=user, document=document, attention="question"
+                )
+            for review in self.reviews:
+                Dossier.objects.create(
+                    user=user, review=review, support="oppose", knowledge=2
+                )
+
+        IssueMonitor.objects.create(user=self.users[0], issue=self.issues[1])
+
+    def assertStatisticsCounted(self):
+        """
+        Asserts that the statistics have the values that counting every
+        dossier from scratch gives them.
+        """
+        fields = DossierStatistic.counter_fields() + DossierStatistic.DERIVED_FIELDS
+
+        stats = list(DossierStatistic.objects.order_by("id"))
+        self.assertTrue(stats)
+        for stat in stats:
+            values = {field: getattr(stat, field) for field in fields}
+
+            stat.update_stats_quite_inefficiently_please(show_output=False)
+            stat.refresh_from_db()
+
+            self.assertEqual(
+                values,
+                {field: getattr(stat, field) for field in fields},
+                "Statistic of %s for %s" % (stat.user, stat.issue),
+            )
+
+
+class RebuildDossierStatisticsTest(DossierTestCase):
+    def rebuild(self, *args):
+        output = StringIO()
+        with patch(
+            "dossier.management.commands.rebuild_dossier_statistics.stdout", output
+        ):
+            call_command("rebuild_dossier_statistics", *args)
+        return output.getvalue()
+
+    def break_statistics(self):
+        DossierStatistic.objects.filter(user=self.users[0]).update(
+            document_count=5, review_support_oppose=0, has_useful_info=False
+        )
+        DossierStatistic.objects.filter(
+            user=self.users[1], issue=self.issues[0]
+        ).delete()
+
+    def test_rebuild(self):
+        self.create_dossiers()
+        self.break_statistics()
+
+        output = self.rebuild()
+
+        self.assertIn("Changed 2 of 3 dossier statistics.", output)
+        self.assertIn("Created 1 missing dossier statistics.", output)
+        self.assertEqual(DossierStatistic.objects.count(), 4)
+        self.assertStatisticsCounted()
+
+        output = self.rebuild()
+
+        self.assertIn("Changed 0 of 4 dossier statistics.", output)
+        self.assertIn("Created 0 missing dossier statistics.", output)
+
+    def test_rebuild_dry_run(self):
+        self.create_dossiers()
+        self.break_statistics()
+
+        output = self.rebuild("157", "--dry-run")
+
+        self.assertIn("document_count 5 -> 2", output)
+        self.assertIn("user1, issue 1/157: missing", output)
+        self.assertIn("Would change 2 of 3 dossier statistics.", output)
+        self.assertIn("Would create 1 missing dossier statistics.", output)
+        self.assertEqual(DossierStatistic.objects.count(), 3)
+        self.assertEqual(DossierStatistic.objects.filter(document_count=5).count(), 2)
+
+    def test_rebuild_user(self):
+        self.create_dossiers()
+        self.break_statistics()
+
+        output = self.rebuild("--user", "user1")
+
+        self.assertIn("Changed 0 of 1 dossier statistics.", output)
+        self.assertIn("Created 1 missing dossier statistics.", output)
+        self.assertEqual(DossierStatistic.objects.filter(document_count=5).count(), 2)
+
+
+class DossierStatisticDeltaTest(DossierTestCase):
+    def assertCountersRecounted(self, user, issue):
+        stat = DossierStatistic.objects.get(user=user, issue=issue)
+        self.assertEqual(
+            {field: getattr(stat, field) for field in stat.recount()},
+            stat.recount(),
+        )
+
+    def test_transitions(self):
+        user = self.users[0]
+
+        for target in self.documents[:2] + self.reviews[:1]:
+            if isinstance(target, Document):
+                dossier = Dossier.objects.create(user=user, document=target)
+            else:
+                dossier = Dossier.objects.create(user=user, review=target)
+            self.assertCountersRecounted(user, target.issue)
+
+            transitions = [
+                {"attention": "question"},
+                {"attention": "exclamation", "knowledge": 1},
+                {"support": "oppose"},
+                {"support": "strongsupport", "proposal": "major"},
+                {"knowledge": 3, "proposal": "minor"},
+                {"notes": "Athugið 4. gr."},
+                {
+                    "attention": "none",
+                    "knowledge": 0,
+                    "support": "undefined",
+                    "proposal": "none",
+                },
+                {"notes": ""},
+            ]
+            for transition in transitions:
+                # Dossiers are re-read for every change, like in views.
+                dossier = Dossier.objects.get(id=dossier.id)
+                for field, value in transition.items():
+                    setattr(dossier, field, value)
+                dossier.save()
+
+                self.assertCountersRecounted(user, target.issue)
+
+        # Deleting all but one of the dossiers in an issue.
+        for dossier in Dossier.objects.filter(issue=self.issues[0])[1:]:
+            dossier.delete()
+            self.assertCountersRecounted(user, self.issues[0])
+
+    def test_users_apart(self):
+        self.create_dossiers()
+
+        dossier = Dossier.objects.get(user=self.users[1], review=self.reviews[0])
+        dossier.support = "support"
+        dossier.save()
 
-# Create your tests here.
+        for user in self.users:
+            for issue in self.issues:
+                self.assertCountersRecounted(user, issue)
+        self.assertStatisticsCounted()
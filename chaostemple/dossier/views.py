@@ -252,7 +252,16 @@ def delete_issue_dossiers(request, issue_id):
         > 0
     )
 
-    Dossier.objects.filter(issue_id=issue_id, user_id=request.user.id).delete()
+    dossiers = Dossier.objects.filter(issue_id=issue_id, user_id=request.user.id)
+    had_useful_dossiers = dossiers.filter(is_useful=True).exists()
+    dossiers.delete()
+
+    # Other users may have counted the deleted dossiers as seen.
+    if had_useful_dossiers:
+        DossierStatistic.objects.filter(
+            issue_id=issue_id,
+            user__userprofile__setting_seen_if_worked_by_others=True,
+        ).exclude(user_id=request.user.id).update_seen_counts()
 
     # If the issue is being monitored or is subscribed to, we want to retain
     # the dossier statistics to keep tracking changes of status and
@@ -266,6 +275,7 @@ def delete_issue_dossiers(request, issue_id):
     if is_subscribed or issue.id in monitor_issue_ids:
         # Reset the statistics.
         stat.reset()
+        stat.update_seen_counts()
 
         # Trigger an upate to has_useful_info.
         stat.save()
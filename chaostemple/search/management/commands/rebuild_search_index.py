@@ -0,0 +1,79 @@
+from django.core.management.base import BaseCommand
+from django.core.management.base import CommandError
+from django.db import transaction
+
+from sys import stdout
+
+from djalthingi.models import Document
+from djalthingi.models import Issue
+from djalthingi.models import Parliament
+from djalthingi.models import Review
+
+from search.models import SearchEntry
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuilds the search index of a parliament, or of the whole database."
+        " The index is otherwise kept up to date as data is imported, so this"
+        " is only needed for indexing existing data or after fixing data by"
+        " means that bypass model signals."
+    )
+
+    batch_size = 500
+
+    def add_arguments(self, parser):
+        parser.add_argument("parliament_num", nargs="?", type=int)
+
+    def handle(self, *args, **options):
+        parliament_num = options["parliament_num"]
+
+        issues = Issue.objects.all()
+        documents = Document.objects.select_related("html_content_blob").only(
+            "id", "issue_id", "doc_num", "doc_type", "html_content_blob__data"
+        )
+        reviews = Review.objects.only(
+            "id",
+            "issue_id",
+            "sender_name",
+            "sender_name_description",
+            "review_type",
+        )
+        entries = SearchEntry.objects.all()
+
+        if parliament_num is not None:
+            if not Parliament.objects.filter(parliament_num=parliament_num).exists():
+                raise CommandError("Parliament %d does not exist" % parliament_num)
+
+            issues = issues.filter(parliament__parliament_num=parliament_num)
+            documents = documents.filter(
+                issue__parliament__parliament_num=parliament_num
+            )
+            reviews = reviews.filter(issue__parliament__parliament_num=parliament_num)
+            entries = entries.filter(issue__parliament__parliament_num=parliament_num)
+
+        with transaction.atomic():
+            entries.delete()
+
+            for name, objects in [
+                ("issues", issues),
+                ("documents", documents),
+                ("reviews", reviews),
+            ]:
+                count = self.index(objects)
+                stdout.write("Indexed %d %s.\n" % (count, name))
+
+    def index(self, objects):
+        count = 0
+        batch = []
+        for instance in objects.order_by("id").iterator(chunk_size=self.batch_size):
+            batch.append(SearchEntry.build(instance))
+            if len(batch) == self.batch_size:
+                SearchEntry.objects.bulk_create(batch)
+                count += len(batch)
+                batch = []
+
+        SearchEntry.objects.bulk_create(batch)
+        count += len(batch)
+
+        return count
@@ -0,0 +1,121 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+SQLITE_CREATE = [
+    """
+    CREATE VIRTUAL TABLE search_searchentry_fts USING fts5(
+        title,
+        content,
+        content='search_searchentry',
+        content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE TRIGGER search_searchentry_fts_insert
+    AFTER INSERT ON search_searchentry BEGIN
+        INSERT INTO search_searchentry_fts (rowid, title, content)
+        VALUES (new.id, new.title, new.content);
+    END
+    """,
+    """
+    CREATE TRIGGER search_searchentry_fts_delete
+    AFTER DELETE ON search_searchentry BEGIN
+        INSERT INTO search_searchentry_fts (search_searchentry_fts, rowid, title, content)
+        VALUES ('delete', old.id, old.title, old.content);
+    END
+    """,
+    """
+    CREATE TRIGGER search_searchentry_fts_update
+    AFTER UPDATE ON search_searchentry BEGIN
+        INSERT INTO search_searchentry_fts (search_searchentry_fts, rowid, title, content)
+        VALUES ('delete', old.id, old.title, old.content);
+        INSERT INTO search_searchentry_fts (rowid, title, content)
+        VALUES (new.id, new.title, new.content);
+    END
+    """,
+]
+
+SQLITE_DROP = [
+    "DROP TRIGGER search_searchentry_fts_update",
+    "DROP TRIGGER search_searchentry_fts_delete",
+    "DROP TRIGGER search_searchentry_fts_insert",
+    "DROP TABLE search_searchentry_fts",
+]
+
+MYSQL_CREATE = [
+    "CREATE FULLTEXT INDEX search_searchentry_fulltext"
+    " ON search_searchentry (title, content)",
+]
+
+MYSQL_DROP = [
+    "DROP INDEX search_searchentry_fulltext ON search_searchentry",
+]
+
+
+def create_fulltext_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    statements = {"sqlite": SQLITE_CREATE, "mysql": MYSQL_CREATE}.get(vendor, [])
+    for statement in statements:
+        schema_editor.execute(statement)
+
+
+def drop_fulltext_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    statements = {"sqlite": SQLITE_DROP, "mysql": MYSQL_DROP}.get(vendor, [])
+    for statement in statements:
+        schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ("djalthingi", "0011_issue_xml_digest"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SearchEntry",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("title", models.CharField(max_length=500)),
+                ("content", models.TextField()),
+                (
+                    "document",
+                    models.ForeignKey(
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="djalthingi.document",
+                    ),
+                ),
+                (
+                    "issue",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="djalthingi.issue",
+                    ),
+                ),
+                (
+                    "review",
+                    models.ForeignKey(
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="djalthingi.review",
+                    ),
+                ),
+            ],
+        ),
+        migrations.RunPython(create_fulltext_index, drop_fulltext_index),
+    ]
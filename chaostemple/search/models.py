@@ -0,0 +1,159 @@
+from django.db import connections
+from django.db import models
+from django.db import NotSupportedError
+from django.db.models import CASCADE
+
+from djalthingi.models import Document
+from djalthingi.models import Issue
+from djalthingi.models import Review
+
+from search.utils import get_terms
+from search.utils import html_to_text
+
+# The text of issues, documents and reviews, indexed by the database's own
+# full-text search. On SQLite, the index is an FTS5 table which is kept in
+# sync with this model's table by triggers, and on MySQL/MariaDB it's a
+# FULLTEXT index on the table itself. Both are created in the app's initial
+# migration and, because SQLite re-creates tables when altering them, any
+# later migration altering this model on SQLite must re-create the triggers.
+
+# Length of the beginning of the content that is selected as an excerpt when
+# the database can't select the part around the first match. The rest of the
+# content may be very long, and is never needed for displaying results.
+EXCERPT_PREFIX_LENGTH = 10000
+
+
+class SearchEntryQuerySet(models.QuerySet):
+    def search(self, query):
+        """
+        Returns the entries matching every word in the given query, by their
+        beginning, ordered by relevance. The relevance is available as
+        `score` on each entry, where higher is better.
+
+        The part of the content around the first match, or its beginning on
+        databases that can't tell where the match is, is available as
+        `excerpt`, for displaying the entry without loading its content.
+        """
+        terms = get_terms(query)
+        if not terms:
+            return self.none()
+
+        vendor = connections[self.db].vendor
+        if vendor == "sqlite":
+            # Matches in titles weigh ten times as much as in content.
+            return self.extra(
+                tables=["search_searchentry_fts"],
+                where=[
+                    "search_searchentry_fts.rowid = search_searchentry.id",
+                    "search_searchentry_fts MATCH %s",
+                ],
+                params=[" ".join('"%s"*' % term for term in terms)],
+                select={
+                    "score": "-bm25(search_searchentry_fts, 10.0, 1.0)",
+                    "excerpt": "snippet(search_searchentry_fts, 1, '', '', '…', 50)",
+                },
+                order_by=["-score"],
+            )
+        elif vendor == "mysql":
+            match = (
+                "MATCH (search_searchentry.title, search_searchentry.content)"
+                " AGAINST (%s IN BOOLEAN MODE)"
+            )
+            match_query = " ".join("+%s*" % term for term in terms)
+            return self.extra(
+                where=[match],
+                params=[match_query],
+                select={
+                    "score": match,
+                    "excerpt": "LEFT(search_searchentry.content, %d)"
+                    % EXCERPT_PREFIX_LENGTH,
+                },
+                select_params=[match_query],
+                order_by=["-score"],
+            )
+        else:
+            raise NotSupportedError(
+                "Full-text search is not supported on database vendor: %s" % vendor
+            )
+
+
+class SearchEntry(models.Model):
+    issue = models.ForeignKey(Issue, on_delete=CASCADE)
+    document = models.ForeignKey(Document, null=True, on_delete=CASCADE)
+    review = models.ForeignKey(Review, null=True, on_delete=CASCADE)
+
+    title = models.CharField(max_length=500)
+    content = models.TextField()
+
+    objects = SearchEntryQuerySet.as_manager()
+
+    @staticmethod
+    def build(instance):
+        """
+        Returns a new, unsaved entry for the given issue, document or review.
+        """
+        if isinstance(instance, Issue):
+            return SearchEntry(
+                issue_id=instance.id,
+                title=instance.name,
+                content=instance.description,
+            )
+        elif isinstance(instance, Document):
+            return SearchEntry(
+                issue_id=instance.issue_id,
+                document_id=instance.id,
+                title="%s (%d)"
+                % (instance.get_doc_type_display().capitalize(), instance.doc_num),
+                content=html_to_text(instance.html_content),
+            )
+        elif isinstance(instance, Review):
+            return SearchEntry(
+                issue_id=instance.issue_id,
+                review_id=instance.id,
+                title=instance.sender_name,
+                content=" ".join(
+                    [
+                        instance.sender_name_description,
+                        instance.get_review_type_display(),
+                    ]
+                ),
+            )
+        else:
+            raise TypeError("Cannot index object of type: %s" % type(instance))
+
+    @staticmethod
+    def index(instance):
+        """
+        Adds the given issue, document or review to the search index, or
+        updates its entry if it has changed.
+        """
+        entry = SearchEntry.build(instance)
+
+        existing = (
+            SearchEntry.objects.filter(
+                issue_id=entry.issue_id,
+                document_id=entry.document_id,
+                review_id=entry.review_id,
+            )
+            .only("title", "content")
+            .first()
+        )
+
+        if existing is None:
+            entry.save()
+        elif existing.title != entry.title or existing.content != entry.content:
+            SearchEntry.objects.filter(id=existing.id).update(
+                title=entry.title, content=entry.content
+            )
+
+    @property
+    def kind(self):
+        if self.document_id is not None:
+            return "document"
+        elif self.review_id is not None:
+            return "review"
+        else:
+            return "issue"
+
+    def __str__(self):
+        return self.title
@@ -0,0 +1,27 @@
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from djalthingi.models import Document
+from djalthingi.models import Issue
+from djalthingi.models import Review
+
+from search.models import SearchEntry
+
+# The fields of each model that end up in the search index. Saves that
+# explicitly update only other fields are ignored. Entries are removed along
+# with their objects, since they cascade on deletion.
+INDEXED_FIELDS = {
+    Issue: {"name", "description"},
+    Document: {"doc_type", "doc_num", "html_content_blob"},
+    Review: {"sender_name", "sender_name_description", "review_type"},
+}
+
+
+@receiver(post_save, sender=Issue)
+@receiver(post_save, sender=Document)
+@receiver(post_save, sender=Review)
+def index_on_save(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and not INDEXED_FIELDS[sender] & set(update_fields):
+        return
+
+    SearchEntry.index(instance)
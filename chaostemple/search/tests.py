@@ -0,0 +1,199 @@
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from djalthingi.models import Document
+from djalthingi.models import Issue
+from djalthingi.models import Parliament
+from djalthingi.models import Review
+
+from search.models import SearchEntry
+from search.utils import get_terms
+from search.utils import HIGHLIGHT_SEARCH_LENGTH
+from search.utils import highlight
+
+
+class SearchTest(TestCase):
+    def setUp(self):
+        parliament = Parliament.objects.create(
+            parliament_num=157, era="2026-2027", timing_start=timezone.now()
+        )
+
+        self.issue = Issue.objects.create(
+            parliament=parliament,
+            issue_num=1,
+            issue_group="A",
+            issue_type="l",
+            name="Lög um loftslagsmál",
+            description="Markmið laganna er að draga úr losun gróðurhúsalofttegunda.",
+        )
+        self.other_issue = Issue.objects.create(
+            parliament=parliament,
+            issue_num=2,
+            issue_group="A",
+            issue_type="l",
+            name="Fjárlög 2027",
+            description="Tekjur og gjöld ríkissjóðs, meðal annars vegna loftslagsmála.",
+        )
+
+        self.document = Document(
+            issue=self.issue,
+            doc_num=1,
+            doc_type="frumvarp",
+            time_published=timezone.now(),
+            is_main=True,
+        )
+        self.document.html_content = (
+            "<html><body><p>1. gr. Lög þessi gilda um <b>kolefnisbindingu</b>."
+            "</p></body></html>"
+        )
+        self.document.save()
+
+        self.review = Review.objects.create(
+            issue=self.issue,
+            log_num=1,
+            sender_name="Landvernd",
+            sender_name_description="umhverfisverndarsamtök",
+            review_type="um",
+        )
+
+    def search(self, query):
+        return list(SearchEntry.objects.search(query))
+
+    def test_indexing(self):
+        self.assertEqual(SearchEntry.objects.count(), 4)
+
+        entry = SearchEntry.objects.get(document=self.document)
+        self.assertEqual(entry.kind, "document")
+        self.assertEqual(entry.issue_id, self.issue.id)
+        self.assertEqual(entry.content, "1. gr. Lög þessi gilda um kolefnisbindingu .")
+
+        self.assertEqual(SearchEntry.objects.get(review=self.review).kind, "review")
+
+        # Changes are indexed as they are saved.
+        self.issue.name = "Lög um orkuskipti"
+        self.issue.save()
+        self.assertEqual([e.issue for e in self.search("orkuskipti")], [self.issue])
+        self.assertEqual(
+            [e.issue for e in self.search("loftslagsmál")], [self.other_issue]
+        )
+
+        # Entries are removed along with their objects.
+        self.review.delete()
+        self.assertEqual(self.search("landvernd"), [])
+        self.assertEqual(SearchEntry.objects.count(), 3)
+
+    def test_search(self):
+        # Words match by their beginning.
+        self.assertEqual([e.document for e in self.search("kolefnis")], [self.document])
+        self.assertEqual([e.review for e in self.search("Landv")], [self.review])
+
+        # Every word must match.
+        self.assertEqual(
+            [e.issue for e in self.search("loftslagsmál markmið")], [self.issue]
+        )
+        self.assertEqual(self.search("loftslagsmál kolefnisbindingu"), [])
+
+        # Diacritics are ignored.
+        self.assertEqual(
+            [e.document for e in self.search("kolefnisbindingu log")],
+            [self.document],
+        )
+
+    def test_search_ranking(self):
+        # A match in a title outranks one in content.
+        entries = self.search("loftslagsmál")
+        self.assertEqual([e.issue for e in entries], [self.issue, self.other_issue])
+        self.assertGreater(entries[0].score, entries[1].score)
+
+    def test_search_query_syntax(self):
+        # Nothing in user input is interpreted as query syntax.
+        for query in ['"lög', "lög OR", "NOT lög", "lög*", "-lög +(", "title:lög"]:
+            with self.subTest(query=query):
+                self.search(query)
+
+        self.assertEqual(self.search(""), [])
+        self.assertEqual(self.search('"*()'), [])
+        self.assertEqual(
+            get_terms('Lög "um" (loftslagsmál)*'), ["lög", "um", "loftslagsmál"]
+        )
+
+    def test_search_excerpt(self):
+        document = Document(
+            issue=self.other_issue,
+            doc_num=2,
+            doc_type="frumvarp",
+            time_published=timezone.now(),
+            is_main=True,
+        )
+        document.html_content = "<p>%s Skógrækt %s</p>" % (
+            "Orð " * 5000,
+            "orð " * 5000,
+        )
+        document.save()
+
+        # The excerpt is around the match, however far into the content.
+        [entry] = self.search("skógrækt")
+        self.assertIn("Skógrækt", entry.excerpt)
+        self.assertLess(len(entry.excerpt), 1000)
+
+    def test_search_view(self):
+        url = reverse("parliament_search", args=[157])
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, {"q": "kolefnis"})
+
+        self.assertContains(response, "<mark>kolefnisbindingu</mark>")
+
+        # The possibly very long content is never loaded.
+        for query in queries:
+            self.assertNotIn('"search_searchentry"."content"', query["sql"])
+
+
+class HighlightTest(TestCase):
+    def test_highlight(self):
+        self.assertEqual(
+            highlight("Lög um loftslagsmál og losun", ["loftslag", "log"]),
+            "<mark>Lög</mark> um <mark>loftslagsmál</mark> og losun",
+        )
+
+        # Terms only match the beginning of words.
+        self.assertEqual(highlight("Fjárlög 2027", ["lög"]), "Fjárlög 2027")
+
+    def test_highlight_escaping(self):
+        self.assertEqual(
+            highlight("<b>Lög</b> & reglur", ["lög"]),
+            "&lt;b&gt;<mark>Lög</mark>&lt;/b&gt; &amp; reglur",
+        )
+        self.assertEqual(highlight("<b>Lög</b>", []), "&lt;b&gt;Lög&lt;/b&gt;")
+
+    def test_highlight_excerpt(self):
+        text = " ".join(["orð"] * 100 + ["loftslagsmál"] + ["orð"] * 100)
+
+        excerpt = highlight(text, ["loftslagsmál"], length=100)
+
+        self.assertTrue(excerpt.startswith("&hellip; orð"))
+        self.assertTrue(excerpt.endswith("orð &hellip;"))
+        self.assertIn("<mark>loftslagsmál</mark>", excerpt)
+        self.assertLessEqual(len(excerpt), 100 + len("&hellip; <mark></mark> &hellip;"))
+
+        # Without a match, the excerpt is from the beginning.
+        self.assertTrue(highlight(text, ["lög"], length=100).startswith("orð orð"))
+
+    def test_highlight_excerpt_word_boundary(self):
+        # The excerpt starts in the middle of the long word, right at a part
+        # of it that looks like a match if taken out of context.
+        text = "ab" + "slag" * 30 + " slagur"
+        excerpt = highlight(text, ["slag"], length=99)
+
+        self.assertTrue(excerpt.startswith("&hellip; slagslag"))
+        self.assertEqual(excerpt.count("<mark>"), 1)
+        self.assertIn("<mark>slagur</mark>", excerpt)
+
+    def test_highlight_long_text(self):
+        text = "orð " * (HIGHLIGHT_SEARCH_LENGTH // 4) + "loftslagsmál"
+
+        # Occurrences are only looked for in the beginning of the text.
+        self.assertTrue(highlight(text, ["loftslagsmál"]).startswith("orð orð"))
@@ -0,0 +1,11 @@
+from django.urls import path
+
+from search import views
+
+urlpatterns = [
+    path(
+        "parliament/<int:parliament_num>/",
+        views.parliament_search,
+        name="parliament_search",
+    ),
+]
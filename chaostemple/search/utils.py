@@ -0,0 +1,95 @@
+import re
+import unicodedata
+
+from functools import lru_cache
+
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+from lxml import etree
+
+
+def html_to_text(html):
+    """
+    Returns the text of the given HTML, with whitespace collapsed.
+    """
+    if not html:
+        return ""
+
+    root = etree.fromstring(html, etree.HTMLParser())
+    if root is None:
+        return ""
+
+    return " ".join(" ".join(root.itertext()).split())
+
+
+def get_terms(query):
+    """
+    Returns the words in a search query as typed by a user. Anything other
+    than words, such as quotes or operators, is ignored so that user input
+    can never break the query syntax of the database.
+    """
+    return re.findall(r"\w+", query.lower())
+
+
+# Occurrences of terms are only looked for this far into a text, so that
+# highlighting very long texts doesn't cost more than short ones.
+HIGHLIGHT_SEARCH_LENGTH = 10000
+
+
+@lru_cache(maxsize=None)
+def fold_char(c):
+    return unicodedata.normalize("NFD", c.lower())[0]
+
+
+def fold(text):
+    """
+    Returns the text in lowercase with diacritics removed, in the same way as
+    the full-text indexes of the supported databases, so that "lög" matches
+    "log" and vice versa. Every character maps to exactly one character so
+    that positions in the folded text are valid in the original text.
+    """
+    return "".join(map(fold_char, text))
+
+
+def highlight(text, terms, length=250):
+    """
+    Returns an excerpt of the given text around the first occurrence of any
+    of the given terms, with every occurrence marked for display. Terms match
+    the beginning of words, like they do in the search itself.
+    """
+    if not terms:
+        return escape(text[:length])
+
+    pattern = re.compile(
+        r"\b(?:%s)\w*" % "|".join(re.escape(fold(term)) for term in terms)
+    )
+
+    first = pattern.search(fold(text[:HIGHLIGHT_SEARCH_LENGTH]))
+    start = 0
+    if first is not None and first.start() > length // 3:
+        start = first.start() - length // 3
+
+        # Start at the beginning of a word.
+        space = text.rfind(" ", 0, start)
+        start = space + 1 if space > start - 20 else start
+
+    end = min(start + length, len(text))
+
+    # Only the excerpt itself is folded for marking occurrences, along with
+    # the character preceding it so that word boundaries are still found.
+    offset = max(start - 1, 0)
+    folded = fold(text[offset:end])
+
+    parts = ["&hellip; "] if start > 0 else []
+    position = start
+    for match in pattern.finditer(folded, start - offset):
+        match_start = offset + match.start()
+        match_end = offset + match.end()
+        parts.append(escape(text[position:match_start]))
+        parts.append("<mark>%s</mark>" % escape(text[match_start:match_end]))
+        position = match_end
+    parts.append(escape(text[position:end]))
+    if end < len(text):
+        parts.append(" &hellip;")
+
+    return mark_safe("".join(parts))
@@ -0,0 +1,32 @@
+from django.core.paginator import Paginator
+from django.shortcuts import render
+
+from search.models import SearchEntry
+from search.utils import get_terms
+from search.utils import highlight
+
+RESULTS_PER_PAGE = 20
+
+
+def parliament_search(request, parliament_num):
+    query = request.GET.get("q", "").strip()
+
+    entries = (
+        SearchEntry.objects.select_related("issue__parliament", "document", "review")
+        .filter(issue__parliament__parliament_num=parliament_num)
+        .search(query)
+        .defer("content")
+    )
+
+    page = Paginator(entries, RESULTS_PER_PAGE).get_page(request.GET.get("page"))
+
+    terms = get_terms(query)
+    for entry in page:
+        entry.highlighted_title = highlight(entry.title, terms, length=500)
+        entry.snippet = highlight(entry.excerpt, terms)
+
+    ctx = {
+        "query": query,
+        "page": page,
+    }
+    return render(request, "search/parliament_search.html", ctx)